@@ -1,25 +1,83 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import os
+import asyncio
+import json
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, List, Optional
 import logging
-import pickle
-import json
+
+from shlrec.llm_client import close_llm_client
+from shlrec.recommender import Recommender
+from shlrec.settings import get_settings
+from shlrec.telemetry import REGISTRY, count, stage
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WARMUP_QUERY = "Java developer who collaborates with stakeholders, 40 minutes"
+
+# Shared pipeline, built once at startup
+_recommender: Optional[Recommender] = None
+_ready = False
+_load_error: Optional[str] = None
+_load_seconds: Optional[float] = None
+
+
+def _index_dir() -> Path:
+    index_dir = get_settings().index_dir
+    if not index_dir.exists():
+        index_dir = Path("/app/data/index")  # Render path
+    if not index_dir.exists():
+        raise FileNotFoundError(f"Index dir not found: {index_dir}")
+    return index_dir
+
+
+def load_recommender() -> None:
+    """Build the shared Recommender and warm it up (index, encoder, caches)"""
+    global _recommender, _ready, _load_error, _load_seconds
+
+    t0 = time.perf_counter()
+    try:
+        logger.info("[LOAD] Loading index and models...")
+        rec = Recommender(index_dir=_index_dir())
+        # Loads the index bundle and encoder, and runs every stage once
+        rec.recommend(WARMUP_QUERY)
+        _recommender = rec
+        _ready = True
+        _load_seconds = time.perf_counter() - t0
+        logger.info(f"[LOAD] SUCCESS: {len(rec._idx.meta)} assessments, ready in {_load_seconds:.1f}s")
+    except Exception as e:
+        logger.error(f"[LOAD] ERROR: {e}")
+        logger.error(traceback.format_exc())
+        _load_error = str(e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bounded pool for CPU-bound work (arecommend runs its stages in the default executor)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=get_settings().api_threadpool_size, thread_name_prefix="shlrec")
+    loop.set_default_executor(executor)
+    # Load in the background: /health answers at once, /ready turns 200 when done
+    load = loop.run_in_executor(None, load_recommender)
+    yield
+    await load
+    close_llm_client()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
 app = FastAPI(
     title="SHL Assessment Recommendation API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
-# Global data - loaded once
-_bm25 = None
-_meta = None
-_load_error = None
 
 @app.get("/")
 def root():
@@ -28,97 +86,148 @@ def root():
         "status": "online"
     }
 
+
 @app.get("/health")
 def health():
-    return {"status": "healthy", "data_loaded": _bm25 is not None}
-
-def load_data():
-    """Load BM25 and metadata on first need"""
-    global _bm25, _meta, _load_error
-    
-    if _bm25 is not None:
-        return True
-    
-    if _load_error:
-        return False
-    
-    try:
-        logger.info("[LOAD] Loading BM25 and metadata...")
-        
-        # Direct path - avoid any imports that might hang
-        index_dir = Path("data/index")
-        if not index_dir.exists():
-            index_dir = Path("/app/data/index")  # Render path
-        
-        if not index_dir.exists():
-            raise FileNotFoundError(f"Index dir not found: {index_dir}")
-        
-        # Load BM25
-        with open(index_dir / "bm25.pkl", "rb") as f:
-            _bm25 = pickle.load(f)
-        
-        # Load meta
-        with open(index_dir / "meta.json", "r", encoding="utf-8") as f:
-            _meta = json.load(f)
-        
-        logger.info(f"[LOAD] SUCCESS: Loaded {len(_meta)} assessments")
-        return True
-        
-    except Exception as e:
-        logger.error(f"[LOAD] ERROR: {e}")
-        logger.error(traceback.format_exc())
-        _load_error = str(e)
-        return False
+    return {"status": "healthy", "ready": _ready, "load_error": _load_error}
+
+
+@app.get("/ready")
+def ready():
+    """200 once the index is loaded and warmed up, 503 before (or if loading failed)"""
+    if _ready:
+        return {"status": "ready", "load_seconds": _load_seconds}
+    status = "failed" if _load_error else "loading"
+    return JSONResponse({"status": status, "load_error": _load_error}, status_code=503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Stage latency histograms, event and cache counters, Prometheus text format"""
+    cache_stats = _recommender.cache_stats() if _recommender is not None else None
+    return PlainTextResponse(REGISTRY.render_prometheus(cache_stats), media_type="text/plain; version=0.0.4")
+
 
 class RecommendRequest(BaseModel):
     query: str
 
+
+def _require_ready() -> Recommender:
+    if not _ready or _recommender is None:
+        count("api_not_ready")
+        raise HTTPException(status_code=503, detail=_load_error or "Index is still loading")
+    return _recommender
+
+
 @app.post("/recommend")
-def recommend(req: RecommendRequest):
+async def recommend(req: RecommendRequest):
     """Recommendation endpoint"""
     logger.info(f"[REQUEST] {req.query[:60]}")
-    
-    try:
-        # Load if needed
-        if not load_data():
-            logger.warning("[FALLBACK] Data not loaded")
-            return get_mocks()
-        
-        # BM25 search
-        query_tokens = req.query.lower().split()
-        scores = _bm25.get_scores(query_tokens)
-        
-        # Get top 10
-        top_idx = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:10]
-        results = [_meta[i] for i in top_idx if i < len(_meta)]
-        
-        if results:
-            logger.info(f"[RESULT] {len(results)} assessments")
-            return {"recommended_assessments": results}
-        else:
-            return get_mocks()
-        
-    except Exception as e:
-        logger.error(f"[ERROR] {e}")
-        return get_mocks()
+    rec = _require_ready()
 
-def get_mocks():
-    """Fallback mock data"""
-    return {
-        "recommended_assessments": [
-            {
-                "name": "Placeholder - Real Data Unavailable",
-                "url": "https://www.shl.com",
-                "description": "Using mock data",
-                "duration": 0,
-                "test_type": [],
-                "adaptive_support": "No",
-                "remote_support": "Yes"
-            }
-        ]
-    }
+    with stage("api_recommend"):
+        try:
+            results = await rec.arecommend(req.query, k=get_settings().top_k)
+        except Exception as e:
+            logger.error(f"[ERROR] {e}")
+            logger.error(traceback.format_exc())
+            count("api_error")
+            raise HTTPException(status_code=500, detail="Recommendation failed")
+
+    logger.info(f"[RESULT] {len(results)} assessments")
+    return {"recommended_assessments": results}
+
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonlines", "application/jsonl")
 
 
+def _query_of(obj) -> str:
+    """A batch entry: a query string or {"query": "..."}"""
+    if isinstance(obj, dict):
+        obj = obj.get("query")
+    if not isinstance(obj, str):
+        raise ValueError("each entry must be a string or an object with a string 'query'")
+    return obj
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse for handlers still reading the request body while they respond.
+
+    StreamingResponse watches receive() for a disconnect, which would swallow the rest
+    of the body; this one only streams (a disconnect surfaces as a failed send)."""
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _ndjson_queries(request: Request) -> AsyncIterator[str]:
+    """Queries of an NDJSON request body, parsed as the body streams in"""
+    buf = b""
+    async for part in request.stream():
+        buf += part
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _query_of(json.loads(line))
+    if buf.strip():
+        yield _query_of(json.loads(buf))
+
+
+async def _recorded(queries: AsyncIterator[str], seen: List[str]) -> AsyncIterator[str]:
+    # Keeps the text of each position for the response lines
+    async for q in queries:
+        seen.append(q)
+        yield q
+
+
+async def _json_queries(request: Request) -> List[str]:
+    try:
+        body = await request.json()
+        entries = body.get("queries") if isinstance(body, dict) else body
+        if not isinstance(entries, list):
+            raise ValueError("expected a JSON list or {\"queries\": [...]}")
+        return [_query_of(e) for e in entries]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
+@app.post("/recommend/batch")
+async def recommend_batch(request: Request):
+    """Batch endpoint: a JSON list / {"queries": [...]} or an NDJSON body (one query or
+    {"query": ...} per line). Streams one NDJSON line per query, as its batch completes:
+    {"index": i, "query": ..., "recommended_assessments": [...]} or {"index": i, "error": ...}"""
+    rec = _require_ready()
+    settings = get_settings()
+    if request.headers.get("content-type", "").split(";")[0].strip() in NDJSON_TYPES:
+        seen: List[str] = []
+        queries = _recorded(_ndjson_queries(request), seen)
+    else:
+        seen = queries = await _json_queries(request)
+    count("api_batch_request")
 
+    async def lines() -> AsyncIterator[bytes]:
+        n = 0
+        try:
+            with stage("api_recommend_batch"):
+                async for i, results, error in rec.arecommend_stream(
+                    queries,
+                    k=settings.top_k,
+                    batch_size=settings.api_batch_size,
+                    concurrency=settings.api_batch_concurrency,
+                ):
+                    row = {"index": i, "query": seen[i]}
+                    if error is None:
+                        row["recommended_assessments"] = results
+                    else:
+                        row["error"] = error
+                    n += 1
+                    yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        except ValueError as e:
+            # Malformed NDJSON line: report it in-band, the response has already started
+            count("api_error")
+            yield (json.dumps({"index": len(seen), "error": f"invalid input: {e}"}) + "\n").encode("utf-8")
+        logger.info(f"[BATCH] {n} queries")
 
+    return DuplexStreamingResponse(lines(), media_type="application/x-ndjson")
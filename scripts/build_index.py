@@ -1,17 +1,64 @@
 from __future__ import annotations
 
 import argparse
-from shlrec.indexer import build_index
+from shlrec.embedding_cache import EmbeddingCache
+from shlrec.indexer import build_index, convert_legacy_index, update_index
+from shlrec.settings import get_settings
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--catalog", default="data/catalog.jsonl", help="Catalog JSONL path")
     p.add_argument("--index_dir", default="data/index", help="Index output dir")
     p.add_argument("--embedding_model", default="sentence-transformers/all-MiniLM-L6-v2")
+    p.add_argument("--embedding_dtype", default="float32", choices=["float32", "float16", "int8"],
+                   help="Also store a compact copy of the embeddings in this dtype")
+    p.add_argument("--ann", action="store_true", help="Also build an IVF approximate nearest-neighbour index")
+    p.add_argument("--ann_nlist", type=int, default=None, help="IVF list count (default: 4 * sqrt(n_docs))")
+    p.add_argument("--convert_legacy", action="store_true",
+                   help="Pack an existing meta.json/bm25/embeddings.npy index dir into index.shlidx instead of rebuilding")
+    p.add_argument("--incremental", action="store_true",
+                   help="Update the existing index from the catalog, encoding only new/changed items")
+    p.add_argument("--compact", action="store_true", help="With --incremental: always drop tombstoned items")
+    p.add_argument("--embedding_cache", default=get_settings().embedding_cache_path,
+                   help="SQLite cache of catalog embeddings keyed on (model, text hash); '' disables it")
+    p.add_argument("--evict_embedding_cache", metavar="MODEL", default=None,
+                   help="Remove MODEL's vectors from the embedding cache and exit")
+    p.add_argument("--workers", type=int, default=1, help="Processes preparing catalog chunks (text, tokens, columns)")
+    p.add_argument("--encode_workers", type=int, default=1, help="Processes encoding embedding shards")
+    p.add_argument("--chunk_size", type=int, default=4096, help="Catalog items per chunk / embedding shard")
+    p.add_argument("--torch_threads", type=int, default=0,
+                   help="Torch threads per encode process (default: cores / encode_workers)")
     args = p.parse_args()
 
-    build_index(args.catalog, args.index_dir, embedding_model=args.embedding_model)
-    print(f"Index built at {args.index_dir}")
+    cache = EmbeddingCache(args.embedding_cache) if args.embedding_cache else None
+    if args.evict_embedding_cache:
+        if cache is None:
+            p.error("--evict_embedding_cache needs --embedding_cache")
+        print(f"Removed {cache.evict_model(args.evict_embedding_cache)} cached vectors; now cached: {cache.models()}")
+        return
+
+    if args.incremental:
+        stats = update_index(args.catalog, args.index_dir, embedding_model=args.embedding_model,
+                             compact=True if args.compact else None, embedding_cache=cache)
+        print(f"Index updated at {args.index_dir}: {stats}")
+        if cache is not None:
+            print(f"Embedding cache: {cache.stats()}")
+        return
+
+    if args.convert_legacy:
+        path = convert_legacy_index(args.index_dir, embedding_model=args.embedding_model,
+                                    embedding_dtype=args.embedding_dtype)
+        print(f"Index bundle written to {path}")
+        return
+
+    stats = build_index(args.catalog, args.index_dir, embedding_model=args.embedding_model,
+                        embedding_dtype=args.embedding_dtype, ann=args.ann, ann_nlist=args.ann_nlist,
+                        embedding_cache=cache, workers=args.workers, encode_workers=args.encode_workers,
+                        chunk_size=args.chunk_size, torch_threads=args.torch_threads)
+    print(f"Index built at {args.index_dir}: {stats['n_docs']} docs in {stats['seconds']}s "
+          f"({stats['docs_per_s']} docs/s, {stats['encoded']} encoded)")
+    if cache is not None:
+        print(f"Embedding cache: {cache.stats()}")
 
 if __name__ == "__main__":
     main()
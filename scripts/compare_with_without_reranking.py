@@ -1,6 +1,6 @@
 """Compare metrics with and without LLM reranking."""
 from shlrec.settings import Settings
-from shlrec.retrieval import load_index, hybrid_retrieve
+from shlrec.retrieval import load_index, hybrid_retrieve_many
 from shlrec.llm_gemini import GeminiIntentExtractor
 from shlrec.balancing_improved import pick_balanced_improved
 from shlrec.llm_reranker import GeminiReranker
@@ -23,6 +23,10 @@ settings = Settings()
 intent_extractor = GeminiIntentExtractor(settings, cache_path='data/index/gemini_cache.json')
 reranker = GeminiReranker(settings)
 
+# Retrieval does not depend on reranking: score every query once, in one batch
+queries = list(q2rel.keys())
+all_pairs = hybrid_retrieve_many(idx, queries, alpha=0.39, top_n=60)
+
 print("=" * 60)
 print("COMPARING: Without Reranking vs With Reranking")
 print("=" * 60)
@@ -30,9 +34,8 @@ print("=" * 60)
 # Test WITHOUT reranking
 print("\n[1] WITHOUT LLM RERANKING:")
 q2pred_no_rerank = {}
-for q in q2rel.keys():
+for q, pairs in zip(queries, all_pairs):
     intent = intent_extractor.extract(q)
-    pairs = hybrid_retrieve(idx, q, alpha=0.39, top_n=60)
     
     candidates = []
     for doc_id, score in pairs:
@@ -67,9 +70,8 @@ print(f"  MAP@10:    {metrics_no_rerank['map@10']:.4f}")
 # Test WITH reranking
 print("\n[2] WITH LLM RERANKING (50% weight):")
 q2pred_rerank = {}
-for q in q2rel.keys():
+for q, pairs in zip(queries, all_pairs):
     intent = intent_extractor.extract(q)
-    pairs = hybrid_retrieve(idx, q, alpha=0.39, top_n=60)
     
     candidates = []
     for doc_id, score in pairs:
@@ -29,8 +29,8 @@ def main():
     print("PER-QUERY BREAKDOWN".center(100))
     print("="*100)
     
-    for q in sorted(q2rel.keys()):
-        items = rec.recommend(q, k=10)
+    queries = sorted(q2rel.keys())
+    for q, items in zip(queries, rec.recommend_many(queries, k=10)):
         q2pred[q] = [canonical_shl_url(it["url"]) for it in items]
         
         # Calculate per-query metrics
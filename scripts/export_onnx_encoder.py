@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from shlrec.encoders import ONNX_DIRNAME, export_onnx_encoder
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--index_dir", default="data/index", help="Index dir (model goes to <index_dir>/onnx)")
+    p.add_argument("--embedding_model", default="sentence-transformers/all-MiniLM-L6-v2")
+    p.add_argument("--no_quantize", action="store_true", help="Keep the float32 ONNX model only")
+    args = p.parse_args()
+
+    out = export_onnx_encoder(args.embedding_model, Path(args.index_dir) / ONNX_DIRNAME, quantize=not args.no_quantize)
+    print(f"ONNX encoder exported to {out} (use with ENCODER_BACKEND=onnx)")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """Fine-grained parameter tuning with improved balancing."""
 from shlrec.settings import Settings
-from shlrec.retrieval import load_index, hybrid_retrieve
+from shlrec.retrieval import load_index, hybrid_retrieve_many
 from shlrec.llm_gemini import GeminiIntentExtractor
 from shlrec.balancing_improved import pick_balanced_improved
 from shlrec.utils import canonical_shl_url
@@ -30,9 +30,9 @@ best_params = {}
 
 for alpha in [0.38, 0.39, 0.40, 0.41, 0.42, 0.43]:
     q2pred = {}
-    for q in q2rel.keys():
+    queries = list(q2rel.keys())
+    for q, pairs in zip(queries, hybrid_retrieve_many(idx, queries, alpha=alpha, top_n=60)):
         intent = intent_extractor.extract(q)
-        pairs = hybrid_retrieve(idx, q, alpha=alpha, top_n=60)
         
         candidates = []
         for doc_id, score in pairs:
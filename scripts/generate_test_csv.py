@@ -20,8 +20,7 @@ def main():
     rec = Recommender(index_dir=args.index_dir)
 
     rows = []
-    for q in queries:
-        items = rec.recommend(q, k=10)
+    for q, items in zip(queries, rec.recommend_many(queries, k=10)):
         for it in items:
             rows.append({"Query": q, "Assessment_url": canonical_shl_url(it["url"])})
 
@@ -0,0 +1,83 @@
+"""
+Local stand-in for the Gemini API (LLM_BACKEND=stub), for offline and load tests.
+
+Answers the intent, rerank and expansion prompts with deterministic heuristics, after
+an optional latency; a share of requests can be made to fail to exercise retries and
+the circuit breaker.
+
+    python scripts/llm_stub_server.py --port 8765 --latency_ms 300 --fail_rate 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from dataclasses import asdict
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from shlrec.llm_gemini import heuristic_intent
+
+app = FastAPI(title="LLM stub")
+LATENCY_S = 0.0
+FAIL_RATE = 0.0
+
+
+class GenerateRequest(BaseModel):
+    model: str = "stub"
+    prompt: str
+    temperature: float | None = None
+
+
+def _words(text: str) -> set[str]:
+    return set(re.findall(r"[a-z0-9+#]+", text.lower()))
+
+
+def _answer(prompt: str) -> str:
+    if "CANDIDATE ASSESSMENTS:" in prompt:
+        # Rerank: word overlap between the requirement and each candidate
+        requirement = prompt.split("JOB REQUIREMENT:", 1)[1].split("CANDIDATE ASSESSMENTS:", 1)[0]
+        block = prompt.split("CANDIDATE ASSESSMENTS:", 1)[1].split("\n\nFor each assessment", 1)[0]
+        req = _words(requirement)
+        scores = []
+        for c in json.loads(block):
+            words = _words(f"{c.get('name', '')} {c.get('description', '')}")
+            overlap = len(req & words) / max(1, min(len(req), len(words)))
+            scores.append({"name": c.get("name", ""), "relevance_score": round(min(1.0, overlap), 3)})
+        return json.dumps(scores)
+    m = re.search(r"<<<(.*)>>>", prompt, flags=re.DOTALL)
+    if m:
+        # Intent extraction
+        return json.dumps(asdict(heuristic_intent(m.group(1))))
+    # Query expansion
+    return "communication, problem solving, teamwork, analytical thinking, stakeholder management"
+
+
+@app.post("/generate")
+async def generate(req: GenerateRequest):
+    if LATENCY_S:
+        await asyncio.sleep(LATENCY_S)
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        raise HTTPException(status_code=503, detail="stub failure")
+    return {"text": _answer(req.prompt)}
+
+
+def main():
+    global LATENCY_S, FAIL_RATE
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency_ms", type=float, default=0.0, help="Delay before each answer")
+    p.add_argument("--fail_rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    args = p.parse_args()
+
+    LATENCY_S = args.latency_ms / 1000.0
+    FAIL_RATE = args.fail_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
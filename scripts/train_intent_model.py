@@ -0,0 +1,124 @@
+"""
+Train the local intent model (INTENT_MODE=hybrid|local) from the Gemini intent cache and
+the train set.
+
+Labels:
+  - every cached Gemini intent answer (data/index/gemini_cache.sqlite) labels its query
+    for the domain_mix, seniority and remote heads;
+  - each train-set query's domain_mix comes from the K / P test types of its relevant
+    assessments (this overrides Gemini's mix for that query).
+Answers cached from the stub backend (LLM_BACKEND=stub) are skipped unless
+--include_stub is given.
+--label_with_llm first asks the LLM backend for train/test queries that have no cached
+answer yet (filling the cache, so later runs are free).
+
+    python scripts/train_intent_model.py --label_with_llm
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from shlrec.catalog_columns import KP_KNOWLEDGE, KP_PERSONALITY
+from shlrec.intent_model import (
+    MODEL_FILENAME,
+    head_agreement,
+    intent_labels,
+    mix_label,
+    train_intent_model,
+)
+from shlrec.llm_gemini import GeminiIntentExtractor
+from shlrec.retrieval import load_index
+from shlrec.settings import get_settings
+from shlrec.utils import canonical_shl_url
+
+
+def train_set_mix(xlsx: str, idx) -> Dict[str, str]:
+    """Query -> domain_mix label from the K/P shares of its relevant assessments."""
+    cols = idx.columns
+    flags_by_url: Dict[str, int] = {}
+    for i in range(len(idx.meta)):
+        if cols.url_id[i] >= 0:
+            url = str(cols.urls[cols.url_id[i]])
+            flags_by_url[url] = flags_by_url.get(url, 0) | int(cols.kp_flags[i])
+
+    df = pd.read_excel(xlsx, sheet_name="Train-Set").dropna(subset=["Query", "Assessment_url"])
+    labels = {}
+    for q, sub in df.groupby("Query"):
+        k = p = 0
+        for u in sub["Assessment_url"].tolist():
+            flags = flags_by_url.get(canonical_shl_url(u), 0)
+            k += bool(flags & KP_KNOWLEDGE)
+            p += bool(flags & KP_PERSONALITY)
+        if k + p:
+            labels[str(q)] = mix_label(k / (k + p))
+    return labels
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--xlsx", default="data/Gen_AI Dataset.xlsx", help="Path to Gen_AI Dataset.xlsx")
+    p.add_argument("--index_dir", default="data/index", help="Index dir (model goes to <index_dir>/intent_model.npz)")
+    p.add_argument("--embedding_model", default="sentence-transformers/all-MiniLM-L6-v2")
+    p.add_argument("--label_with_llm", action="store_true", help="Ask the LLM for train/test queries not cached yet")
+    p.add_argument("--include_stub", action="store_true", help="Also learn from cached stub-backend answers")
+    p.add_argument("--C", type=float, default=1.0, help="Inverse L2 regularization of the heads")
+    args = p.parse_args()
+
+    settings = get_settings()
+    index_dir = Path(args.index_dir)
+    llm = GeminiIntentExtractor(settings, cache_path=str(index_dir / "gemini_cache.json"))
+
+    if args.label_with_llm:
+        queries = []
+        for sheet in ("Train-Set", "Test-Set"):
+            df = pd.read_excel(args.xlsx, sheet_name=sheet).dropna(subset=["Query"])
+            queries += sorted(set(df["Query"].astype(str)))
+        labelled = sum(llm.label(q) is not None for q in queries)
+        print(f"LLM labels: {labelled}/{len(queries)} train/test queries")
+
+    # query -> head -> label; Gemini answers of any Gemini model. Stub answers are the
+    # heuristic intent echoed back, so they only count with --include_stub.
+    examples: Dict[str, Dict[str, str]] = {}
+    per_model: Counter = Counter()
+    for key, obj in llm.cache.scan("intent::"):
+        _, model_id, query = key.split("::", 2)
+        if not isinstance(obj, dict) or (model_id.startswith("stub:") and not args.include_stub):
+            continue
+        labels = intent_labels(obj)
+        if labels:
+            examples.setdefault(query, {}).update(labels)
+            per_model[model_id] += 1
+    n_gemini = len(examples)
+    for model_id, n in per_model.most_common():
+        print(f"  {n} intent labels from {model_id}")
+
+    idx = load_index(index_dir, embedding_model=args.embedding_model, query_cache_size=0)
+    mixes = train_set_mix(args.xlsx, idx)
+    for q, label in mixes.items():
+        examples.setdefault(q, {})["domain_mix"] = label
+    if not examples:
+        raise SystemExit("No labelled queries: run with --label_with_llm or accumulate Gemini intents first")
+
+    queries: List[str] = sorted(examples)
+    labels = [examples[q] for q in queries]
+    t0 = time.perf_counter()
+    X = idx.encode_queries(queries)
+    print(f"{len(queries)} queries ({n_gemini} with Gemini labels, {len(mixes)} train-set mixes), "
+          f"encoded in {time.perf_counter() - t0:.1f}s")
+
+    for head, acc in head_agreement(X, labels, C=args.C).items():
+        print(f"  {head:<10s} held-out agreement {acc:.1%}")
+
+    model = train_intent_model(X, labels, embedding_model=args.embedding_model, C=args.C)
+    out = index_dir / MODEL_FILENAME
+    model.save(out)
+    print(f"Intent model ({', '.join(model.heads) or 'no heads'}) saved to {out} (use with INTENT_MODE=hybrid)")
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,23 @@ Improves both speed and quality.
 """
 from __future__ import annotations
 
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import numpy as np
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
+
+from .bm25 import SparseBM25
+from .encoders import QueryEncoder
+from .query_cache import QueryEmbeddingCache
 
 
 def two_stage_retrieve(
-    bm25: BM25Okapi,
+    bm25: SparseBM25,
     embeddings: np.ndarray,
-    embedder: SentenceTransformer,
+    embedder: QueryEncoder,
     query: str,
     alpha: float = 0.40,
     top_n: int = 60,
     bm25_cutoff: float = 0.0,  # Filter low BM25 scores
+    query_cache: Optional[QueryEmbeddingCache] = None,  # e.g. LoadedIndex.query_cache
 ) -> List[Tuple[int, float]]:
     """
     Two-stage retrieval:
@@ -45,7 +48,10 @@ def two_stage_retrieve(
     # Stage 2: Semantic reranking on filtered set
     filtered_bm25 = bm25_scores[valid_indices]
     
-    query_emb = embedder.encode([query], normalize_embeddings=True)[0].astype(np.float32)
+    if query_cache is not None:
+        query_emb = query_cache.encode(embedder, [query])[0]
+    else:
+        query_emb = embedder.encode([query], normalize_embeddings=True)[0].astype(np.float32)
     filtered_embeddings = embeddings[valid_indices]
     cos_scores = filtered_embeddings @ query_emb
     
@@ -0,0 +1,119 @@
+"""
+Approximate nearest-neighbour search over the catalog embeddings: an IVF (inverted file)
+index built with spherical k-means in pure NumPy.
+
+Each document is assigned to its closest centroid; a query only scores the documents in
+its ``nprobe`` closest lists. ``nlist`` (build time) and ``nprobe`` (query time) trade
+recall against latency; nprobe == nlist is exact search.
+"""
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+# Rows scored per block when assigning documents to centroids
+_BLOCK_ROWS = 16384
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def default_nlist(n_docs: int) -> int:
+    return max(1, int(4 * math.sqrt(n_docs)))
+
+
+class IVFIndex:
+    """Inverted lists stored CSR-style: docs of list ``c`` are ``list_ids[list_ptr[c]:list_ptr[c + 1]]``."""
+
+    def __init__(self, centroids: np.ndarray, list_ptr: np.ndarray, list_ids: np.ndarray):
+        self.centroids = centroids
+        self.list_ptr = list_ptr
+        self.list_ids = list_ids
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        embeddings,
+        nlist: Optional[int] = None,
+        n_iter: int = 10,
+        sample_per_list: int = 256,
+        seed: int = 0,
+        live: Optional[np.ndarray] = None,
+    ) -> "IVFIndex":
+        """Train centroids on a sample of the (normalized) embeddings, then assign every row
+        (only the `live` ones, when given: tombstoned rows are neither sampled nor listed).
+
+        `embeddings` may be an ndarray or an EmbeddingStore (anything supporting
+        ``len`` and row slicing to float32).
+        """
+        live_ids = np.arange(len(embeddings)) if live is None else np.flatnonzero(live)
+        n = len(live_ids)
+        if n == 0:
+            raise ValueError("IVFIndex.build needs at least one live row")
+        nlist = max(1, min(int(nlist or default_nlist(n)), n))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, nlist * sample_per_list)
+        sample_ids = live_ids[np.sort(rng.choice(n, size=sample_size, replace=False))]
+        sample = np.asarray(embeddings[sample_ids], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty lists with random sample points
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            centroids = _normalize_rows(sums)
+
+        return cls.from_centroids(centroids.astype(np.float32), embeddings, live=live)
+
+    @classmethod
+    def from_centroids(cls, centroids: np.ndarray, embeddings, live: Optional[np.ndarray] = None) -> "IVFIndex":
+        """Assign every row (or only the `live` ones) of `embeddings` to its closest centroid."""
+        n = len(embeddings)
+        nlist = centroids.shape[0]
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, n)
+            block = np.asarray(embeddings[start:stop], dtype=np.float32)
+            assign[start:stop] = np.argmax(block @ centroids.T, axis=1)
+
+        ids = np.arange(n) if live is None else np.flatnonzero(live)
+        assign = assign[ids]
+        order = np.argsort(assign, kind="stable")
+        list_ptr = np.zeros(nlist + 1, dtype=np.int64)
+        list_ptr[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return cls(centroids=centroids, list_ptr=list_ptr, list_ids=ids[order].astype(np.int32))
+
+    def search(self, query_emb: np.ndarray, nprobe: int = 8) -> np.ndarray:
+        """Candidate doc ids (sorted, unique) from the `nprobe` lists closest to one query."""
+        nprobe = max(1, min(int(nprobe), self.nlist))
+        sims = self.centroids @ np.asarray(query_emb, dtype=np.float32)
+        if nprobe < self.nlist:
+            probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        parts: List[np.ndarray] = [self.list_ids[self.list_ptr[c]:self.list_ptr[c + 1]] for c in probe]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+    def save(self, path: str | Path) -> None:
+        np.savez(path, centroids=self.centroids, list_ptr=self.list_ptr, list_ids=self.list_ids)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(centroids=z["centroids"], list_ptr=z["list_ptr"], list_ids=z["list_ids"])
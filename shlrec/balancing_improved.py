@@ -6,6 +6,10 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 
+import numpy as np
+
+from .catalog_columns import KP_KNOWLEDGE, KP_PERSONALITY
+
 
 def pick_balanced_improved(
     candidates: List[Dict[str, Any]],
@@ -111,3 +115,87 @@ def pick_balanced_improved(
             used_urls.add(url)
 
     return selected
+
+
+def pick_balanced_improved_ids(
+    scores: np.ndarray,
+    kp_flags: np.ndarray,
+    url_ids: np.ndarray,
+    k: int,
+    kp_weights: Dict[str, float],
+) -> List[int]:
+    """
+    Columnar pick_balanced_improved over a candidate list.
+
+    Takes per-candidate arrays (score, CatalogColumns.kp_flags, CatalogColumns.url_id)
+    in candidate order and returns the selected candidate positions, identical to what
+    pick_balanced_improved selects from the equivalent dicts.
+    """
+    k = max(1, min(10, int(k)))
+
+    wK = float(kp_weights.get("K", 0.7))
+    wP = float(kp_weights.get("P", 0.3))
+    s = max(wK + wP, 1e-6)
+    wK, wP = wK / s, wP / s
+
+    quotaK = round(k * wK)
+    quotaP = k - quotaK
+
+    hasK = (kp_flags & KP_KNOWLEDGE) > 0
+    hasP = (kp_flags & KP_PERSONALITY) > 0
+    has_url = url_ids >= 0
+
+    def group(mask: np.ndarray) -> List[int]:
+        pos = np.flatnonzero(mask & has_url)
+        # stable: ties keep candidate order, like list.sort
+        return pos[np.argsort(-scores[pos], kind="stable")].tolist()
+
+    k_candidates = group(hasK & ~hasP)
+    p_candidates = group(hasP & ~hasK)
+    neutral_candidates = group(hasK == hasP)
+
+    urls = url_ids.tolist()
+    selected: List[int] = []
+    used_urls = set()
+    countK = countP = 0
+
+    # First pass: Fill quotas with best candidates from each category
+    for i in k_candidates:
+        if countK >= quotaK:
+            break
+        if urls[i] not in used_urls:
+            selected.append(i)
+            used_urls.add(urls[i])
+            countK += 1
+
+    for i in p_candidates:
+        if countP >= quotaP:
+            break
+        if urls[i] not in used_urls:
+            selected.append(i)
+            used_urls.add(urls[i])
+            countP += 1
+
+    # Second pass: Fill remaining slots with neutral candidates
+    for i in neutral_candidates:
+        if len(selected) >= k:
+            break
+        if urls[i] not in used_urls:
+            if countK < quotaK:
+                selected.append(i)
+                used_urls.add(urls[i])
+                countK += 1
+            elif countP < quotaP:
+                selected.append(i)
+                used_urls.add(urls[i])
+                countP += 1
+
+    # Third pass: If we still need items, take from any remaining
+    for i in range(len(urls)):
+        if len(selected) >= k:
+            break
+        if urls[i] not in used_urls:
+            selected.append(i)
+            used_urls.add(urls[i])
+
+    return selected
@@ -0,0 +1,265 @@
+"""
+Sparse BM25 scorer backed by CSR-style postings held in NumPy arrays.
+
+Scores match rank_bm25.BM25Okapi (same k1/b/epsilon and IDF floor), but scoring
+only touches the postings of the query terms and the index is saved as a plain
+.npz file, so loading it needs no pickle.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# BM25Okapi defaults
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+
+def _posting_weights(
+    indptr: np.ndarray,
+    doc_ids: np.ndarray,
+    tfs: np.ndarray,
+    doc_len: np.ndarray,
+    n_docs: int,
+    k1: float,
+    b: float,
+    epsilon: float,
+) -> np.ndarray:
+    """Per-posting BM25 contribution idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)).
+
+    `n_docs` is the number of documents in the collection statistics (those in `doc_len`
+    with a zero length and no postings do not change avgdl).
+    """
+    df = np.diff(indptr).astype(np.float64)
+    # IDF exactly as BM25Okapi: negative values are floored to epsilon * mean idf
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    if len(idf):
+        idf[idf < 0] = epsilon * (idf.sum() / len(idf))
+    avgdl = float(np.sum(doc_len, dtype=np.float64)) / max(n_docs, 1)
+    tfs = tfs.astype(np.float64)
+    norm = k1 * (1 - b + b * doc_len[doc_ids].astype(np.float64) / avgdl) if n_docs else 0.0
+    return np.repeat(idf, np.diff(indptr)) * (tfs * (k1 + 1) / (tfs + norm))
+
+
+def token_postings(
+    docs_tokens: Sequence[Sequence[str]],
+    doc_ids: Sequence[int],
+    as_bytes: bool = False,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(vocab, term index, doc id, tf) postings of tokenized documents (one from_postings part)."""
+    terms: List[str] = []
+    docs: List[int] = []
+    tfs: List[int] = []
+    for doc_id, toks in zip(doc_ids, docs_tokens):
+        for term, tf in Counter(toks).items():
+            terms.append(term)
+            docs.append(doc_id)
+            tfs.append(tf)
+    vocab, term_idx = np.unique(np.array(terms, dtype=str), return_inverse=True)
+    if as_bytes:
+        vocab = np.char.encode(vocab, "utf-8")
+    return vocab, term_idx.astype(np.int32), np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.int32)
+
+
+class SparseBM25:
+    """BM25Okapi-compatible scorer over an inverted index.
+
+    Postings for term ``t`` live in ``doc_ids[indptr[t]:indptr[t + 1]]`` with the
+    per-(term, doc) contribution precomputed in ``weights``. ``terms`` is sorted so
+    query tokens are mapped to term ids with a binary search.
+    """
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        n_docs: int,
+        tfs: Optional[np.ndarray] = None,
+        doc_len: Optional[np.ndarray] = None,
+    ):
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = int(n_docs)
+        # Raw term frequencies per posting and token count per doc: needed by update()
+        self.tfs = tfs
+        self.doc_len = doc_len
+
+    @classmethod
+    def from_corpus_tokens(
+        cls,
+        corpus_tokens: Sequence[Sequence[str]],
+        k1: float = K1,
+        b: float = B,
+        epsilon: float = EPSILON,
+    ) -> "SparseBM25":
+        n_docs = len(corpus_tokens)
+        doc_len = np.array([len(toks) for toks in corpus_tokens], dtype=np.int32)
+
+        # term -> [(doc_id, tf), ...]
+        postings: Dict[str, List[tuple]] = {}
+        for doc_id, toks in enumerate(corpus_tokens):
+            for term, tf in Counter(toks).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings[t]) for t in terms])
+        doc_ids = np.empty(int(indptr[-1]), dtype=np.int32)
+        tfs = np.empty(int(indptr[-1]), dtype=np.int32)
+        for i, t in enumerate(terms):
+            plist = postings[t]
+            doc_ids[indptr[i]:indptr[i + 1]] = [d for d, _ in plist]
+            tfs[indptr[i]:indptr[i + 1]] = [f for _, f in plist]
+
+        return cls(
+            terms=np.array(terms, dtype=str),
+            indptr=indptr,
+            doc_ids=doc_ids,
+            weights=_posting_weights(indptr, doc_ids, tfs, doc_len, n_docs, k1, b, epsilon),
+            n_docs=n_docs,
+            tfs=tfs,
+            doc_len=doc_len,
+        )
+
+    def update(
+        self,
+        removed: np.ndarray,
+        added: Dict[int, Sequence[str]],
+        n_docs: int,
+        k1: float = K1,
+        b: float = B,
+        epsilon: float = EPSILON,
+    ) -> "SparseBM25":
+        """Index with the postings of `removed` doc ids dropped and `added` docs (id -> tokens) inserted.
+
+        Ids in `added` may also appear in `removed` (a changed document) or be >= the current
+        n_docs (appended documents). Documents without postings, e.g. tombstones, do not count
+        towards the collection statistics, so the scores equal a rebuild over the live documents.
+        """
+        if self.tfs is None or self.doc_len is None:
+            raise ValueError("This BM25 index has no term frequencies; rebuild it to enable updates")
+
+        doc_len = np.zeros(n_docs, dtype=np.int32)
+        doc_len[:len(self.doc_len)] = self.doc_len
+        live = np.zeros(n_docs, dtype=bool)
+        live[self.doc_ids] = True
+        drop = np.zeros(n_docs, dtype=bool)
+        drop[np.asarray(removed, dtype=np.int64)] = True
+        drop[list(added)] = True
+        doc_len[drop] = 0
+        live &= ~drop
+
+        # Surviving postings, plus the postings of the added documents
+        keep = ~drop[self.doc_ids]
+        old_term = np.repeat(np.arange(len(self.terms)), np.diff(self.indptr))[keep]
+        parts = [(self.terms, old_term, self.doc_ids[keep], self.tfs[keep])]
+        for doc_id, toks in added.items():
+            doc_len[doc_id] = len(toks)
+            live[doc_id] = True
+        if added:
+            parts.append(token_postings(list(added.values()), list(added), self.terms.dtype.kind == "S"))
+        return SparseBM25.from_postings(parts, doc_len, n_live=int(live.sum()), k1=k1, b=b, epsilon=epsilon)
+
+    @classmethod
+    def from_postings(
+        cls,
+        parts: Sequence[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]],
+        doc_len: np.ndarray,
+        n_live: Optional[int] = None,
+        k1: float = K1,
+        b: float = B,
+        epsilon: float = EPSILON,
+    ) -> "SparseBM25":
+        """Index from postings given in parts of (vocab, term index into vocab, doc id, tf).
+
+        Parts may overlap in vocabulary; terms without postings are dropped. `n_live` is the
+        document count for the statistics (default: all of `doc_len`).
+        """
+        vocab = np.unique(np.concatenate([p[0][np.unique(p[1])] for p in parts]))
+        term = np.concatenate([np.searchsorted(vocab, p[0][p[1]]) for p in parts])
+        doc = np.concatenate([p[2] for p in parts]).astype(np.int32)
+        tf = np.concatenate([p[3] for p in parts]).astype(np.int32)
+        order = np.lexsort((doc, term))
+        term, doc, tf = term[order], doc[order], tf[order]
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(term, minlength=len(vocab)))
+        n_docs = len(doc_len)
+        n_live = n_docs if n_live is None else n_live
+        return cls(
+            terms=vocab,
+            indptr=indptr,
+            doc_ids=doc,
+            weights=_posting_weights(indptr, doc, tf, doc_len, n_live, k1, b, epsilon),
+            n_docs=n_docs,
+            tfs=tf,
+            doc_len=doc_len,
+        )
+
+    def take_docs(self, keep: np.ndarray) -> "SparseBM25":
+        """Renumber documents to drop those with ``keep == False`` (which must have no postings)."""
+        keep = np.asarray(keep, dtype=bool)
+        new_id = np.cumsum(keep, dtype=np.int64) - 1
+        return SparseBM25(
+            terms=self.terms,
+            indptr=self.indptr,
+            doc_ids=new_id[self.doc_ids].astype(np.int32),
+            weights=self.weights,
+            n_docs=int(keep.sum()),
+            tfs=self.tfs,
+            doc_len=self.doc_len[keep] if self.doc_len is not None else None,
+        )
+
+    def term_ids(self, tokens: Sequence[str]) -> np.ndarray:
+        """Map tokens to term ids, dropping out-of-vocabulary tokens (duplicates kept)."""
+        if not tokens or not len(self.terms):
+            return np.empty(0, dtype=np.int64)
+        q = np.asarray(tokens, dtype=str)
+        if self.terms.dtype.kind == "S":
+            # Terms stored as UTF-8 bytes (index bundle)
+            q = np.char.encode(q, "utf-8")
+        pos = np.searchsorted(self.terms, q)
+        pos = np.minimum(pos, len(self.terms) - 1)
+        return pos[self.terms[pos] == q]
+
+    def get_scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """Dense BM25 score vector over all documents (same contract as BM25Okapi)."""
+        tids = self.term_ids(query_tokens)
+        if not len(tids):
+            return np.zeros(self.n_docs, dtype=np.float64)
+        starts = self.indptr[tids]
+        ends = self.indptr[tids + 1]
+        sel = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        return np.bincount(self.doc_ids[sel], weights=self.weights[sel], minlength=self.n_docs)
+
+    def save(self, path: str | Path) -> None:
+        np.savez_compressed(
+            path,
+            terms=self.terms,
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            n_docs=np.array(self.n_docs, dtype=np.int64),
+            **({"tfs": self.tfs, "doc_len": self.doc_len} if self.tfs is not None else {}),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "SparseBM25":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(
+                terms=z["terms"],
+                indptr=z["indptr"],
+                doc_ids=z["doc_ids"],
+                weights=z["weights"],
+                n_docs=int(z["n_docs"]),
+                tfs=z["tfs"] if "tfs" in z.files else None,
+                doc_len=z["doc_len"] if "doc_len" in z.files else None,
+            )
@@ -0,0 +1,254 @@
+"""
+Streaming, parallel index build behind indexer.build_index.
+
+The catalog is read in chunks of ``chunk_size`` items. ``workers`` processes turn each
+chunk into corpus texts, compact JSON rows, columns and BM25 postings, while
+``encode_workers`` processes (each limited to ``torch_threads`` intra-op threads) encode
+the chunk texts. Encoded shards are written straight into an on-disk float32 matrix and
+the final bundle is streamed from its memory map, so the main process only holds the
+postings, the encoded metadata and a bounded number of chunks in flight.
+"""
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from .ann import IVFIndex
+from .bm25 import SparseBM25, token_postings
+from .catalog_columns import CatalogColumns
+from .embedding_cache import EmbeddingCache
+from .encoders import QueryEncoder, load_encoder
+from .index_bundle import BUNDLE_FILENAME, EncodedMeta, write_bundle
+from .indexer import _tokenize, corpus_text
+
+# Chunks queued per worker: keeps every process busy without buffering the catalog
+_IN_FLIGHT_PER_WORKER = 2
+
+
+@dataclass
+class PreparedChunk:
+    start: int                # doc id of the chunk's first item
+    texts: List[str]
+    meta: EncodedMeta
+    columns: CatalogColumns
+    postings: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    doc_len: np.ndarray
+
+
+def iter_catalog_chunks(catalog_jsonl: str | Path, chunk_size: int) -> Iterator[Tuple[int, List[str]]]:
+    """(first doc id, raw JSON lines) for consecutive chunks of a catalog file; blank lines skipped."""
+    start = 0
+    lines: List[str] = []
+    with open(catalog_jsonl, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                yield start, lines
+                start += len(lines)
+                lines = []
+    if lines:
+        yield start, lines
+
+
+def prepare_chunk(start: int, lines: List[str]) -> PreparedChunk:
+    items = [json.loads(line) for line in lines]
+    texts = [corpus_text(it) for it in items]
+    tokens = [_tokenize(t) for t in texts]
+    return PreparedChunk(
+        start=start,
+        texts=texts,
+        meta=EncodedMeta.from_items(items),
+        columns=CatalogColumns.from_meta(items),
+        postings=token_postings(tokens, range(start, start + len(items))),
+        doc_len=np.array([len(t) for t in tokens], dtype=np.int32),
+    )
+
+
+# Encoder of an encode worker process (loaded once by _init_encode_worker)
+_worker_encoder: Optional[QueryEncoder] = None
+
+
+def _init_encode_worker(embedding_model: str, torch_threads: int) -> None:
+    global _worker_encoder
+    if torch_threads > 0:
+        import torch
+        torch.set_num_threads(torch_threads)
+    _worker_encoder = load_encoder(embedding_model, backend="torch")
+
+
+def _encode_shard(texts: List[str]) -> np.ndarray:
+    assert _worker_encoder is not None
+    embs = _worker_encoder.encode(texts, batch_size=64, show_progress_bar=False, normalize_embeddings=True)
+    return np.asarray(embs, dtype=np.float32)
+
+
+def _done(value: Any) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+
+class _Inline:
+    """Executor stand-in that runs tasks immediately in this process."""
+
+    def __init__(self, initializer: Optional[Callable[..., None]] = None, initargs: tuple = ()):
+        self._init = (initializer, initargs) if initializer else None
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        if self._init is not None:
+            initializer, initargs = self._init
+            self._init = None
+            initializer(*initargs)
+        return _done(fn(*args))
+
+    def shutdown(self) -> None:
+        pass
+
+
+def build_streaming(
+    catalog_jsonl: str | Path,
+    index_dir: str | Path,
+    embedding_model: str,
+    embedding_dtype: str = "float32",
+    ann: bool = False,
+    ann_nlist: Optional[int] = None,
+    embedding_cache: Optional[EmbeddingCache] = None,
+    workers: int = 1,
+    encode_workers: int = 1,
+    chunk_size: int = 4096,
+    torch_threads: int = 0,
+    progress: bool = True,
+) -> Dict[str, Any]:
+    """Build <index_dir>/index.shlidx from a catalog file; returns counts and throughput.
+
+    `workers` / `encode_workers` <= 1 run that stage in this process. `torch_threads`
+    (default: cores // encode_workers) bounds each encode process's intra-op threads.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+
+    ctx = mp.get_context("spawn")
+    prep_pool: Any = ProcessPoolExecutor(workers, mp_context=ctx) if workers > 1 else _Inline()
+    if encode_workers > 1:
+        threads = torch_threads or max(1, (os.cpu_count() or 1) // encode_workers)
+        enc_pool: Any = ProcessPoolExecutor(
+            encode_workers, mp_context=ctx, initializer=_init_encode_worker, initargs=(embedding_model, threads)
+        )
+    else:
+        enc_pool = _Inline(_init_encode_worker, (embedding_model, torch_threads))
+
+    vec_path = index_dir / f".{BUNDLE_FILENAME}.vectors"
+    vec_file = open(vec_path, "w+b")
+    dim = 0
+    n_encoded = 0
+
+    meta_parts: List[EncodedMeta] = []
+    column_parts: List[CatalogColumns] = []
+    posting_parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+    doc_len_parts: List[np.ndarray] = []
+    # (future, first doc id, row keys, cached rows, keys sent to the encoder)
+    encoding: List[Tuple[Future, int, List[str], Dict[str, np.ndarray], List[str]]] = []
+    bar = tqdm(desc="Indexing", unit="doc", disable=not progress)
+
+    def finish(job: Tuple[Future, int, List[str], Dict[str, np.ndarray], List[str]]) -> None:
+        nonlocal dim
+        fut, start, keys, found, sent = job
+        vectors = fut.result()
+        if embedding_cache is not None:
+            if sent:
+                embedding_cache.put_many(embedding_model, sent, vectors)
+                found.update(zip(sent, vectors))
+            vectors = np.stack([found[k] for k in keys])
+        dim = dim or vectors.shape[1]
+        vec_file.seek(start * dim * 4)
+        vec_file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        bar.update(len(vectors))
+
+    try:
+        max_prep = _IN_FLIGHT_PER_WORKER * max(1, workers)
+        max_enc = _IN_FLIGHT_PER_WORKER * max(1, encode_workers)
+        prepared: Deque[Future] = deque()
+        chunks = iter_catalog_chunks(catalog_jsonl, chunk_size)
+        exhausted = False
+        while prepared or not exhausted:
+            while not exhausted and len(prepared) < max_prep:
+                nxt = next(chunks, None)
+                if nxt is None:
+                    exhausted = True
+                else:
+                    prepared.append(prep_pool.submit(prepare_chunk, *nxt))
+            if not prepared:
+                break
+            chunk: PreparedChunk = prepared.popleft().result()
+            meta_parts.append(chunk.meta)
+            column_parts.append(chunk.columns)
+            posting_parts.append(chunk.postings)
+            doc_len_parts.append(chunk.doc_len)
+
+            if embedding_cache is not None:
+                keys, found, missing = embedding_cache.lookup(embedding_model, chunk.texts)
+                sent, texts = list(missing), list(missing.values())
+            else:
+                keys, found, sent, texts = [], {}, [], chunk.texts
+            fut = enc_pool.submit(_encode_shard, texts) if texts else _done(np.empty((0, dim), np.float32))
+            n_encoded += len(texts)
+            encoding.append((fut, chunk.start, keys, found, sent))
+
+            # Bound the shards in flight; write finished ones as they complete
+            while len(encoding) >= max_enc:
+                wait([job[0] for job in encoding], return_when=FIRST_COMPLETED)
+                for job in [job for job in encoding if job[0].done()]:
+                    finish(job)
+                    encoding.remove(job)
+        for job in encoding:
+            finish(job)
+    except BaseException:
+        vec_file.close()
+        vec_path.unlink(missing_ok=True)
+        raise
+    finally:
+        prep_pool.shutdown()
+        enc_pool.shutdown()
+        bar.close()
+        vec_file.close()
+
+    try:
+        n_docs = sum(len(p) for p in meta_parts)
+        if n_docs == 0:
+            raise ValueError(f"No catalog items in {catalog_jsonl}")
+        embeddings = np.memmap(vec_path, dtype=np.float32, mode="r", shape=(n_docs, dim))
+        bm25 = SparseBM25.from_postings(posting_parts, np.concatenate(doc_len_parts))
+        write_bundle(
+            index_dir / BUNDLE_FILENAME,
+            EncodedMeta.concat(meta_parts),
+            bm25,
+            CatalogColumns.concat(column_parts),
+            embeddings,
+            embedding_model=embedding_model,
+            embedding_dtype=embedding_dtype,
+            ivf=IVFIndex.build(embeddings, nlist=ann_nlist) if ann else None,
+        )
+        del embeddings
+    finally:
+        vec_path.unlink(missing_ok=True)
+
+    seconds = time.perf_counter() - t0
+    return {
+        "n_docs": n_docs,
+        "encoded": n_encoded,
+        "seconds": round(seconds, 3),
+        "docs_per_s": round(n_docs / seconds, 1) if seconds > 0 else 0.0,
+    }
@@ -0,0 +1,363 @@
+"""
+Caching primitives shared by the retrieval and LLM layers: an in-process LRU, a
+persistent SQLite-backed key/value store, and single-flight coalescing of concurrent
+cache misses.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, Mapping, Optional, Set, Tuple, TypeVar
+
+from .telemetry import count
+from .utils import canonical_shl_url, normalize_whitespace
+
+T = TypeVar("T")
+
+
+class LRUCache:
+    """Thread-safe bounded mapping with least-recently-used eviction and hit/miss counters.
+
+    With `ttl_s`, entries older than that many seconds count as misses and are dropped.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_s: Optional[float] = None):
+        self.max_size = max(0, int(max_size))
+        self.ttl_s = ttl_s if ttl_s and ttl_s > 0 else None
+        # key -> (expires_at or None, value)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_size == 0:
+            return
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def items(self):
+        """Snapshot of (key, value) pairs, least recently used first."""
+        with self._lock:
+            return [(k, v) for k, (_, v) in self._data.items()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+class SQLiteCache:
+    """Persistent key -> JSON value store on SQLite (WAL mode), fronted by an in-memory LRU.
+
+    Lookups cost one dict probe on a memory hit and one indexed SELECT otherwise, independent
+    of the cache size. Writes are single-row transactions, so several worker processes can
+    share the file without losing each other's entries. `max_entries` evicts least recently
+    used rows; `ttl_s` expires rows by age. With `path=None` the cache is memory-only.
+    """
+
+    _EVICT_EVERY = 256
+
+    def __init__(
+        self,
+        path: Optional[str | Path],
+        max_entries: int = 0,
+        ttl_s: Optional[float] = None,
+        memory_size: int = 4096,
+        migrate_from: Optional[str | Path] = None,
+    ):
+        self.path = Path(path) if path else None
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_s = ttl_s if ttl_s and ttl_s > 0 else None
+        self._memory = LRUCache(memory_size, ttl_s=self.ttl_s)
+        self._local = threading.local()
+        self._writes = 0
+        self.disk_hits = 0
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fresh = not self.path.exists()
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn().execute("CREATE INDEX IF NOT EXISTS kv_accessed ON kv (accessed_at)")
+            if fresh and migrate_from is not None:
+                self.migrate_json(migrate_from)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._memory.get(key)
+        if value is not None or self.path is None:
+            return value
+        row = self._conn().execute("SELECT value, created_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if self.ttl_s and now - row[1] > self.ttl_s:
+            self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+            return None
+        self._conn().execute("UPDATE kv SET accessed_at = ? WHERE key = ?", (now, key))
+        value = json.loads(row[0])
+        self._memory.put(key, value)
+        self.disk_hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._memory.put(key, value)
+        if self.path is None:
+            return
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now, now),
+        )
+        self._writes += 1
+        if self._writes % self._EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired rows, then least recently used rows beyond `max_entries`. Returns rows removed."""
+        if self.path is None:
+            return 0
+        conn = self._conn()
+        removed = 0
+        if self.ttl_s:
+            removed += conn.execute("DELETE FROM kv WHERE created_at < ?", (time.time() - self.ttl_s,)).rowcount
+        if self.max_entries:
+            removed += conn.execute(
+                "DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        return removed
+
+    def scan(self, prefix: str = "") -> Iterator[Tuple[str, Any]]:
+        """All unexpired (key, value) pairs whose key starts with `prefix` (for offline jobs)."""
+        if self.path is None:
+            for key, value in self._memory.items():
+                if isinstance(key, str) and key.startswith(prefix):
+                    yield key, value
+            return
+        cutoff = time.time() - self.ttl_s if self.ttl_s else 0.0
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND created_at >= ? ORDER BY key",
+            (prefix, prefix + "\U0010ffff", cutoff),
+        )
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def migrate_json(self, json_path: str | Path) -> int:
+        """Import entries from a legacy JSON cache file (existing keys win). Returns rows imported."""
+        json_path = Path(json_path)
+        if self.path is None or not json_path.exists():
+            return 0
+        try:
+            data = json.loads(json_path.read_text(encoding="utf-8"))
+        except Exception:
+            return 0
+        if not isinstance(data, dict):
+            return 0
+        now = time.time()
+        conn = self._conn()
+        before = conn.total_changes
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR IGNORE INTO kv (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False), now, now) for k, v in data.items()],
+        )
+        conn.execute("COMMIT")
+        return conn.total_changes - before
+
+    def __len__(self) -> int:
+        if self.path is None:
+            return len(self._memory)
+        return int(self._conn().execute("SELECT COUNT(*) FROM kv").fetchone()[0])
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._memory.stats()
+        # A memory miss answered from disk is a hit for the cache as a whole
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        stats["disk_hits"] = self.disk_hits
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] / total) if total else 0.0
+        return stats
+
+
+def open_cache(path: Optional[str | Path], **kwargs: Any) -> SQLiteCache:
+    """Open the cache for `path`; a legacy `.json` path maps to a `.sqlite` file next to it,
+    importing the JSON entries the first time."""
+    if path is None:
+        return SQLiteCache(None, **kwargs)
+    path = Path(path)
+    if path.suffix == ".json":
+        return SQLiteCache(path.with_suffix(".sqlite"), migrate_from=path, **kwargs)
+    return SQLiteCache(path, **kwargs)
+
+
+class RerankScoreCache:
+    """Reranker relevance scores keyed on (reranker version, normalized query, item).
+
+    `version` names the scorer (model and prompt), so changing either starts a fresh key
+    space. Backed by a SQLiteCache shared across requests and processes; `path=None`
+    keeps it in memory. Queries are lower-cased in keys unless `case_sensitive` is set
+    (for scorers that see case).
+    """
+
+    def __init__(self, path: Optional[str | Path], version: str, case_sensitive: bool = False, **kwargs: Any):
+        self.version = version
+        self.case_sensitive = case_sensitive
+        self._cache = open_cache(path, **kwargs)
+
+    @staticmethod
+    def item_key(item: Mapping[str, Any]) -> str:
+        return canonical_shl_url(item.get("url", "")) or f"name:{item.get('name', '')}"
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return normalize_whitespace(query).lower()
+
+    def query_key(self, query: str) -> str:
+        """The form of `query` that keys (and should be scored for) cache entries."""
+        return normalize_whitespace(query) if self.case_sensitive else self.normalize_query(query)
+
+    def _key(self, query: str, item_key: str) -> str:
+        return f"rerank::{self.version}::{self.query_key(query)}::{item_key}"
+
+    def get_many(self, query: str, item_keys: Iterable[str]) -> Dict[str, float]:
+        """Cached scores of the given items (uncached items are absent)."""
+        found: Dict[str, float] = {}
+        for key in item_keys:
+            score = self._cache.get(self._key(query, key))
+            if score is not None:
+                found[key] = float(score)
+        return found
+
+    def put_many(self, query: str, scores: Mapping[str, float]) -> None:
+        for key, score in scores.items():
+            self._cache.set(self._key(query, key), float(score))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution.
+
+    The first caller of a key runs the work; callers arriving while it is in flight wait
+    for its result (or exception) instead of repeating it, and are counted as
+    `<name>_coalesced`. Nothing is kept after completion: the work fills its cache.
+    Threads (`do`) and coroutines on any event loop (`ado`) share the same flights.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                count(f"{self.name}_coalesced")
+                return fut, False
+            fut = self._calls[key] = Future()
+            return fut, True
+
+    def _finish(self, key: Hashable, fut: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        fut, leader = self._join(key)
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            self._finish(key, fut)
+        fut.set_result(result)
+        return result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """`do` for coroutines. The work runs as its own task, so a caller that gives up
+        (e.g. on a deadline) neither cancels it for the others nor loses its cache fill."""
+        fut, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            self._tasks.add(task)
+
+            def done(t: asyncio.Task) -> None:
+                self._tasks.discard(t)
+                self._finish(key, fut)
+                if t.cancelled():
+                    # Only at loop shutdown; waiters get an ordinary error
+                    fut.set_exception(RuntimeError(f"{self.name} call cancelled"))
+                elif t.exception() is not None:
+                    fut.set_exception(t.exception())
+                else:
+                    fut.set_result(t.result())
+
+            task.add_done_callback(done)
+        return await asyncio.shield(asyncio.wrap_future(fut))
@@ -0,0 +1,199 @@
+"""
+Columnar view of the catalog metadata, cleaned once at index build time.
+
+The recommendation hot path filters and balances candidates on these arrays and only
+turns the final results back into dicts (see CatalogColumns.materialize).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .utils import TEST_TYPE_MAP, canonical_shl_url
+
+# Bit i of test_type_mask <-> i-th letter of TEST_TYPE_MAP ("A", "B", ..., "S")
+TEST_TYPE_LETTERS = tuple(TEST_TYPE_MAP)
+_LETTER_BY_NAME = {name: letter for letter, name in TEST_TYPE_MAP.items()}
+
+# kp_flags bits, with the same substring rules balancing uses to tag test types
+KP_KNOWLEDGE = 1
+KP_PERSONALITY = 2
+
+# Duration limits (minutes) with a precomputed "0 < duration <= limit" bitset
+DURATION_BUCKETS = (10, 15, 20, 30, 40, 45, 60, 90)
+
+# Set bits per byte value, for counting packed bitsets
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+def test_type_bit(letter: str) -> int:
+    return 1 << TEST_TYPE_LETTERS.index(letter)
+
+
+def pack_mask(mask: np.ndarray) -> np.ndarray:
+    """Boolean per-document mask -> packed bitset (bit i = document i, unused tail bits 0)."""
+    return np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+
+
+def unpack_bits(bits: np.ndarray, n_docs: int) -> np.ndarray:
+    return np.unpackbits(bits, count=n_docs, bitorder="little").astype(bool)
+
+
+def popcount(bits: np.ndarray) -> int:
+    return int(_POPCOUNT[bits].sum())
+
+
+def _to_int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass
+class CatalogColumns:
+    duration: np.ndarray        # int32 minutes, 0 = unknown
+    remote: np.ndarray          # bool, remote_support (missing counts as "Yes")
+    adaptive: np.ndarray        # bool, adaptive_support (missing counts as "No")
+    test_type_mask: np.ndarray  # uint8 bitmask over TEST_TYPE_LETTERS
+    kp_flags: np.ndarray        # uint8 KP_KNOWLEDGE | KP_PERSONALITY
+    url_id: np.ndarray          # int32 index into urls (-1 = no url); equal ids = same canonical URL
+    urls: np.ndarray            # unique canonical URLs
+    # Packed attribute bitsets, one row per bit_names entry: "remote", "adaptive",
+    # "type:<letter>" and "duration<=<minutes>" for each DURATION_BUCKETS limit
+    bits: Optional[np.ndarray] = None
+    bit_names: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        if self.bits is None or self.bit_names is None:
+            self.bit_names, self.bits = self._build_bitsets()
+        self._bit_row = {str(name): i for i, name in enumerate(self.bit_names)}
+
+    @classmethod
+    def from_meta(cls, meta: Sequence[Dict[str, Any]]) -> "CatalogColumns":
+        n = len(meta)
+        duration = np.zeros(n, dtype=np.int32)
+        remote = np.zeros(n, dtype=bool)
+        adaptive = np.zeros(n, dtype=bool)
+        test_type_mask = np.zeros(n, dtype=np.uint8)
+        kp_flags = np.zeros(n, dtype=np.uint8)
+        url_id = np.full(n, -1, dtype=np.int32)
+        url_index: Dict[str, int] = {}
+
+        for i, it in enumerate(meta):
+            duration[i] = _to_int(it.get("duration"))
+            remote[i] = str(it.get("remote_support") or "Yes").lower().startswith("y")
+            adaptive[i] = str(it.get("adaptive_support") or "No").lower().startswith("y")
+
+            names = list(it.get("test_type") or [])
+            mask = 0
+            for name in names:
+                letter = _LETTER_BY_NAME.get(name)
+                if letter:
+                    mask |= test_type_bit(letter)
+            test_type_mask[i] = mask
+            lowered = [t.lower() for t in names]
+            if any("knowledge" in t for t in lowered):
+                kp_flags[i] |= KP_KNOWLEDGE
+            if any("personality" in t or "behavior" in t for t in lowered):
+                kp_flags[i] |= KP_PERSONALITY
+
+            url = canonical_shl_url(it.get("url", ""))
+            if url:
+                url_id[i] = url_index.setdefault(url, len(url_index))
+
+        return cls(
+            duration=duration,
+            remote=remote,
+            adaptive=adaptive,
+            test_type_mask=test_type_mask,
+            kp_flags=kp_flags,
+            url_id=url_id,
+            urls=np.array(list(url_index), dtype=str),
+        )
+
+    @classmethod
+    def concat(cls, parts: Sequence["CatalogColumns"]) -> "CatalogColumns":
+        """Columns of consecutive catalog chunks, as from_meta over the whole catalog would build them."""
+        url_index: Dict[str, int] = {}
+        url_ids = []
+        for p in parts:
+            remap = np.array([url_index.setdefault(str(u), len(url_index)) for u in p.urls] + [-1], dtype=np.int32)
+            # url_id -1 indexes the trailing -1 of remap
+            url_ids.append(remap[p.url_id])
+        return cls(
+            duration=np.concatenate([p.duration for p in parts]),
+            remote=np.concatenate([p.remote for p in parts]),
+            adaptive=np.concatenate([p.adaptive for p in parts]),
+            test_type_mask=np.concatenate([p.test_type_mask for p in parts]),
+            kp_flags=np.concatenate([p.kp_flags for p in parts]),
+            url_id=np.concatenate(url_ids).astype(np.int32),
+            urls=np.array(list(url_index), dtype=str),
+        )
+
+    def save(self, path: str | Path) -> None:
+        np.savez_compressed(
+            path,
+            duration=self.duration,
+            remote=self.remote,
+            adaptive=self.adaptive,
+            test_type_mask=self.test_type_mask,
+            kp_flags=self.kp_flags,
+            url_id=self.url_id,
+            urls=self.urls,
+            bits=self.bits,
+            bit_names=self.bit_names,
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "CatalogColumns":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(**{name: z[name] for name in z.files})
+
+    def _build_bitsets(self) -> Tuple[np.ndarray, np.ndarray]:
+        masks: Dict[str, np.ndarray] = {"remote": self.remote, "adaptive": self.adaptive}
+        for letter in TEST_TYPE_LETTERS:
+            masks[f"type:{letter}"] = (self.test_type_mask & test_type_bit(letter)) != 0
+        for limit in DURATION_BUCKETS:
+            masks[f"duration<={limit}"] = (self.duration > 0) & (self.duration <= limit)
+        names = np.array(list(masks), dtype=str)
+        return names, np.stack([pack_mask(m) for m in masks.values()])
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.duration)
+
+    def bitset(self, name: str) -> np.ndarray:
+        """Packed bitset of one attribute (see bit_names)."""
+        return self.bits[self._bit_row[name]]
+
+    def duration_bitset(self, limit_minutes: int) -> np.ndarray:
+        """Documents with a known duration of at most `limit_minutes`."""
+        row = self._bit_row.get(f"duration<={int(limit_minutes)}")
+        if row is not None:
+            return self.bits[row]
+        return pack_mask((self.duration > 0) & (self.duration <= limit_minutes))
+
+    def url(self, doc_id: int) -> str:
+        uid = int(self.url_id[doc_id])
+        return str(self.urls[uid]) if uid >= 0 else ""
+
+    def materialize(self, meta: Sequence[Dict[str, Any]], doc_id: int, score: float) -> Dict[str, Any]:
+        """Response dict for one document, with the cleaned fields the API contract expects."""
+        it = dict(meta[doc_id])
+        it["_score"] = score
+        it["url"] = self.url(doc_id)
+        # Ensure required fields exist with proper types
+        it["adaptive_support"] = (it.get("adaptive_support") or "No")
+        it["remote_support"] = (it.get("remote_support") or "Yes")
+        it["duration"] = int(self.duration[doc_id])
+        it["test_type"] = list(it.get("test_type") or [])
+        it["description"] = it.get("description") or ""
+        it["name"] = it.get("name") or ""
+        return it
+
+    def materialize_many(self, meta: Sequence[Dict[str, Any]], doc_ids: Sequence[int], scores: Sequence[float]) -> List[Dict[str, Any]]:
+        return [self.materialize(meta, int(d), float(s)) for d, s in zip(doc_ids, scores)]
@@ -0,0 +1,50 @@
+"""
+Hard constraints from the query intent (duration limit, remote support) evaluated on the
+index's packed attribute bitsets, so they can be applied to the score vector before the
+top-n candidate pool is cut.
+"""
+from __future__ import annotations
+
+from typing import List, Optional
+
+import numpy as np
+
+from .catalog_columns import CatalogColumns, pack_mask, popcount, unpack_bits
+from .llm_gemini import Intent
+
+# A constraint is dropped (relaxed) when it would leave fewer results than this
+MIN_CONSTRAINED_RESULTS = 5
+
+
+class ConstraintSet:
+    """Ordered bitset filters. Each one is applied only if at least `min_results`
+    documents still pass it together with the filters kept before it."""
+
+    def __init__(self, n_docs: int, bitsets: Optional[List[np.ndarray]] = None, min_results: int = MIN_CONSTRAINED_RESULTS):
+        self.n_docs = n_docs
+        self.bitsets = list(bitsets or [])
+        self.min_results = min_results
+
+    @classmethod
+    def from_intent(cls, intent: Intent, columns: CatalogColumns, min_results: int = MIN_CONSTRAINED_RESULTS) -> "ConstraintSet":
+        bitsets = []
+        if intent.duration_limit_minutes is not None:
+            bitsets.append(columns.duration_bitset(intent.duration_limit_minutes))
+        if intent.remote_required is True:
+            bitsets.append(columns.bitset("remote"))
+        return cls(columns.n_docs, bitsets, min_results=min_results)
+
+    def __bool__(self) -> bool:
+        return bool(self.bitsets)
+
+    def mask(self, available: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean mask of allowed documents; `available` restricts the count to scored docs."""
+        if available is None:
+            keep = pack_mask(np.ones(self.n_docs, dtype=bool))
+        else:
+            keep = pack_mask(available)
+        for bits in self.bitsets:
+            narrowed = keep & bits
+            if popcount(narrowed) >= self.min_results:
+                keep = narrowed
+        return unpack_bits(keep, self.n_docs)
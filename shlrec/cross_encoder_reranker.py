@@ -0,0 +1,147 @@
+"""
+Local reranking with a small cross-encoder on CPU, as a drop-in alternative to GeminiReranker.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .caching import RerankScoreCache
+from .indexer import corpus_text
+from .settings import Settings
+from .telemetry import count, stage
+
+
+class CrossEncoderReranker:
+    """Scores (query, assessment text) pairs with a sentence-transformers CrossEncoder.
+
+    All uncached pairs of a call go through one forward pass; scores are cached per
+    (model, normalized query, item) in a RerankScoreCache. Same interface and score
+    blend as GeminiReranker.rerank.
+
+    Whether raw outputs are logits (squashed with a sigmoid) is decided once per model,
+    from CROSS_ENCODER_OUTPUT or the model's configured activation, so every cached score
+    is on the same 0..1 scale. The query is lower-cased only for models whose tokenizer
+    lower-cases anyway; for cased models cache keys keep the case.
+    """
+
+    def __init__(self, settings: Settings, model: Any = None, cache_path: Optional[str] = None):
+        self.settings = settings
+        self.model_name = settings.cross_encoder_model
+        self.max_candidates = settings.cross_encoder_max_candidates
+        self._model = model
+        self._load_failed = False
+        self._sigmoid: Optional[bool] = None
+        self._cased: Optional[bool] = None
+        if settings.cross_encoder_output not in ("auto", "logit", "probability"):
+            raise ValueError(
+                f"Unknown CROSS_ENCODER_OUTPUT {settings.cross_encoder_output!r}; expected auto, logit or probability"
+            )
+        self.cache = RerankScoreCache(
+            cache_path,
+            version=f"cross_encoder:{self.model_name}:{settings.cross_encoder_output}",
+            max_entries=settings.llm_cache_max_entries,
+            ttl_s=settings.llm_cache_ttl_s,
+            memory_size=settings.rerank_cache_size,
+        )
+
+    def _lazy_init(self) -> bool:
+        if self._model is not None:
+            return True
+        if self._load_failed:
+            return False
+        try:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu")
+            return True
+        except Exception:
+            self._load_failed = True
+            return False
+
+    def _outputs_logits(self) -> bool:
+        """Whether the model's raw outputs need a sigmoid; resolved on first use."""
+        if self._sigmoid is None:
+            output = self.settings.cross_encoder_output
+            if output == "auto":
+                # sentence-transformers applies `activation_fn` (older releases:
+                # `default_activation_function`) in predict(); anything but a sigmoid,
+                # e.g. Identity from the model config, leaves logits
+                act = getattr(self._model, "activation_fn", None) or getattr(self._model, "default_activation_function", None)
+                output = "probability" if type(act).__name__ == "Sigmoid" else "logit"
+            self._sigmoid = output == "logit"
+        return self._sigmoid
+
+    def _query_text(self, query: str) -> str:
+        """The query sent to the model, which is also its cache key."""
+        if self._cased is None:
+            # Only a tokenizer known to lower-case makes lower-casing the query lossless
+            tokenizer = getattr(self._model, "tokenizer", None)
+            self._cased = not getattr(tokenizer, "do_lower_case", False)
+            self.cache.case_sensitive = self._cased
+        return self.cache.query_key(query)
+
+    def score(self, query: str, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        """Relevance in 0..1 of each candidate to `query`."""
+        q = self._query_text(query)
+        keys = [RerankScoreCache.item_key(c) for c in candidates]
+        cached = self.cache.get_many(q, keys)
+        scores = np.empty(len(candidates), dtype=np.float64)
+        missing: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            if key in cached:
+                scores[i] = cached[key]
+            else:
+                missing.setdefault(key, []).append(i)
+        if missing:
+            count("rerank_cache_miss", len(missing))
+            pairs = [(q, corpus_text(candidates[rows[0]])) for rows in missing.values()]
+            with stage("cross_encoder"):
+                raw = np.asarray(
+                    self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False), dtype=np.float64
+                ).reshape(-1)
+            if self._outputs_logits():
+                raw = 1.0 / (1.0 + np.exp(-raw))
+            fresh = {}
+            for (key, rows), s in zip(missing.items(), raw):
+                fresh[key] = float(s)
+                scores[rows] = s
+            self.cache.put_many(q, fresh)
+        count("rerank_cache_hit", len(candidates) - sum(len(r) for r in missing.values()))
+        return scores
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Dict[str, Any]],
+        top_k: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """
+        Rerank candidates with the cross-encoder (the first `cross_encoder_max_candidates`;
+        the rest get a neutral 0.5, like items Gemini does not score).
+        Falls back to input order if the model cannot be loaded.
+        """
+        if not self._lazy_init():
+            return candidates[:top_k]
+
+        if not candidates:
+            return []
+
+        try:
+            n = len(candidates) if self.max_candidates <= 0 else min(len(candidates), self.max_candidates)
+            model_scores = np.full(len(candidates), 0.5)
+            model_scores[:n] = self.score(query, candidates[:n])
+        except Exception:
+            # Gracefully fall back to original order
+            return candidates[:top_k]
+
+        scored_candidates = []
+        for c, model_score in zip(candidates, model_scores):
+            # Blend original and model scores, as GeminiReranker does
+            c_copy = dict(c)
+            c_copy["_score"] = 0.5 * c.get("_score", 0.0) + 0.5 * float(model_score)
+            c_copy["_llm_score"] = float(model_score)
+            scored_candidates.append(c_copy)
+
+        scored_candidates.sort(key=lambda x: x.get("_score", 0.0), reverse=True)
+        return scored_candidates[:top_k]
@@ -0,0 +1,117 @@
+"""
+Content-addressed cache of document embeddings for index builds.
+
+Vectors are keyed on (model name, sha1 of the exact text encoded), so rebuilding an
+unchanged catalog, or switching back to a corpus text variant tried before, skips the
+encoder for every text it has already seen. Stored in SQLite (WAL) as raw float32 blobs.
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Keys per SELECT (stays under SQLite's bound-parameter limit)
+_LOOKUP_CHUNK = 500
+
+
+def text_sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """(model, text hash) -> float32 vector store with hit/miss counters for the current process."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_sha1 TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+            " created_at REAL NOT NULL, PRIMARY KEY (model, text_sha1))"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for the given text hashes (missing keys are absent from the result)."""
+        found: Dict[str, np.ndarray] = {}
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[start:start + _LOOKUP_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT text_sha1, vector FROM embeddings WHERE model = ? AND text_sha1 IN ({','.join('?' * len(chunk))})",
+                (model, *chunk),
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, keys: Sequence[str], vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = [(model, key, int(vec.shape[0]), vec.tobytes(), now) for key, vec in zip(keys, vectors)]
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_sha1, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            # Never leave the connection inside the explicit transaction
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+
+    def lookup(self, model: str, texts: Sequence[str]) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        """Split `texts` into cache hits and distinct misses: (keys, key -> vector, key -> text to encode)."""
+        keys = [text_sha1(t) for t in texts]
+        found = self.get_many(model, keys)
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        n_hits = sum(1 for key in keys if key in found)
+        self.hits += n_hits
+        self.misses += len(keys) - n_hits
+        return keys, found, missing
+
+    def encode(
+        self,
+        model: str,
+        texts: Sequence[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """Embeddings of `texts` in order: cached rows are reused, the distinct misses are
+        encoded with one `encode_fn` call and written back."""
+        keys, found, missing = self.lookup(model, texts)
+        if missing:
+            vectors = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            self.put_many(model, list(missing), vectors)
+            found.update(zip(missing, vectors))
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def evict_model(self, model: str) -> int:
+        """Drop every vector of `model`. Returns rows removed."""
+        return self._conn.execute("DELETE FROM embeddings WHERE model = ?", (model,)).rowcount
+
+    def models(self) -> Dict[str, int]:
+        """Cached vector count per model."""
+        return dict(self._conn.execute("SELECT model, COUNT(*) FROM embeddings GROUP BY model").fetchall())
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": (self.hits / total) if total else 0.0}
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,119 @@
+"""
+Catalog embedding storage: float32, float16 or int8 (per-vector scale) matrices opened
+with memory mapping, so every worker process shares the same OS page-cache pages.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+# Rows dequantized per block in matmuls: bounds the float32 scratch memory for big catalogs
+_BLOCK_ROWS = 16384
+
+
+def _vector_files(dtype: str) -> Tuple[str, Optional[str]]:
+    if dtype == "float16":
+        return "embeddings.f16.npy", None
+    if dtype == "int8":
+        return "embeddings.i8.npy", "embeddings.scales.npy"
+    return "embeddings.npy", None
+
+
+def quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: row ~= q.astype(float32) * scale."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def save_embeddings(index_dir: str | Path, embeddings: np.ndarray, dtype: str = "float32") -> None:
+    """Write embeddings.npy (always, exact float32) plus the compact copy for `dtype`."""
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unknown embedding dtype {dtype!r}; expected one of {EMBEDDING_DTYPES}")
+    index_dir = Path(index_dir)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    np.save(index_dir / "embeddings.npy", embeddings)
+
+    vec_file, scale_file = _vector_files(dtype)
+    if dtype == "float16":
+        np.save(index_dir / vec_file, embeddings.astype(np.float16))
+    elif dtype == "int8":
+        q, scales = quantize_int8(embeddings)
+        np.save(index_dir / vec_file, q)
+        np.save(index_dir / scale_file, scales)
+
+
+class EmbeddingStore:
+    """Read-only (n_docs, dim) embedding matrix, possibly quantized.
+
+    Behaves like the float32 array it replaces for the operations retrieval uses:
+    ``store @ q`` for a (dim,) or (dim, Q) query, ``store[ids]`` for dequantized rows,
+    ``shape`` and ``len``. ``exact_scores`` rescores selected rows against the float32 copy.
+    """
+
+    def __init__(self, vectors: np.ndarray, scales: Optional[np.ndarray] = None, exact: Optional[np.ndarray] = None):
+        self.vectors = vectors
+        self.scales = scales
+        self.exact = exact
+
+    @classmethod
+    def open(cls, index_dir: str | Path, dtype: str = "float32", mmap: bool = True) -> "EmbeddingStore":
+        """Open the `dtype` copy from an index dir, falling back to float32 if it was not built."""
+        index_dir = Path(index_dir)
+        mode = "r" if mmap else None
+        exact = np.load(index_dir / "embeddings.npy", mmap_mode=mode)
+
+        vec_file, scale_file = _vector_files(dtype)
+        if dtype == "float32" or not (index_dir / vec_file).exists():
+            return cls(exact)
+        vectors = np.load(index_dir / vec_file, mmap_mode=mode)
+        scales = np.load(index_dir / scale_file) if scale_file else None
+        return cls(vectors, scales=scales, exact=exact)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.vectors.shape
+
+    @property
+    def is_quantized(self) -> bool:
+        return self.vectors.dtype != np.float32
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def __getitem__(self, ids) -> np.ndarray:
+        rows = np.asarray(self.vectors[ids], dtype=np.float32)
+        if self.scales is not None:
+            rows = rows * np.asarray(self.scales[ids])[..., None]
+        return rows
+
+    def __matmul__(self, q: np.ndarray) -> np.ndarray:
+        q = np.asarray(q, dtype=np.float32)
+        if not self.is_quantized:
+            return np.asarray(self.vectors @ q)
+
+        n = self.vectors.shape[0]
+        out = np.empty((n,) + q.shape[1:], dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, n)
+            block = np.asarray(self.vectors[start:stop], dtype=np.float32) @ q
+            if self.scales is not None:
+                block *= self.scales[start:stop].reshape((-1,) + (1,) * (q.ndim - 1))
+            out[start:stop] = block
+        return out
+
+    def exact_rows(self, ids) -> np.ndarray:
+        """Rows `ids` in float32 from the exact copy (dequantized if there is none)."""
+        if self.exact is not None:
+            return np.asarray(self.exact[ids], dtype=np.float32)
+        return self[ids]
+
+    def exact_scores(self, ids: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """Float32 dot products of `q` with rows `ids` (dequantized rows if there is no exact copy)."""
+        return np.asarray(self.exact_rows(ids) @ np.asarray(q, dtype=np.float32))
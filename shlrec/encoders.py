@@ -0,0 +1,310 @@
+"""
+Query/document encoders behind a common ``encode(texts, normalize_embeddings=True)`` interface.
+
+Backends:
+- "torch": the full sentence-transformers model (default, also used to build indexes).
+- "onnx":  an exported, int8-quantized copy of the same model run with onnxruntime and the
+           `tokenizers` library only, so serving processes never import torch.
+           Create it with `scripts/export_onnx_encoder.py`; files live in <index_dir>/onnx.
+
+MicroBatchEncoder wraps either backend to share forward passes between concurrent callers.
+"""
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, List, Optional, Protocol, Sequence
+
+import numpy as np
+
+from .telemetry import REGISTRY, count
+
+ONNX_DIRNAME = "onnx"
+ENCODER_BACKENDS = ("torch", "onnx")
+
+
+class QueryEncoder(Protocol):
+    def encode(self, sentences: Sequence[str], normalize_embeddings: bool = True, **kwargs: Any) -> np.ndarray:
+        ...
+
+
+class OnnxEncoder:
+    """Mean-pooled transformer embeddings (sentence-transformers semantics) via onnxruntime."""
+
+    def __init__(self, model_dir: str | Path, num_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        cfg = json.loads((model_dir / "encoder.json").read_text(encoding="utf-8"))
+        self.model_name = cfg["model_name"]
+        self.model_file = cfg["model_file"]
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=int(cfg["max_seq_length"]))
+        pad_token = cfg.get("pad_token", "[PAD]")
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        opts = ort.SessionOptions()
+        if num_threads > 0:
+            opts.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            str(model_dir / cfg["model_file"]), sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(
+        self,
+        sentences: Sequence[str],
+        normalize_embeddings: bool = True,
+        batch_size: int = 32,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        out: List[np.ndarray] = []
+        for start in range(0, len(sentences), batch_size):
+            encs = self.tokenizer.encode_batch(list(sentences[start:start + batch_size]))
+            feeds = {
+                "input_ids": np.array([e.ids for e in encs], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encs], dtype=np.int64),
+            }
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encs], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+
+            # Mean pooling over real tokens, as the sentence-transformers Pooling module does
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            out.append(emb.astype(np.float32))
+        if not out:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(out)
+
+
+@dataclass
+class _EncodeRequest:
+    texts: List[str]
+    normalize: bool
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    result: Future = field(default_factory=Future)
+
+
+class MicroBatchEncoder:
+    """Coalesces concurrent encode() calls into shared forward passes of `encoder`.
+
+    A single worker thread runs the passes. A call that finds it idle is encoded at once,
+    so a lone request pays no added wait; calls arriving during a pass queue up and go
+    into the next one together. While there is a backlog (the last pass was shared or
+    left calls queued), a pass keeps collecting for up to `max_wait_ms` or until it holds
+    `max_batch` texts. Calls with extra encode() keyword arguments bypass batching.
+
+    A call not answered within `timeout_s` (<= 0: no limit) is withdrawn and encoded
+    directly in the calling thread. A worker that dies fails its pending calls and is
+    restarted by the next one.
+
+    Exports the `encode_batch_size` histogram and the `encode_queue` / `encode_forward` stages.
+    """
+
+    def __init__(self, encoder: QueryEncoder, max_batch: int = 32, max_wait_ms: float = 2.0, timeout_s: float = 10.0):
+        self.encoder = encoder
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout_s = float(timeout_s)
+        self._queue: "queue.Queue[Optional[_EncodeRequest]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def encode(self, sentences: Sequence[str], normalize_embeddings: bool = True, **kwargs: Any) -> np.ndarray:
+        if kwargs or not len(sentences):
+            return self.encoder.encode(sentences, normalize_embeddings=normalize_embeddings, **kwargs)
+        self._ensure_worker()
+        req = _EncodeRequest(list(sentences), bool(normalize_embeddings))
+        self._queue.put(req)
+        try:
+            return req.result.result(timeout=self.timeout_s if self.timeout_s > 0 else None)
+        except FutureTimeout:
+            # Withdrawn unless the worker has started on it; either way, stop waiting for it
+            req.result.cancel()
+            count("encode_batch_timeout")
+            return np.asarray(
+                self.encoder.encode(req.texts, normalize_embeddings=req.normalize), dtype=np.float32
+            )
+
+    def close(self) -> None:
+        """Stop the worker thread once the queued calls are done."""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _ensure_worker(self) -> None:
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            with self._start_lock:
+                worker = self._worker
+                if worker is None or not worker.is_alive():
+                    if worker is not None:
+                        count("encode_worker_restart")
+                    worker = threading.Thread(target=self._run, name="shlrec-encoder", daemon=True)
+                    worker.start()
+                    self._worker = worker
+
+    def _run(self) -> None:
+        batch: List[_EncodeRequest] = []
+        try:
+            self._serve(batch)
+        except BaseException as e:
+            # Whatever killed the worker: fail the calls it took on and those still queued
+            pending = list(batch)
+            while True:
+                try:
+                    req = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if req is not None:
+                    pending.append(req)
+            for req in pending:
+                if not req.result.done():
+                    req.result.set_exception(e)
+            raise
+
+    def _serve(self, batch: List[_EncodeRequest]) -> None:
+        backlog = False
+        while True:
+            batch.clear()
+            first = self._queue.get()
+            if first is None:
+                return
+            batch.append(first)
+            n_texts = len(first.texts)
+            deadline = time.perf_counter() + self.max_wait_s if backlog else 0.0
+            stop = False
+            while n_texts < self.max_batch:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    req = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if req is None:
+                    stop = True
+                    break
+                batch.append(req)
+                n_texts += len(req.texts)
+            # Calls that timed out while queued were cancelled: skip them
+            live = [req for req in batch if req.result.set_running_or_notify_cancel()]
+            batch[:] = live
+            if live:
+                self._encode_batch(live)
+            if stop:
+                return
+            backlog = len(live) > 1 or not self._queue.empty()
+
+    def _encode_batch(self, batch: List[_EncodeRequest]) -> None:
+        started = time.perf_counter()
+        for req in batch:
+            REGISTRY.observe("encode_queue", started - req.enqueued_at)
+        for normalize in (True, False):
+            group = [req for req in batch if req.normalize is normalize]
+            if not group:
+                continue
+            texts = [t for req in group for t in req.texts]
+            REGISTRY.observe_value("encode_batch_size", len(texts))
+            try:
+                with REGISTRY.stage("encode_forward"):
+                    embs = np.asarray(self.encoder.encode(texts, normalize_embeddings=normalize), dtype=np.float32)
+            except Exception as e:
+                for req in group:
+                    req.result.set_exception(e)
+                continue
+            start = 0
+            for req in group:
+                req.result.set_result(embs[start:start + len(req.texts)])
+                start += len(req.texts)
+
+
+def load_encoder(embedding_model: str, backend: str = "torch", model_dir: str | Path | None = None) -> QueryEncoder:
+    """Instantiate an encoder; "onnx" needs `model_dir` holding an exported model."""
+    if backend == "onnx":
+        if model_dir is None:
+            raise ValueError("ONNX encoder backend needs the exported model directory")
+        return OnnxEncoder(model_dir)
+    if backend != "torch":
+        raise ValueError(f"Unknown encoder backend {backend!r}; expected one of {ENCODER_BACKENDS}")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(embedding_model)
+
+
+def encoder_id(encoder: QueryEncoder, embedding_model: str) -> str:
+    """Backend and model behind `encoder`, e.g. "onnx:<model>/model.int8.onnx" or "torch:<model>"."""
+    inner = getattr(encoder, "encoder", encoder)  # MicroBatchEncoder
+    if isinstance(inner, OnnxEncoder):
+        return f"onnx:{inner.model_name}/{inner.model_file}"
+    return f"torch:{embedding_model}"
+
+
+def parity_score(encoder: QueryEncoder, texts: Sequence[str], reference: np.ndarray) -> float:
+    """Smallest cosine between `encoder`'s embeddings of `texts` and the reference (normalized) rows."""
+    if not len(texts):
+        return 1.0
+    embs = np.asarray(encoder.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+    ref = np.asarray(reference, dtype=np.float32)
+    return float(np.min(np.sum(embs * ref, axis=1)))
+
+
+def export_onnx_encoder(embedding_model: str, out_dir: str | Path, quantize: bool = True) -> Path:
+    """Export the transformer of a sentence-transformers model to ONNX (+ dynamic int8 quantization)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(embedding_model, device="cpu")
+    transformer = st[0]
+    auto_model = transformer.auto_model.eval()
+
+    class _LastHidden(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    sample = transformer.tokenizer(["export sample"], return_tensors="pt")
+    token_type_ids = sample.get("token_type_ids", torch.zeros_like(sample["input_ids"]))
+    fp32_path = out_dir / "model.onnx"
+    dyn = {0: "batch", 1: "seq"}
+    torch.onnx.export(
+        _LastHidden(auto_model),
+        (sample["input_ids"], sample["attention_mask"], token_type_ids),
+        str(fp32_path),
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={"input_ids": dyn, "attention_mask": dyn, "token_type_ids": dyn, "last_hidden_state": dyn},
+        opset_version=17,
+    )
+
+    model_file = fp32_path.name
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(out_dir / "model.int8.onnx"), weight_type=QuantType.QInt8)
+        model_file = "model.int8.onnx"
+
+    transformer.tokenizer.save_pretrained(str(out_dir))
+    cfg = {
+        "model_name": embedding_model,
+        "model_file": model_file,
+        "max_seq_length": int(transformer.max_seq_length),
+        "pad_token": transformer.tokenizer.pad_token or "[PAD]",
+    }
+    (out_dir / "encoder.json").write_text(json.dumps(cfg, indent=2), encoding="utf-8")
+    return out_dir
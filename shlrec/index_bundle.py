@@ -0,0 +1,386 @@
+"""
+Single-file, versioned index format (``index.shlidx``).
+
+Layout::
+
+    MAGIC (8) | schema version u32 | manifest crc32 u32 | manifest length u64
+    manifest (UTF-8 JSON) | padding | section | padding | section ...
+
+Every section is a raw C-order array starting on a 64-byte boundary, so the whole file
+is opened with one memory map and each section is a zero-copy view of it. The manifest
+records the schema version, embedding model, catalog hash, per-section dtype / shape /
+offset / crc32 and a build id. Catalog items are stored as compact JSON rows behind an
+offsets array and decoded on first access only. Documents removed by an incremental
+update stay in place, flagged in the optional ``tombstones`` section, until compaction.
+
+Opening checks the magic, schema version, manifest checksum, file length and the
+embedding model up front, so a truncated, foreign or stale index fails before any
+request is served; section checksums are verified on first access with ``verify=True``.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from collections.abc import Sequence as SequenceABC
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .ann import IVFIndex
+from .bm25 import SparseBM25
+from .catalog_columns import CatalogColumns
+from .embedding_store import EmbeddingStore, quantize_int8
+
+BUNDLE_FILENAME = "index.shlidx"
+# Last catalog_file_sha1 of CATALOG_PATH with the file's size and mtime, beside the bundle
+CATALOG_STAMP_FILENAME = "catalog_stamp.json"
+SCHEMA_VERSION = 1
+
+_MAGIC = b"SHLIDX\x00\x00"
+_HEADER = struct.Struct("<8sIIQ")
+_ALIGN = 64
+
+_COLUMN_FIELDS = ("duration", "remote", "adaptive", "test_type_mask", "kp_flags", "url_id", "urls", "bits", "bit_names")
+
+
+class IndexFormatError(ValueError):
+    """The index file is corrupt, from another schema version, or does not match what the caller expects."""
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _raw_bytes(arr: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+
+
+def item_sha1(item: Dict[str, Any]) -> str:
+    """Content hash of one catalog item (independent of key order)."""
+    return hashlib.sha1(json.dumps(item, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _combine_sha1(item_hashes: Iterable[str]) -> str:
+    return hashlib.sha1("".join(sorted(item_hashes)).encode()).hexdigest()
+
+
+def catalog_sha1(meta: Sequence[Dict[str, Any]]) -> str:
+    """Content hash of a catalog, as recorded in the manifest (independent of item order)."""
+    return _combine_sha1(item_sha1(it) for it in meta)
+
+
+def catalog_file_sha1(catalog_jsonl: str | Path, stamp_path: Optional[str | Path] = None) -> str:
+    """catalog_sha1 of a catalog JSONL file, read line by line.
+
+    With `stamp_path`, the hash is remembered there next to the file's path, size and
+    mtime, and the file is only re-read when one of those changes.
+    """
+    st = os.stat(catalog_jsonl)
+    stamp = {"path": str(Path(catalog_jsonl).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if stamp_path is not None:
+        try:
+            saved = json.loads(Path(stamp_path).read_text(encoding="utf-8"))
+            if {k: saved.get(k) for k in stamp} == stamp and isinstance(saved.get("catalog_sha1"), str):
+                return saved["catalog_sha1"]
+        except (OSError, ValueError):
+            pass
+    with open(catalog_jsonl, "r", encoding="utf-8") as f:
+        sha1 = _combine_sha1(item_sha1(json.loads(line)) for line in f if line.strip())
+    if stamp_path is not None:
+        tmp = Path(f"{stamp_path}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(dict(stamp, catalog_sha1=sha1)), encoding="utf-8")
+            os.replace(tmp, stamp_path)
+        except OSError:
+            # Read-only index dir: hash on every load
+            tmp.unlink(missing_ok=True)
+    return sha1
+
+
+@dataclass
+class EncodedMeta:
+    """Catalog items as compact JSON rows: row i is ``rows[offsets[i]:offsets[i + 1]]``."""
+
+    offsets: np.ndarray       # int64[n + 1]
+    rows: np.ndarray          # uint8 UTF-8 JSON
+    item_sha1s: List[str]
+
+    @classmethod
+    def from_items(cls, items: Sequence[Dict[str, Any]]) -> "EncodedMeta":
+        rows = [json.dumps(it, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for it in items]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(r) for r in rows])
+        return cls(offsets, np.frombuffer(b"".join(rows), dtype=np.uint8), [item_sha1(it) for it in items])
+
+    @classmethod
+    def concat(cls, parts: Sequence["EncodedMeta"]) -> "EncodedMeta":
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for p in parts:
+            offsets.append(p.offsets[1:] + base)
+            base += int(p.offsets[-1])
+        rows = np.concatenate([p.rows for p in parts]) if parts else np.empty(0, dtype=np.uint8)
+        return cls(np.concatenate(offsets), rows, [h for p in parts for h in p.item_sha1s])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class LazyMeta(SequenceABC):
+    """Read-only list of catalog dicts, each decoded from its JSON row on first access."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self._offsets = offsets
+        self._blob = blob
+        self._rows: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        row = self._rows.get(i)
+        if row is None:
+            if not 0 <= i < len(self):
+                raise IndexError(i)
+            raw = self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+            row = self._rows[i] = json.loads(raw.decode("utf-8"))
+        return row
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def write_bundle(
+    path: str | Path,
+    meta: Union[Sequence[Dict[str, Any]], EncodedMeta],
+    bm25: SparseBM25,
+    columns: CatalogColumns,
+    embeddings: np.ndarray,
+    embedding_model: str,
+    embedding_dtype: str = "float32",
+    ivf: Optional[IVFIndex] = None,
+    tombstones: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """Write a complete index to `path` (atomically) and return its manifest.
+
+    `embeddings` are the exact float32 vectors; float16/int8 add a compact copy.
+    `tombstones` marks removed documents that are kept until the next compaction.
+    `embeddings` may be a read-only memory map; sections are streamed to the file.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if not isinstance(meta, EncodedMeta):
+        meta = EncodedMeta.from_items(meta)
+    sections: Dict[str, np.ndarray] = {
+        "meta.offsets": meta.offsets,
+        "meta.rows": meta.rows,
+        # UTF-8 bytes sort in code point order, so binary search works on them unchanged
+        "bm25.terms": np.char.encode(bm25.terms, "utf-8") if bm25.terms.dtype.kind == "U" else bm25.terms,
+        "bm25.indptr": bm25.indptr,
+        "bm25.doc_ids": bm25.doc_ids,
+        "bm25.weights": bm25.weights,
+        "embeddings.float32": embeddings,
+    }
+    if bm25.tfs is not None and bm25.doc_len is not None:
+        sections["bm25.tfs"] = bm25.tfs
+        sections["bm25.doc_len"] = bm25.doc_len
+    if tombstones is not None and tombstones.any():
+        sections["tombstones"] = np.asarray(tombstones, dtype=bool)
+    for name in _COLUMN_FIELDS:
+        sections[f"columns.{name}"] = getattr(columns, name)
+    if embedding_dtype == "float16":
+        sections["embeddings.float16"] = embeddings.astype(np.float16)
+    elif embedding_dtype == "int8":
+        sections["embeddings.int8"], sections["embeddings.scales"] = quantize_int8(embeddings)
+    if ivf is not None:
+        sections["ivf.centroids"] = ivf.centroids
+        sections["ivf.list_ptr"] = ivf.list_ptr
+        sections["ivf.list_ids"] = ivf.list_ids
+
+    table: Dict[str, Dict[str, Any]] = {}
+    pos = 0
+    for name, arr in sections.items():
+        raw = _raw_bytes(arr)
+        pos = _aligned(pos)
+        table[name] = {
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+            "offset": pos,
+            "nbytes": int(raw.nbytes),
+            "crc32": zlib.crc32(raw),
+        }
+        pos += raw.nbytes
+
+    manifest = {
+        "schema_version": SCHEMA_VERSION,
+        "embedding_model": embedding_model,
+        "embedding_dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        "n_docs": len(meta),
+        "catalog_sha1": _combine_sha1(
+            h for i, h in enumerate(meta.item_sha1s) if tombstones is None or not tombstones[i]
+        ),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "data_nbytes": pos,
+        "sections": table,
+    }
+    manifest["build_id"] = hashlib.sha1(
+        json.dumps([manifest["catalog_sha1"], embedding_model, table], sort_keys=True).encode()
+    ).hexdigest()[:16]
+
+    raw_manifest = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    header = _HEADER.pack(_MAGIC, SCHEMA_VERSION, zlib.crc32(raw_manifest), len(raw_manifest))
+    data_start = _aligned(len(header) + len(raw_manifest))
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(raw_manifest)
+        for name, arr in sections.items():
+            f.seek(data_start + table[name]["offset"])
+            f.write(_raw_bytes(arr))
+        f.truncate(data_start + pos)
+    # Readers that still map the old file keep a valid view of it
+    os.replace(tmp, path)
+    return manifest
+
+
+class IndexBundle:
+    """Memory-mapped ``index.shlidx``; sections are materialized as array views on demand."""
+
+    def __init__(self, path: Path, manifest: Dict[str, Any], data: np.ndarray, verify: bool = False):
+        self.path = path
+        self.manifest = manifest
+        self._data = data
+        self._verify = verify
+        self._verified: set = set()
+
+    @classmethod
+    def open(
+        cls,
+        path: str | Path,
+        embedding_model: Optional[str] = None,
+        catalog_sha1: Optional[str] = None,
+        mmap: bool = True,
+        verify: bool = False,
+    ) -> "IndexBundle":
+        """Validate the header and manifest, then map the file.
+
+        Raises IndexFormatError when the file is not a bundle, has another schema version,
+        is truncated, or was built with a different embedding model / from another catalog.
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                raise IndexFormatError(f"{path}: too short to be an index bundle")
+            magic, version, manifest_crc, manifest_len = _HEADER.unpack(head)
+            if magic != _MAGIC:
+                raise IndexFormatError(f"{path}: not an index bundle")
+            if version != SCHEMA_VERSION:
+                raise IndexFormatError(
+                    f"{path}: index schema v{version}, this code reads v{SCHEMA_VERSION}; rebuild the index"
+                )
+            raw_manifest = f.read(manifest_len)
+        if len(raw_manifest) != manifest_len or zlib.crc32(raw_manifest) != manifest_crc:
+            raise IndexFormatError(f"{path}: manifest checksum mismatch")
+        manifest = json.loads(raw_manifest.decode("utf-8"))
+
+        data_start = _aligned(_HEADER.size + manifest_len)
+        expected_size = data_start + int(manifest["data_nbytes"])
+        if path.stat().st_size != expected_size:
+            raise IndexFormatError(f"{path}: expected {expected_size} bytes, found {path.stat().st_size} (truncated?)")
+        if embedding_model is not None and manifest["embedding_model"] != embedding_model:
+            raise IndexFormatError(
+                f"{path}: built with {manifest['embedding_model']!r}, but {embedding_model!r} was requested"
+            )
+        if catalog_sha1 is not None and manifest["catalog_sha1"] != catalog_sha1:
+            raise IndexFormatError(f"{path}: index is stale (built from a different catalog)")
+
+        if mmap:
+            data = np.memmap(path, dtype=np.uint8, mode="r", offset=data_start, shape=(expected_size - data_start,))
+        else:
+            data = np.fromfile(path, dtype=np.uint8, offset=data_start)
+        return cls(path, manifest, data, verify=verify)
+
+    @property
+    def build_id(self) -> str:
+        return self.manifest["build_id"]
+
+    @property
+    def n_docs(self) -> int:
+        return int(self.manifest["n_docs"])
+
+    def has(self, name: str) -> bool:
+        return name in self.manifest["sections"]
+
+    def section_names(self) -> List[str]:
+        return list(self.manifest["sections"])
+
+    def section(self, name: str) -> np.ndarray:
+        try:
+            info = self.manifest["sections"][name]
+        except KeyError:
+            raise IndexFormatError(f"{self.path}: no section {name!r}") from None
+        raw = self._data[info["offset"]:info["offset"] + info["nbytes"]]
+        if self._verify and name not in self._verified:
+            if zlib.crc32(raw) != info["crc32"]:
+                raise IndexFormatError(f"{self.path}: checksum mismatch in section {name!r}")
+            self._verified.add(name)
+        return raw.view(np.dtype(info["dtype"])).reshape(info["shape"])
+
+    def meta(self) -> LazyMeta:
+        return LazyMeta(self.section("meta.offsets"), self.section("meta.rows"))
+
+    def bm25(self) -> SparseBM25:
+        return SparseBM25(
+            terms=self.section("bm25.terms"),
+            indptr=self.section("bm25.indptr"),
+            doc_ids=self.section("bm25.doc_ids"),
+            weights=self.section("bm25.weights"),
+            n_docs=self.n_docs,
+            tfs=self.section("bm25.tfs") if self.has("bm25.tfs") else None,
+            doc_len=self.section("bm25.doc_len") if self.has("bm25.doc_len") else None,
+        )
+
+    def tombstones(self) -> Optional[np.ndarray]:
+        """Boolean mask of removed documents, or None when there are none."""
+        return self.section("tombstones") if self.has("tombstones") else None
+
+    def columns(self) -> CatalogColumns:
+        return CatalogColumns(**{name: self.section(f"columns.{name}") for name in _COLUMN_FIELDS})
+
+    def embeddings(self, dtype: str = "float32") -> EmbeddingStore:
+        """Embedding store for `dtype`, falling back to float32 if that copy was not built."""
+        exact = self.section("embeddings.float32")
+        if dtype == "float16" and self.has("embeddings.float16"):
+            return EmbeddingStore(self.section("embeddings.float16"), exact=exact)
+        if dtype == "int8" and self.has("embeddings.int8"):
+            return EmbeddingStore(self.section("embeddings.int8"), scales=self.section("embeddings.scales"), exact=exact)
+        return EmbeddingStore(exact)
+
+    def ivf(self) -> Optional[IVFIndex]:
+        if not self.has("ivf.centroids"):
+            return None
+        return IVFIndex(
+            centroids=self.section("ivf.centroids"),
+            list_ptr=self.section("ivf.list_ptr"),
+            list_ids=self.section("ivf.list_ids"),
+        )
+
+    def embedding_dtype(self) -> str:
+        for dtype in ("int8", "float16"):
+            if self.has(f"embeddings.{dtype}"):
+                return dtype
+        return "float32"
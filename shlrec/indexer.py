@@ -4,19 +4,27 @@ import json
 import pickle
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import numpy as np
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
 
-from .utils import normalize_whitespace
+from .ann import IVFIndex
+from .bm25 import SparseBM25
+from .catalog_columns import CatalogColumns
+from .embedding_cache import EmbeddingCache
+from .embedding_store import EmbeddingStore
+from .encoders import load_encoder
+from .index_bundle import BUNDLE_FILENAME, IndexBundle, item_sha1, write_bundle
+from .utils import canonical_shl_url, normalize_whitespace
+
+# Incremental updates compact the index once this share of its documents are tombstones
+COMPACT_RATIO = 0.2
 
 
 @dataclass
 class IndexArtifacts:
     meta: List[Dict[str, Any]]
-    bm25: BM25Okapi
+    bm25: SparseBM25
     corpus_tokens: List[List[str]]
     embeddings: np.ndarray
 
@@ -27,47 +35,264 @@ def _tokenize(text: str) -> List[str]:
     return [t for t in normalize_whitespace(text).split(" ") if t]
 
 
+def corpus_text(it: Dict[str, Any]) -> str:
+    """Text indexed (BM25 + embeddings) for one catalog item."""
+    fields = [
+        it.get("name", ""),
+        it.get("description", ""),
+        " ".join(it.get("test_type", []) or []),
+        f"Duration {it.get('duration', '')} minutes",
+        f"Remote {it.get('remote_support', '')}",
+        f"Adaptive {it.get('adaptive_support', '')}",
+    ]
+    return normalize_whitespace(" . ".join(fields))
+
+
+def _read_catalog(catalog_jsonl: str | Path) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
+    with open(catalog_jsonl, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                items.append(json.loads(line))
+    return items
+
+
+def _item_keys(items: List[Dict[str, Any]]) -> List[str]:
+    """Identity of each catalog item across catalog versions: its canonical URL (name if none)."""
+    keys: List[str] = []
+    seen: Dict[str, int] = {}
+    for it in items:
+        key = canonical_shl_url(it.get("url", "")) or f"name:{it.get('name', '')}"
+        n = seen[key] = seen.get(key, 0) + 1
+        keys.append(key if n == 1 else f"{key}#{n}")
+    return keys
+
+
+def _encode_corpus(
+    texts: List[str],
+    embedding_model: str,
+    embedding_cache: Optional[EmbeddingCache] = None,
+) -> np.ndarray:
+    """Normalized float32 embeddings of `texts` with the reference PyTorch encoder.
+
+    With `embedding_cache`, only texts it has not seen for this model are encoded (and the
+    model is not even loaded when there are none).
+    """
+    def encode(batch: List[str]) -> np.ndarray:
+        model = load_encoder(embedding_model, backend="torch")
+        embs = model.encode(batch, batch_size=64, show_progress_bar=len(batch) > 256, normalize_embeddings=True)
+        return np.asarray(embs, dtype=np.float32)
+
+    if embedding_cache is None:
+        return encode(texts)
+    return embedding_cache.encode(embedding_model, texts, encode)
+
+
 def build_index(
     catalog_jsonl: str | Path,
     index_dir: str | Path,
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
-) -> None:
+    embedding_dtype: str = "float32",
+    ann: bool = False,
+    ann_nlist: Optional[int] = None,
+    embedding_cache: Optional[EmbeddingCache] = None,
+    workers: int = 1,
+    encode_workers: int = 1,
+    chunk_size: int = 4096,
+    torch_threads: int = 0,
+) -> Dict[str, Any]:
+    """Build the lexical + dense index into <index_dir>/index.shlidx; with `ann`, also an IVF index.
+
+    `embedding_cache` supplies vectors of texts already encoded by earlier builds. The
+    catalog is streamed in `chunk_size` chunks, prepared by `workers` processes and
+    encoded by `encode_workers` processes (see build_pipeline). Returns build stats.
+    """
+    from .build_pipeline import build_streaming
+
+    return build_streaming(
+        catalog_jsonl,
+        index_dir,
+        embedding_model,
+        embedding_dtype=embedding_dtype,
+        ann=ann,
+        ann_nlist=ann_nlist,
+        embedding_cache=embedding_cache,
+        workers=workers,
+        encode_workers=encode_workers,
+        chunk_size=chunk_size,
+        torch_threads=torch_threads,
+    )
+
+
+def update_index(
+    catalog_jsonl: str | Path,
+    index_dir: str | Path,
+    embedding_model: Optional[str] = None,
+    compact: Optional[bool] = None,
+    embedding_cache: Optional[EmbeddingCache] = None,
+) -> Dict[str, Any]:
+    """Bring an existing index.shlidx in line with `catalog_jsonl` without a full rebuild.
+
+    Items are matched by canonical URL and compared by content hash. Only new items and
+    items whose indexed text changed are encoded; BM25 postings and statistics are
+    updated in place of a re-tokenization; removed items become tombstones. The index is
+    compacted (tombstones dropped, ids renumbered) when `compact` is True, or when None
+    and more than COMPACT_RATIO of the documents are tombstones.
+
+    Returns counts of added / changed / reencoded / removed / unchanged items.
+    """
     index_dir = Path(index_dir)
-    index_dir.mkdir(parents=True, exist_ok=True)
+    path = index_dir / BUNDLE_FILENAME
+    bundle = IndexBundle.open(path, embedding_model=embedding_model)
+    model_name = bundle.manifest["embedding_model"]
 
-    # Load catalog items
-    meta: List[Dict[str, Any]] = []
-    with open(catalog_jsonl, "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                meta.append(json.loads(line))
-
-    # Build corpus text
-    corpus = []
-    for it in meta:
-        fields = [
-            it.get("name", ""),
-            it.get("description", ""),
-            " ".join(it.get("test_type", []) or []),
-            f"Duration {it.get('duration', '')} minutes",
-            f"Remote {it.get('remote_support', '')}",
-            f"Adaptive {it.get('adaptive_support', '')}",
-        ]
-        corpus.append(normalize_whitespace(" . ".join(fields)))
-
-    corpus_tokens = [_tokenize(t) for t in corpus]
-    bm25 = BM25Okapi(corpus_tokens)
-
-    # Embeddings
-    model = SentenceTransformer(embedding_model)
-    embs = model.encode(corpus, batch_size=64, show_progress_bar=True, normalize_embeddings=True)
-    embeddings = np.asarray(embs, dtype=np.float32)
-
-    # Save
-    (index_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
-    with open(index_dir / "bm25.pkl", "wb") as f:
-        pickle.dump(bm25, f)
-    with open(index_dir / "corpus_tokens.pkl", "wb") as f:
-        pickle.dump(corpus_tokens, f)
-    np.save(index_dir / "embeddings.npy", embeddings)
+    meta = list(bundle.meta())
+    n_old = len(meta)
+    dead = np.zeros(n_old, dtype=bool)
+    if bundle.tombstones() is not None:
+        dead[:] = bundle.tombstones()
+    old_ids = {key: i for i, key in enumerate(_item_keys(meta)) if not dead[i]}
+
+    stats = {"added": 0, "changed": 0, "reencoded": 0, "removed": 0, "unchanged": 0}
+    to_encode: Dict[int, str] = {}
+    seen = set()
+    items = _read_catalog(catalog_jsonl)
+    for key, it in zip(_item_keys(items), items):
+        doc_id = old_ids.get(key)
+        if doc_id is None:
+            doc_id = len(meta)
+            meta.append(it)
+            to_encode[doc_id] = corpus_text(it)
+            stats["added"] += 1
+            continue
+        seen.add(doc_id)
+        if item_sha1(it) == item_sha1(meta[doc_id]):
+            stats["unchanged"] += 1
+            continue
+        text = corpus_text(it)
+        if text != corpus_text(meta[doc_id]):
+            to_encode[doc_id] = text
+            stats["reencoded"] += 1
+        meta[doc_id] = it
+        stats["changed"] += 1
+
+    removed = np.array(sorted(set(old_ids.values()) - seen), dtype=np.int64)
+    stats["removed"] = len(removed)
+    tombstones = np.zeros(len(meta), dtype=bool)
+    tombstones[:n_old] = dead
+    tombstones[removed] = True
+
+    # Embeddings: keep every stored row, encode only new / re-worded items
+    embeddings = np.zeros((len(meta), bundle.manifest["embedding_dim"]), dtype=np.float32)
+    embeddings[:n_old] = bundle.section("embeddings.float32")
+    if to_encode:
+        ids = np.fromiter(to_encode, dtype=np.int64)
+        embeddings[ids] = _encode_corpus(list(to_encode.values()), model_name, embedding_cache)
+
+    # BM25: drop the postings of removed / re-worded docs, add those of new / re-worded docs
+    bm25 = bundle.bm25()
+    if bm25.tfs is None:
+        # Bundle written without term frequencies: index all live docs from scratch once
+        bm25 = SparseBM25(
+            terms=np.array([], dtype=str),
+            indptr=np.zeros(1, dtype=np.int64),
+            doc_ids=np.empty(0, dtype=np.int32),
+            weights=np.empty(0, dtype=np.float64),
+            n_docs=n_old,
+            tfs=np.empty(0, dtype=np.int32),
+            doc_len=np.zeros(n_old, dtype=np.int32),
+        )
+        to_tokenize = {i: corpus_text(it) for i, it in enumerate(meta) if not tombstones[i]}
+    else:
+        to_tokenize = dict(to_encode)
+    bm25 = bm25.update(removed, {i: _tokenize(t) for i, t in to_tokenize.items()}, n_docs=len(meta))
+
+    if compact is None:
+        compact = tombstones.sum() > COMPACT_RATIO * len(meta)
+    if compact and tombstones.any():
+        keep = ~tombstones
+        meta = [it for it, k in zip(meta, keep) if k]
+        embeddings = embeddings[keep]
+        bm25 = bm25.take_docs(keep)
+        tombstones = np.zeros(len(meta), dtype=bool)
+    stats["compacted"] = bool(compact)
+
+    ivf = bundle.ivf()
+    if ivf is not None:
+        ivf = IVFIndex.from_centroids(np.array(ivf.centroids), embeddings, live=~tombstones)
+
+    write_bundle(
+        path,
+        meta,
+        bm25,
+        CatalogColumns.from_meta(meta),
+        embeddings,
+        embedding_model=model_name,
+        embedding_dtype=bundle.embedding_dtype(),
+        ivf=ivf,
+        tombstones=tombstones,
+    )
+    stats["n_docs"] = len(meta)
+    stats["tombstones"] = int(tombstones.sum())
+    return stats
+
+
+def convert_legacy_index(
+    index_dir: str | Path,
+    embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+    embedding_dtype: str = "float32",
+) -> Path:
+    """Pack an index dir in the old per-file layout (meta.json, bm25, embeddings.npy, ...) into a bundle.
+
+    `embedding_model` must be the model the embeddings were built with; it is recorded in the manifest.
+    """
+    index_dir = Path(index_dir)
+    meta = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+    if (index_dir / "bm25.npz").exists():
+        bm25 = SparseBM25.load(index_dir / "bm25.npz")
+    else:
+        with open(index_dir / "corpus_tokens.pkl", "rb") as f:
+            bm25 = SparseBM25.from_corpus_tokens(pickle.load(f))
+    ivf = IVFIndex.load(index_dir / "ivf.npz") if (index_dir / "ivf.npz").exists() else None
+    path = index_dir / BUNDLE_FILENAME
+    write_bundle(
+        path,
+        meta,
+        bm25,
+        CatalogColumns.from_meta(meta),
+        np.load(index_dir / "embeddings.npy"),
+        embedding_model=embedding_model,
+        embedding_dtype=embedding_dtype,
+        ivf=ivf,
+    )
+    return path
+
+
+def build_ann(index_dir: str | Path, nlist: Optional[int] = None) -> IVFIndex:
+    """(Re)build the IVF index of an existing index without re-encoding the catalog."""
+    index_dir = Path(index_dir)
+    path = index_dir / BUNDLE_FILENAME
+    if not path.exists():
+        ivf = IVFIndex.build(EmbeddingStore.open(index_dir), nlist=nlist)
+        ivf.save(index_dir / "ivf.npz")
+        return ivf
 
+    bundle = IndexBundle.open(path)
+    embeddings = np.array(bundle.section("embeddings.float32"))
+    # Rows removed by update_index stay tombstoned and out of the IVF lists
+    tombstones = bundle.tombstones()
+    if tombstones is not None:
+        tombstones = np.array(tombstones)
+    ivf = IVFIndex.build(embeddings, nlist=nlist, live=None if tombstones is None else ~tombstones)
+    write_bundle(
+        path,
+        list(bundle.meta()),
+        bundle.bm25(),
+        bundle.columns(),
+        embeddings,
+        embedding_model=bundle.manifest["embedding_model"],
+        embedding_dtype=bundle.embedding_dtype(),
+        ivf=ivf,
+        tombstones=tombstones,
+    )
+    return ivf
@@ -0,0 +1,313 @@
+"""
+Distilled local intent model: linear heads on the query embedding, learned offline from
+Gemini intent answers and the train set (scripts/train_intent_model.py), plus compiled
+rules for duration limits and remote requirements.
+
+INTENT_MODE picks how Recommender uses it:
+    gemini  Gemini (cached), heuristic fallback; the model is not used
+    hybrid  the model, with Gemini only when its confidence is below INTENT_MODEL_MIN_CONFIDENCE
+    local   the model only, no Gemini calls
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .llm_gemini import GeminiIntentExtractor, Intent, heuristic_intent
+from .telemetry import count, stage
+
+MODEL_FILENAME = "intent_model.npz"
+
+# Classes of the domain_mix head: share of K (knowledge & skills) in the mix
+MIX_BINS = (0.1, 0.3, 0.5, 0.7, 0.9)
+
+HEADS = ("domain_mix", "seniority", "remote")
+
+_UNIT = r"(?P<unit>minutes?|mins?|m\b|hours?|hrs?|h\b)"
+_RANGE_RE = re.compile(r"(?P<lo>\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(?P<hi>\d+(?:\.\d+)?)\s*" + _UNIT)
+_SINGLE_RE = re.compile(r"(?P<n>\d+(?:\.\d+)?)\s*-?\s*" + _UNIT)
+_HALF_HOUR_RE = re.compile(r"\bhalf(?: an)? hour\b")
+_AN_HOUR_RE = re.compile(r"\b(?:an|one) hour\b")
+_REMOTE_RE = re.compile(r"\b(?:remote(?:ly)?|work(?:ing)? from home|wfh|home[- ]based)\b")
+
+
+def _minutes(n: str, unit: str) -> int:
+    value = float(n)
+    return int(round(value * 60)) if unit.startswith("h") else int(round(value))
+
+
+def parse_duration_limit(text: str) -> Optional[int]:
+    """Time limit in minutes mentioned in `text` ("30-40 mins" -> 40, "1.5 hours" -> 90)."""
+    q = (text or "").lower()
+    m = _RANGE_RE.search(q)
+    if m:
+        return _minutes(m.group("hi"), m.group("unit"))
+    m = _SINGLE_RE.search(q)
+    if m:
+        return _minutes(m.group("n"), m.group("unit"))
+    if _HALF_HOUR_RE.search(q):
+        return 30
+    if _AN_HOUR_RE.search(q):
+        return 60
+    return None
+
+
+def mentions_remote(text: str) -> Optional[bool]:
+    return True if _REMOTE_RE.search((text or "").lower()) else None
+
+
+def intent_labels(obj: Mapping[str, Any]) -> Dict[str, str]:
+    """Head -> class label of a Gemini intent answer (fields it lacks are left out)."""
+    labels: Dict[str, str] = {}
+    mix = obj.get("domain_mix")
+    if isinstance(mix, Mapping):
+        try:
+            k, p = float(mix.get("K", 0.0)), float(mix.get("P", 0.0))
+        except (TypeError, ValueError):
+            k = p = 0.0
+        if k + p > 0:
+            labels["domain_mix"] = mix_label(k / (k + p))
+    seniority = obj.get("seniority")
+    if isinstance(seniority, str) and seniority:
+        labels["seniority"] = seniority.lower()
+    if "remote_required" in obj and obj["remote_required"] in (True, False, None):
+        labels["remote"] = str(obj["remote_required"]).lower()
+    return labels
+
+
+def mix_label(k_share: float) -> str:
+    """domain_mix class of a K share (nearest MIX_BINS value)."""
+    return str(min(MIX_BINS, key=lambda b: abs(b - k_share)))
+
+
+@dataclass
+class LinearHead:
+    """Multinomial logistic regression: softmax(x @ W + b) over `classes`."""
+
+    classes: np.ndarray  # str labels
+    W: np.ndarray        # (dim, n_classes) float32
+    b: np.ndarray        # (n_classes,) float32
+
+    def proba(self, x: np.ndarray) -> np.ndarray:
+        z = x @ self.W + self.b
+        z = np.exp(z - z.max(axis=-1, keepdims=True))
+        return z / z.sum(axis=-1, keepdims=True)
+
+
+@dataclass
+class IntentModel:
+    heads: Dict[str, LinearHead]
+    embedding_model: str
+    dim: int
+
+    def predict(self, emb: np.ndarray, query: str) -> Tuple[Intent, float]:
+        """Intent for `query` from its normalized embedding, and the confidence: the lowest
+        top-class probability over the heads (0 without heads)."""
+        x = np.asarray(emb, dtype=np.float32).reshape(-1)
+        confidence = 1.0 if self.heads else 0.0
+        fallback = heuristic_intent(query)
+
+        mix = fallback.domain_mix
+        head = self.heads.get("domain_mix")
+        if head is not None:
+            p = head.proba(x)
+            k = float(p @ head.classes.astype(np.float64))
+            mix = {"K": k, "P": 1.0 - k}
+            confidence = min(confidence, float(p.max()))
+
+        seniority = "unknown"
+        head = self.heads.get("seniority")
+        if head is not None:
+            p = head.proba(x)
+            seniority = str(head.classes[int(p.argmax())])
+            confidence = min(confidence, float(p.max()))
+
+        remote = mentions_remote(query)
+        head = self.heads.get("remote")
+        if head is not None and remote is None:
+            p = head.proba(x)
+            remote = {"true": True, "false": False}.get(str(head.classes[int(p.argmax())]))
+            confidence = min(confidence, float(p.max()))
+
+        intent = Intent(
+            hard_skills=[],
+            soft_skills=[],
+            roles=[],
+            seniority=seniority,
+            duration_limit_minutes=parse_duration_limit(query),
+            remote_required=remote,
+            domain_mix=mix,
+        )
+        return intent, confidence
+
+    def save(self, path: str | Path) -> None:
+        arrays: Dict[str, np.ndarray] = {
+            "embedding_model": np.array(self.embedding_model),
+            "dim": np.array(self.dim),
+        }
+        for name, head in self.heads.items():
+            arrays[f"{name}.classes"] = head.classes.astype(str)
+            arrays[f"{name}.W"] = head.W.astype(np.float32)
+            arrays[f"{name}.b"] = head.b.astype(np.float32)
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "IntentModel":
+        with np.load(path, allow_pickle=False) as z:
+            heads = {
+                name: LinearHead(z[f"{name}.classes"], z[f"{name}.W"], z[f"{name}.b"])
+                for name in HEADS
+                if f"{name}.W" in z.files
+            }
+            return cls(heads=heads, embedding_model=str(z["embedding_model"]), dim=int(z["dim"]))
+
+
+def fit_head(X: np.ndarray, labels: Sequence[Optional[str]], C: float = 1.0) -> Optional[LinearHead]:
+    """Logistic-regression head on the rows that have a label (None without two classes)."""
+    from sklearn.linear_model import LogisticRegression
+
+    rows = [i for i, y in enumerate(labels) if y is not None]
+    y = np.array([labels[i] for i in rows])
+    if len(set(y.tolist())) < 2:
+        return None
+    clf = LogisticRegression(C=C, max_iter=2000)
+    clf.fit(X[rows], y)
+    W = clf.coef_.T.astype(np.float32)
+    b = clf.intercept_.astype(np.float32)
+    if W.shape[1] == 1:
+        # Binary problems come back as one logit for classes_[1]
+        W = np.hstack([-W / 2, W / 2])
+        b = np.array([-b[0] / 2, b[0] / 2], dtype=np.float32)
+    return LinearHead(classes=clf.classes_.astype(str), W=W, b=b)
+
+
+def train_intent_model(
+    X: np.ndarray,
+    labels: Sequence[Mapping[str, str]],
+    embedding_model: str,
+    C: float = 1.0,
+) -> IntentModel:
+    """Fit one head per field over the examples labelled for it."""
+    heads = {}
+    for name in HEADS:
+        head = fit_head(X, [lab.get(name) for lab in labels], C=C)
+        if head is not None:
+            heads[name] = head
+    return IntentModel(heads=heads, embedding_model=embedding_model, dim=int(X.shape[1]))
+
+
+def head_agreement(
+    X: np.ndarray, labels: Sequence[Mapping[str, str]], C: float = 1.0, folds: int = 5
+) -> Dict[str, float]:
+    """Cross-validated share of held-out examples where each head matches its label."""
+    n = len(labels)
+    folds = min(folds, n)
+    if folds < 2:
+        return {}
+    order = np.random.default_rng(0).permutation(n)
+    hits: Dict[str, List[bool]] = {name: [] for name in HEADS}
+    for f in range(folds):
+        test = order[f::folds]
+        train = np.setdiff1d(order, test)
+        for name in HEADS:
+            head = fit_head(X[train], [labels[i].get(name) for i in train], C=C)
+            if head is None:
+                continue
+            for i in test:
+                y = labels[i].get(name)
+                if y is not None:
+                    hits[name].append(str(head.classes[int(head.proba(X[i]).argmax())]) == y)
+    return {name: float(np.mean(h)) for name, h in hits.items() if h}
+
+
+class LocalIntentExtractor:
+    """GeminiIntentExtractor interface over an IntentModel.
+
+    Gemini's cached answer is used when present. Otherwise the model answers, and in
+    hybrid mode (`use_llm`) a prediction below `min_confidence` goes to Gemini instead.
+    """
+
+    def __init__(
+        self,
+        model: IntentModel,
+        encode: Callable[[Sequence[str]], np.ndarray],
+        llm: GeminiIntentExtractor,
+        min_confidence: float = 0.6,
+        use_llm: bool = True,
+    ):
+        self.model = model
+        self.encode = encode
+        self.llm = llm
+        self.min_confidence = min_confidence
+        self.use_llm = use_llm
+
+    @property
+    def cache(self):
+        return self.llm.cache
+
+    def _local(self, query: str) -> Tuple[Intent, float]:
+        with stage("intent_model"):
+            emb = self.encode([query])[0] if self.model.heads else np.zeros(0, dtype=np.float32)
+            return self.model.predict(emb, query)
+
+    def _cached_or_local(self, query: str) -> Tuple[Intent, Optional[float]]:
+        """Gemini's cached intent (confidence None), else the model's prediction."""
+        cached = self.llm.lookup(query)
+        if cached is not None:
+            return cached, None
+        return self._local(query)
+
+    def _accept(self, confidence: Optional[float]) -> bool:
+        if confidence is None:
+            return True
+        if not self.use_llm or confidence >= self.min_confidence or not self.llm.client.available:
+            count("intent_model_hit")
+            return True
+        count("intent_model_low_confidence")
+        return False
+
+    def extract(self, query: str) -> Intent:
+        intent, confidence = self._cached_or_local(query)
+        return intent if self._accept(confidence) else self.llm.extract(query)
+
+    async def aextract(self, query: str) -> Intent:
+        # The SQLite lookup and the encode both block: one executor call keeps them off the event loop
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        intent, confidence = await loop.run_in_executor(None, ctx.run, self._cached_or_local, query)
+        return intent if self._accept(confidence) else await self.llm.aextract(query)
+
+
+def load_intent_extractor(
+    index_dir: str | Path,
+    mode: str,
+    encode: Callable[[Sequence[str]], np.ndarray],
+    llm: GeminiIntentExtractor,
+    min_confidence: float,
+    embedding_model: str,
+) -> GeminiIntentExtractor | LocalIntentExtractor:
+    """The intent extractor for INTENT_MODE `mode`. Without a trained model in `index_dir`,
+    hybrid is plain Gemini and local is rules only (duration, remote, heuristic mix)."""
+    if mode not in ("gemini", "hybrid", "local"):
+        raise ValueError(f"Unknown INTENT_MODE {mode!r}; expected gemini, hybrid or local")
+    path = Path(index_dir) / MODEL_FILENAME
+    if mode == "gemini" or (mode == "hybrid" and not path.exists()):
+        return llm
+    if not path.exists():
+        model = IntentModel(heads={}, embedding_model=embedding_model, dim=0)
+        return LocalIntentExtractor(model, encode, llm, min_confidence=min_confidence, use_llm=False)
+    model = IntentModel.load(path)
+    if model.embedding_model != embedding_model:
+        raise ValueError(
+            f"{path} was trained on {model.embedding_model!r} embeddings, the index uses {embedding_model!r}"
+        )
+    return LocalIntentExtractor(model, encode, llm, min_confidence=min_confidence, use_llm=mode == "hybrid")
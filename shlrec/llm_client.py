@@ -0,0 +1,301 @@
+"""
+Shared LLM client used by intent extraction, reranking and query expansion.
+
+One client per process owns a background event loop with a single model handle (and
+its connection), so calls made from any thread share it. Every call gets a timeout
+and jittered retries, and runs under a concurrency semaphore. A circuit breaker opens
+after repeated failures, and callers then fall back to their heuristics without
+waiting on the upstream.
+
+Backends (LLM_BACKEND):
+    gemini  google-generativeai, needs GEMINI_API_KEY
+    stub    local HTTP stub (scripts/llm_stub_server.py) at LLM_STUB_URL, for offline
+            and load tests
+    none    no LLM; every call raises LLMUnavailable
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Dict, Optional, TypeVar
+
+from .settings import Settings, get_settings
+from .telemetry import count
+
+T = TypeVar("T")
+
+
+class LLMUnavailable(RuntimeError):
+    """No backend configured, circuit open, or too many calls in flight."""
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failed calls. Every `reset_s` while open, one
+    trial call is let through (half-open); its outcome closes or re-opens the circuit."""
+
+    def __init__(self, failures: int = 5, reset_s: float = 30.0):
+        self.failures = max(1, int(failures))
+        self.reset_s = float(reset_s)
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() - self._opened_at >= self.reset_s:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_s:
+                return False
+            # Re-armed, so a trial that never reports back does not wedge the circuit
+            self._opened_at = now
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                if self._opened_at is None:
+                    count("llm_circuit_opened")
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class GeminiBackend:
+    """google-generativeai async calls on one shared GenerativeModel."""
+
+    name = "gemini"
+
+    def __init__(self, settings: Settings):
+        import google.generativeai as genai
+
+        genai.configure(api_key=settings.gemini_api_key)
+        self._model = genai.GenerativeModel(settings.gemini_model)
+
+    async def generate(self, prompt: str, temperature: Optional[float], timeout_s: float) -> str:
+        kwargs: Dict[str, Any] = {}
+        if temperature is not None:
+            kwargs["generation_config"] = {"temperature": temperature}
+        if timeout_s > 0:
+            kwargs["request_options"] = {"timeout": timeout_s}
+        resp = await self._model.generate_content_async(prompt, **kwargs)
+        return getattr(resp, "text", "") or ""
+
+
+class StubBackend:
+    """POST {"model", "prompt", "temperature"} to `url`, expecting {"text": ...} back.
+
+    Requests go through one keep-alive session on a small pool bounded like the client.
+    """
+
+    name = "stub"
+
+    def __init__(self, settings: Settings):
+        import requests
+
+        self.url = settings.llm_stub_url.rstrip("/") + "/generate"
+        self.model = settings.gemini_model
+        self._session = requests.Session()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, settings.llm_max_concurrency), thread_name_prefix="llm-stub")
+
+    def _post(self, payload: Dict[str, Any], timeout_s: float) -> str:
+        resp = self._session.post(self.url, json=payload, timeout=timeout_s if timeout_s > 0 else None)
+        resp.raise_for_status()
+        return str(resp.json().get("text") or "")
+
+    async def generate(self, prompt: str, temperature: Optional[float], timeout_s: float) -> str:
+        payload = {"model": self.model, "prompt": prompt, "temperature": temperature}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._post, payload, timeout_s)
+
+
+_BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+
+class LLMClient:
+    """Timeouts, retries, a concurrency limit and a circuit breaker around one backend.
+
+    `agenerate` is awaitable from any event loop; `generate` blocks the calling thread
+    (not the client loop) until the call finishes. Both raise LLMUnavailable when the
+    call is refused, and the last error once the retries are used up.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None, backend: Any = None):
+        self.settings = settings or get_settings()
+        s = self.settings
+        self.backend_name = getattr(backend, "name", None) or s.llm_backend
+        if self.backend_name not in ("gemini", "stub", "none"):
+            raise ValueError(f"Unknown LLM_BACKEND {self.backend_name!r}; expected gemini, stub or none")
+        self._backend = backend
+        self._backend_failed = False
+        self.breaker = CircuitBreaker(s.llm_breaker_failures, s.llm_breaker_reset_s)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        """Model name for cache keys (stub answers are kept apart from Gemini's)."""
+        if self.backend_name == "gemini":
+            return self.settings.gemini_model
+        return f"{self.backend_name}:{self.settings.gemini_model}"
+
+    @property
+    def configured(self) -> bool:
+        if self._backend is not None:
+            return True
+        if self.backend_name == "gemini":
+            return bool(self.settings.gemini_api_key)
+        return self.backend_name == "stub"
+
+    @property
+    def available(self) -> bool:
+        """False when calls would be refused outright (no backend, or circuit open)."""
+        return self.configured and not self._backend_failed and self.breaker.state != "open"
+
+    def _get_backend(self) -> Any:
+        if self._backend is None:
+            if not self.configured or self._backend_failed:
+                raise LLMUnavailable(f"LLM backend {self.backend_name!r} not configured")
+            try:
+                self._backend = _BACKENDS[self.backend_name](self.settings)
+            except Exception as e:
+                self._backend_failed = True
+                raise LLMUnavailable(f"LLM backend {self.backend_name!r} failed to load: {e}") from e
+        return self._backend
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(started.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="llm-client", daemon=True)
+                self._thread.start()
+                started.wait()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run `coro` on the client loop and wait for it (from a thread other than that loop).
+
+        The caller's contextvars (e.g. a telemetry trace) carry over to the coroutine."""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def _on_loop(self, coro: Coroutine[Any, Any, T]) -> T:
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        # Cancelling the caller (e.g. a deadline) cancels the call on the client loop
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def _generate(self, prompt: str, temperature: Optional[float]) -> str:
+        s = self.settings
+        backend = self._get_backend()
+        if not self.breaker.allow():
+            count("llm_circuit_open")
+            raise LLMUnavailable("LLM circuit open")
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(max(1, s.llm_max_concurrency))
+        timeout = s.llm_timeout_s if s.llm_timeout_s > 0 else None
+        try:
+            # Waiting for a slot is bounded like the call itself
+            await asyncio.wait_for(self._sem.acquire(), timeout)
+        except asyncio.TimeoutError:
+            # Local backpressure, not an upstream failure: the breaker is left alone
+            count("llm_queue_timeout")
+            raise LLMUnavailable("too many LLM calls in flight") from None
+        try:
+            attempts = max(0, s.llm_max_retries) + 1
+            for attempt in range(attempts):
+                count("llm_call")
+                try:
+                    text = await asyncio.wait_for(backend.generate(prompt, temperature, s.llm_timeout_s), timeout)
+                    self.breaker.record_success()
+                    return text
+                except asyncio.TimeoutError:
+                    count("llm_timeout")
+                    if attempt + 1 == attempts:
+                        self.breaker.record_failure()
+                        raise
+                except Exception:
+                    count("llm_error")
+                    if attempt + 1 == attempts:
+                        self.breaker.record_failure()
+                        raise
+                count("llm_retry")
+                # Full jitter: spread retries of concurrent callers
+                await asyncio.sleep(random.uniform(0.0, s.llm_retry_backoff_s * (2 ** attempt)))
+            raise AssertionError("unreachable")
+        finally:
+            self._sem.release()
+
+    async def agenerate(self, prompt: str, temperature: Optional[float] = None) -> str:
+        """Model text for `prompt`."""
+        if not self.available:
+            raise LLMUnavailable(f"LLM backend {self.backend_name!r} unavailable")
+        return await self._on_loop(self._generate(prompt, temperature))
+
+    def generate(self, prompt: str, temperature: Optional[float] = None) -> str:
+        """Blocking `agenerate`, for calls from worker threads and scripts."""
+        if not self.available:
+            raise LLMUnavailable(f"LLM backend {self.backend_name!r} unavailable")
+        return self.run(self._generate(prompt, temperature))
+
+    def close(self) -> None:
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            if self._thread is None or not self._thread.is_alive():
+                loop.close()
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client(settings: Optional[Settings] = None) -> LLMClient:
+    """The process-wide client (created from `settings` on first use)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(settings)
+        return _client
+
+
+def close_llm_client() -> None:
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
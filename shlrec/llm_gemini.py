@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
 from dataclasses import dataclass
+from functools import partial
 from typing import Any, Dict, Optional
 
 from .settings import Settings
-from .utils import DiskJSONCache, safe_json_loads
+from .caching import SingleFlight, open_cache
+from .llm_client import LLMClient, LLMUnavailable, get_llm_client
+from .telemetry import count, stage
+from .utils import safe_json_loads
 
 
 PROMPT_TEMPLATE = """You are an information extraction system.
@@ -71,39 +77,103 @@ def heuristic_intent(query: str) -> Intent:
     )
 
 
+def _in_executor(fn: Any, *args: Any) -> "asyncio.Future[Any]":
+    # Blocking cache I/O off the event loop, in a copy of the caller's context (stage timings)
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(None, partial(contextvars.copy_context().run, fn, *args))
+
+
 class GeminiIntentExtractor:
-    def __init__(self, settings: Settings, cache_path: str = "data/index/gemini_cache.json"):
+    def __init__(
+        self,
+        settings: Settings,
+        cache_path: str = "data/index/gemini_cache.json",
+        client: Optional[LLMClient] = None,
+    ):
         self.settings = settings
-        self.cache = DiskJSONCache(cache_path)
+        # SQLite store next to cache_path (a legacy gemini_cache.json is imported once)
+        self.cache = open_cache(cache_path, max_entries=settings.llm_cache_max_entries, ttl_s=settings.llm_cache_ttl_s)
+        self.client = client or get_llm_client(settings)
+        # Concurrent misses of the same query share one Gemini call
+        self._flight = SingleFlight("intent")
 
-        self._model = None
+    def _key(self, query: str) -> str:
+        return f"intent::{self.client.model_id}::{query}"
 
-    def _lazy_init(self):
-        if self._model is not None:
-            return
-        if not self.settings.gemini_api_key:
-            raise RuntimeError("GEMINI_API_KEY not set. Put it in .env or env vars.")
-        import google.generativeai as genai
-        genai.configure(api_key=self.settings.gemini_api_key)
-        self._model = genai.GenerativeModel(self.settings.gemini_model)
-
-    def extract(self, query: str) -> Intent:
-        key = f"intent::{self.settings.gemini_model}::{query}"
+    def _cached_obj(self, key: str) -> Optional[Dict[str, Any]]:
         cached = self.cache.get(key)
-        if isinstance(cached, dict) and "domain_mix" in cached:
-            return self._to_intent(cached)
+        return cached if isinstance(cached, dict) and "domain_mix" in cached else None
+
+    def lookup(self, query: str) -> Optional[Intent]:
+        """The cached Gemini intent for `query`, without calling Gemini."""
+        obj = self._cached_obj(self._key(query))
+        return self._to_intent(obj) if obj is not None else None
+
+    def _cached(self, query: str) -> tuple[str, Optional[Intent]]:
+        key = self._key(query)
+        cached = self._cached_obj(key)
+        if cached is not None:
+            count("intent_cache_hit")
+            return key, self._to_intent(cached)
+        count("intent_cache_miss")
+        return key, None
+
+    def label(self, query: str) -> Optional[Dict[str, Any]]:
+        """Gemini's raw intent JSON for `query` (cached or fetched), None if unavailable.
+        Used to label training data for the local intent model."""
+        key = self._key(query)
+        obj = self._cached_obj(key)
+        if obj is not None:
+            return obj
+        if not self.client.available:
+            return None
+        try:
+            return self._flight.do(key, lambda: self._call(key, query))
+        except Exception:
+            return None
+
+    def _store(self, key: str, text: str) -> Dict[str, Any]:
+        obj = safe_json_loads(text)
+        if not obj:
+            raise ValueError("Gemini returned non-JSON")
+        self.cache.set(key, obj)
+        return obj
 
+    def _call(self, key: str, query: str) -> Dict[str, Any]:
+        with stage("gemini_intent"):
+            text = self.client.generate(PROMPT_TEMPLATE.format(user_query=query))
+        return self._store(key, text)
+
+    async def _acall(self, key: str, query: str) -> Dict[str, Any]:
+        with stage("gemini_intent"):
+            text = await self.client.agenerate(PROMPT_TEMPLATE.format(user_query=query))
+        return await _in_executor(self._store, key, text)
+
+    def extract(self, query: str) -> Intent:
+        key, intent = self._cached(query)
+        if intent is not None:
+            return intent
         try:
-            self._lazy_init()
-            prompt = PROMPT_TEMPLATE.format(user_query=query)
-            resp = self._model.generate_content(prompt)
-            obj = safe_json_loads(getattr(resp, "text", "") or "")
-            if not obj:
-                raise ValueError("Gemini returned non-JSON")
-            self.cache.set(key, obj)
-            return self._to_intent(obj)
+            if not self.client.available:
+                raise LLMUnavailable("LLM unavailable")
+            return self._to_intent(self._flight.do(key, lambda: self._call(key, query)))
         except Exception:
             # fallback to heuristic
+            count("intent_fallback")
+            return heuristic_intent(query)
+
+    async def aextract(self, query: str) -> Intent:
+        """`extract` for event-loop callers: no thread is held while the model answers, and
+        the SQLite cache is read and written in the default executor."""
+        key, intent = await _in_executor(self._cached, query)
+        if intent is not None:
+            return intent
+        try:
+            if not self.client.available:
+                raise LLMUnavailable("LLM unavailable")
+            return self._to_intent(await self._flight.ado(key, lambda: self._acall(key, query)))
+        except Exception:
+            count("intent_fallback")
             return heuristic_intent(query)
 
     def _to_intent(self, obj: Dict[str, Any]) -> Intent:
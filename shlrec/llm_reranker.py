@@ -3,11 +3,16 @@ LLM-based reranking using Gemini for refined candidate scoring.
 """
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
 import json
+import re
 
+from .caching import RerankScoreCache, SingleFlight
+from .llm_client import LLMClient, get_llm_client
 from .settings import Settings
-from .utils import safe_json_loads
+from .telemetry import count, stage
 
 
 RERANK_PROMPT_TEMPLATE = """You are a hiring assessment expert. Given a job requirement and a list of candidate assessments, rank them by relevance.
@@ -29,26 +34,120 @@ Return ONLY a valid JSON array like this:
 ]
 """
 
+# Part of the score cache key: editing the prompt invalidates scores produced by the old one
+PROMPT_VERSION = hashlib.sha1(RERANK_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:8]
+
+
+def _parse_scores(text: str) -> Optional[List[Any]]:
+    """The JSON array of a model response (possibly wrapped in prose or a code fence)."""
+    m = re.search(r"\[.*\]", text or "", flags=re.DOTALL)
+    if not m:
+        return None
+    try:
+        obj = json.loads(m.group(0))
+    except Exception:
+        return None
+    return obj if isinstance(obj, list) else None
+
 
 class GeminiReranker:
-    """Uses Gemini API to rerank candidates based on job fit."""
+    """Uses Gemini API to rerank candidates based on job fit.
+
+    Scores are cached per (model + prompt version, normalized query, item URL); only
+    candidates without a cached score are sent to Gemini, in chunks of
+    `gemini_rerank_chunk_size` scored concurrently through the shared LLM client.
+    """
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, cache_path: Optional[str] = None, client: Optional[LLMClient] = None):
         self.settings = settings
-        self._model = None
+        self.client = client or get_llm_client(settings)
+        self.cache = RerankScoreCache(
+            cache_path,
+            version=f"gemini:{self.client.model_id}:{PROMPT_VERSION}",
+            max_entries=settings.llm_cache_max_entries,
+            ttl_s=settings.llm_cache_ttl_s,
+            memory_size=settings.rerank_cache_size,
+        )
+        # Concurrent identical reranks (same query, same uncached items) share one scoring
+        self._flight = SingleFlight("rerank")
     
-    def _lazy_init(self):
-        if self._model is not None:
-            return True  # CRITICAL FIX: return True when already initialized
-        if not self.settings.gemini_api_key:
-            return False
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=self.settings.gemini_api_key)
-            self._model = genai.GenerativeModel(self.settings.gemini_model)
-            return True
-        except Exception:
-            return False
+    async def _score_chunk(self, query: str, candidates: List[Dict[str, Any]]) -> Dict[str, float]:
+        """One Gemini call over `candidates`; returns item key -> relevance for those it scored.
+
+        Raises ValueError when the response holds no JSON array (the chunk failed)."""
+        candidates_data = []
+        for i, c in enumerate(candidates):
+            candidates_data.append({
+                "idx": i,
+                "name": c.get("name", ""),
+                "description": c.get("description", "")[:200],  # Truncate
+                "test_type": c.get("test_type", []),
+                "duration": c.get("duration", 0),
+            })
+        
+        candidates_json = json.dumps(candidates_data, indent=2)
+        prompt = RERANK_PROMPT_TEMPLATE.format(
+            requirement=query[:500],  # Limit query length
+            candidates_json=candidates_json
+        )
+        
+        with stage("gemini_rerank"):
+            text = await self.client.agenerate(prompt, temperature=0.1)
+        
+        scores_data = _parse_scores(text)
+        if scores_data is None:
+            raise ValueError("rerank response without a JSON array")
+        
+        # Build score map (Gemini answers by name)
+        by_name: Dict[str, float] = {}
+        for item in scores_data:
+            if isinstance(item, dict):
+                name = item.get("name", "")
+                score = item.get("relevance_score", 0.0)
+                if name and isinstance(score, (int, float)):
+                    by_name[name] = float(score)
+        return {
+            RerankScoreCache.item_key(c): by_name[c.get("name", "")]
+            for c in candidates
+            if c.get("name", "") in by_name
+        }
+    
+    async def _score_uncached(
+        self, query: str, candidates: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, float], Set[str]]:
+        """Score `candidates` in concurrent chunks: the scores, and the item keys of chunks
+        that failed or timed out (items the model left out of its answer are in neither).
+
+        Each chunk gets `gemini_rerank_chunk_timeout_s` from when it gets one of the
+        `gemini_rerank_concurrency` slots, so queued chunks are not charged for the wait."""
+        size = max(1, self.settings.gemini_rerank_chunk_size)
+        chunks = [candidates[i:i + size] for i in range(0, len(candidates), size)]
+        timeout = self.settings.gemini_rerank_chunk_timeout_s
+        slots = asyncio.Semaphore(max(1, self.settings.gemini_rerank_concurrency))
+        
+        async def one(chunk: List[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+            async with slots:
+                try:
+                    return await asyncio.wait_for(self._score_chunk(query, chunk), timeout if timeout > 0 else None)
+                except asyncio.TimeoutError:
+                    count("rerank_chunk_timeout")
+                except Exception:
+                    count("rerank_chunk_error")
+                return None
+        
+        scores: Dict[str, float] = {}
+        failed: Set[str] = set()
+        for chunk, part in zip(chunks, await asyncio.gather(*(one(chunk) for chunk in chunks))):
+            if part is None:
+                failed.update(RerankScoreCache.item_key(c) for c in chunk)
+            else:
+                scores.update(part)
+        return scores, failed
+    
+    def _fetch(self, query: str, candidates: List[Dict[str, Any]]) -> Tuple[Dict[str, float], Set[str]]:
+        fresh, failed = self.client.run(self._score_uncached(query, candidates))
+        self.cache.put_many(query[:500], fresh)
+        return fresh, failed
     
     def rerank(
         self, 
@@ -57,59 +156,51 @@ class GeminiReranker:
         top_k: int = 10
     ) -> List[Dict[str, Any]]:
         """
-        Rerank candidates using Gemini LLM.
-        Falls back to input order if Gemini unavailable.
+        Rerank candidates using Gemini LLM (the first `gemini_rerank_max_candidates`; the
+        rest get a neutral 0.5, as do candidates the model left out of its answer).
+        Candidates of a chunk that failed keep their retrieval score. Falls back to
+        input order if Gemini unavailable.
         """
-        if not self._lazy_init():
+        if not self.client.available:
             return candidates[:top_k]
         
         if not candidates:
             return []
         
         try:
-            # Format candidates for LLM
-            candidates_data = []
-            for i, c in enumerate(candidates[:20]):  # Limit to top 20 for cost
-                candidates_data.append({
-                    "idx": i,
-                    "name": c.get("name", ""),
-                    "description": c.get("description", "")[:200],  # Truncate
-                    "test_type": c.get("test_type", []),
-                    "duration": c.get("duration", 0),
-                })
-            
-            candidates_json = json.dumps(candidates_data, indent=2)
-            prompt = RERANK_PROMPT_TEMPLATE.format(
-                requirement=query[:500],  # Limit query length
-                candidates_json=candidates_json
-            )
-            
-            resp = self._model.generate_content(prompt, temperature=0.1)
-            text = getattr(resp, "text", "")
-            
-            scores_data = safe_json_loads(text)
-            if not isinstance(scores_data, list):
-                return candidates[:top_k]
-            
-            # Build score map
-            score_map = {}
-            for item in scores_data:
-                if isinstance(item, dict):
-                    name = item.get("name", "")
-                    score = item.get("relevance_score", 0.0)
-                    if name and isinstance(score, (int, float)):
-                        score_map[name] = float(score)
+            limit = self.settings.gemini_rerank_max_candidates
+            window = candidates[:limit] if limit > 0 else candidates
+            keys = [RerankScoreCache.item_key(c) for c in window]
+            score_map = self.cache.get_many(query[:500], keys)
+            uncached = [c for c, key in zip(window, keys) if key not in score_map]
+            count("rerank_cache_hit", len(window) - len(uncached))
+            failed: Set[str] = set()
+            if uncached:
+                count("rerank_cache_miss", len(uncached))
+                flight_key = (
+                    RerankScoreCache.normalize_query(query[:500]),
+                    tuple(key for c, key in zip(window, keys) if key not in score_map),
+                )
+                fresh, failed = self._flight.do(flight_key, lambda: self._fetch(query, uncached))
+                score_map.update(fresh)
+                omitted = len(uncached) - len(fresh) - len(failed)
+                if omitted:
+                    count("rerank_omitted", omitted)
             
             # Apply scores and sort
             scored_candidates = []
             for c in candidates:
-                name = c.get("name", "")
                 original_score = c.get("_score", 0.0)
-                llm_score = score_map.get(name, 0.5)
+                key = RerankScoreCache.item_key(c)
+                c_copy = dict(c)
+                if key in failed:
+                    # Its chunk failed: keep the retrieval score
+                    scored_candidates.append(c_copy)
+                    continue
+                llm_score = score_map.get(key, 0.5)
                 
                 # Blend original and LLM scores (LLM gets 50% weight for tie-breaking)
                 blended_score = 0.5 * original_score + 0.5 * llm_score
-                c_copy = dict(c)
                 c_copy["_score"] = blended_score
                 c_copy["_llm_score"] = llm_score
                 scored_candidates.append(c_copy)
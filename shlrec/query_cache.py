@@ -0,0 +1,124 @@
+"""
+Bounded cache of query embeddings so repeated queries skip the encoder forward pass.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .caching import LRUCache
+from .utils import normalize_whitespace
+
+
+class QueryEmbeddingCache:
+    """LRU cache of normalized query embeddings for one query encoder.
+
+    `model_name` identifies the encoder that produced the vectors, backend included
+    (see encoder_id): torch and int8 ONNX vectors of the same model never mix.
+
+    Queries are keyed on whitespace-collapsed, lower-cased text, and that normalized
+    text is also what gets encoded, so a cached vector is exactly what the encoder
+    would return for the key. With ``spill_path`` the cache is reloaded at startup
+    and written back at exit (and every ``spill_every`` new entries).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_size: int = 1024,
+        spill_path: Optional[str | Path] = None,
+        spill_every: int = 256,
+    ):
+        self.model_name = model_name
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.spill_every = max(1, int(spill_every))
+        self._lru = LRUCache(max_size)
+        self._unsaved = 0
+        self._save_lock = threading.Lock()
+        if self.spill_path:
+            self._load_spill()
+            atexit.register(self.save)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return normalize_whitespace(query).lower()
+
+    def encode(self, embedder: Any, queries: Sequence[str]) -> np.ndarray:
+        """Return a (len(queries), dim) float32 matrix, encoding only the cache misses in one batch."""
+        keys = [self.normalize(q) for q in queries]
+        rows: List[Optional[np.ndarray]] = [None] * len(keys)
+        missing: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            vec = self._lru.get((self.model_name, key))
+            if vec is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                rows[i] = vec
+
+        if missing:
+            texts = list(missing)
+            embs = np.asarray(embedder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+            for text, vec in zip(texts, embs):
+                self._lru.put((self.model_name, text), vec)
+                for i in missing[text]:
+                    rows[i] = vec
+            self._unsaved += len(texts)
+            if self.spill_path and self._unsaved >= self.spill_every:
+                self.save()
+
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._lru.stats()
+
+    def _load_spill(self) -> None:
+        if not self.spill_path or not self.spill_path.exists():
+            return
+        try:
+            with np.load(self.spill_path, allow_pickle=False) as z:
+                if str(z["model_name"]) != self.model_name:
+                    return
+                for text, vec in zip(z["queries"].tolist(), z["vectors"]):
+                    self._lru.put((self.model_name, text), np.asarray(vec, dtype=np.float32))
+        except Exception:
+            # A corrupt or incompatible spill file only costs us a cold cache
+            return
+
+    def save(self) -> None:
+        """Write the cache to ``spill_path`` (atomic replace).
+
+        Each save writes its own temporary file, so concurrent saves (threads here, or
+        other processes sharing the path) never interleave: the last replace wins.
+        """
+        if not self.spill_path:
+            return
+        with self._save_lock:
+            items = self._lru.items()
+            if not items:
+                return
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=self.spill_path.parent, prefix=self.spill_path.name + ".", suffix=".tmp", delete=False
+            ) as f:
+                tmp = Path(f.name)
+                try:
+                    np.savez(
+                        f,
+                        model_name=np.array(self.model_name),
+                        queries=np.array([text for (_, text), _ in items], dtype=str),
+                        vectors=np.stack([vec for _, vec in items]).astype(np.float32),
+                    )
+                except BaseException:
+                    f.close()
+                    tmp.unlink(missing_ok=True)
+                    raise
+            os.replace(tmp, self.spill_path)
+            self._unsaved = 0
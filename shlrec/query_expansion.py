@@ -4,37 +4,32 @@ Helps generic queries like "Consultant" or "Manager" find relevant assessments.
 Implements caching to avoid burning free tier quota.
 """
 
-import json
-from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional
+from .caching import open_cache
+from .llm_client import LLMClient, get_llm_client
+from .telemetry import count, stage
 from .phase3_mappings import ROLE_EXPANSIONS
 
 
 class QueryExpander:
     """Expands generic role names into skills and competencies using Gemini (cached)."""
     
-    def __init__(self, cache_path: Optional[str] = None):
+    def __init__(self, cache_path: Optional[str] = None, client: Optional[LLMClient] = None):
         """
         Args:
-            cache_path: Path to JSON cache file (optional)
+            cache_path: Cache file (optional). A legacy JSON path is migrated to a
+                SQLite store next to it; None keeps the cache in memory only.
+            client: LLM client (default: the shared one)
         """
-        self.cache_path = Path(cache_path) if cache_path else None
-        self._cache: Dict[str, str] = {}
-        self._load_cache()
-    
-    def _load_cache(self):
-        """Load expansion cache from disk if exists."""
-        if self.cache_path and self.cache_path.exists():
-            try:
-                self._cache = json.loads(self.cache_path.read_text(encoding="utf-8"))
-            except Exception:
-                self._cache = {}
-    
-    def _save_cache(self):
-        """Save expansion cache to disk."""
-        if self.cache_path:
-            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
-            self.cache_path.write_text(json.dumps(self._cache, ensure_ascii=False), encoding="utf-8")
+        from .settings import get_settings
+
+        settings = get_settings()
+        self._cache = open_cache(
+            cache_path,
+            max_entries=settings.llm_cache_max_entries,
+            ttl_s=settings.llm_cache_ttl_s,
+        )
+        self._client = client or get_llm_client(settings)
     
     def expand(self, query_text: str, use_gemini: bool = True) -> str:
         """
@@ -89,22 +84,20 @@ class QueryExpander:
         Uses cache to avoid re-querying same role.
         """
         try:
-            from .settings import get_settings
-            
-            settings = get_settings()
-            if not settings.gemini_api_key:
+            if not self._client.available:
                 return None
             
             # Check cache first
             cache_key = query_text.lower().strip()
-            if cache_key in self._cache:
-                expansion = self._cache[cache_key]
+            if self._client.backend_name != "gemini":
+                cache_key = f"{self._client.model_id}::{cache_key}"  # keep stub answers apart
+            expansion = self._cache.get(cache_key)
+            if expansion is not None:
+                count("expansion_cache_hit")
                 return f"{query_text} {expansion}"
+            count("expansion_cache_miss")
             
-            # Call Gemini
-            from google.generativeai import GenerativeModel
-            
-            model = GenerativeModel(settings.gemini_model)
+            # Call Gemini (shared client: one model handle, timeouts, retries)
             prompt = f"""Extract 5-7 key skills, competencies, or job responsibilities from this job query.
 Return as a comma-separated list (no bullet points, no explanations).
 
@@ -114,12 +107,11 @@ Example response: "leadership, strategic planning, client management, analytical
 
 Response (comma-separated only):"""
             
-            response = model.generate_content(prompt)
-            expansion = response.text.strip()
+            with stage("gemini_expansion"):
+                expansion = self._client.generate(prompt).strip()
             
             # Cache result
-            self._cache[cache_key] = expansion
-            self._save_cache()
+            self._cache.set(cache_key, expansion)
             
             return f"{query_text} {expansion}"
         
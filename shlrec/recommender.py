@@ -1,19 +1,93 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import contextvars
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar,
+)
 
-from .settings import get_settings
-from .retrieval import load_index, hybrid_retrieve, LoadedIndex
-from .llm_gemini import GeminiIntentExtractor
+import numpy as np
+
+from .settings import Settings, get_settings
+from .caching import LRUCache, SingleFlight
+from .retrieval import (
+    load_index, hybrid_retrieve, hybrid_retrieve_many, hybrid_scores, apply_constraints, top_n_rows,
+    index_fingerprint, LoadedIndex,
+)
+from .llm_gemini import GeminiIntentExtractor, Intent, heuristic_intent
+from .intent_model import LocalIntentExtractor, load_intent_extractor
 from .llm_reranker import GeminiReranker
-from .balancing_improved import pick_balanced_improved
+from .cross_encoder_reranker import CrossEncoderReranker
+from .balancing_improved import pick_balanced_improved, pick_balanced_improved_ids
+from .constraints import ConstraintSet
 from .jd_extractor import looks_like_url, extract_text_from_url
-from .utils import canonical_shl_url
+from .utils import canonical_shl_url, normalize_whitespace
 from .duration_scoring import parse_duration_from_query, apply_duration_scoring_boost, soft_filter_by_duration
 from .query_expansion import QueryExpander
 from .test_type_router import extract_test_type_intent, boost_matching_test_types
+from .telemetry import count, stage
+
+
+# Settings that change what recommend() returns; part of the result cache key
+_RESULT_KEY_FIELDS = (
+    "hybrid_alpha",
+    "candidate_pool",
+    "rerank_with_gemini",
+    "reranker",
+    "cross_encoder_model",
+    "cross_encoder_output",
+    "cross_encoder_max_candidates",
+    "gemini_rerank_max_candidates",
+    "gemini_rerank_chunk_size",
+    "gemini_model",
+    "llm_backend",
+    "intent_mode",
+    "intent_model_min_confidence",
+    "embedding_dtype",
+    "exact_rescore",
+    "ann_enabled",
+    "ann_nprobe",
+    "ann_lexical_candidates",
+    "encoder_backend",
+)
+
+
+def _copy_results(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Cached lists are shared: never hand out (or keep) a reference the caller can mutate
+    return [dict(it, test_type=list(it.get("test_type") or [])) for it in items]
+
+
+T = TypeVar("T")
+
+
+async def _within(aw: Awaitable[T], timeout_s: float, default: T) -> T:
+    """Result of `aw`, or `default` once `timeout_s` (<= 0: no deadline) has passed.
+
+    Executor work that misses its deadline keeps running in its thread; only the wait is dropped.
+    """
+    try:
+        return await asyncio.wait_for(aw, timeout_s if timeout_s > 0 else None)
+    except asyncio.TimeoutError:
+        return default
+
+
+async def _aiter(items: "Iterable[T] | AsyncIterable[T]") -> AsyncIterator[T]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:  # type: ignore[union-attr]
+            yield item
+    else:
+        for item in items:  # type: ignore[union-attr]
+            yield item
+
+
+def _in_executor(loop: asyncio.AbstractEventLoop, fn: Any, *args: Any) -> "asyncio.Future[Any]":
+    # Runs in a copy of the caller's context so stage timings reach an enclosing trace()
+    return loop.run_in_executor(None, partial(contextvars.copy_context().run, fn, *args))
 
 
 @dataclass
@@ -22,29 +96,149 @@ class Recommender:
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
 
     _idx: Optional[LoadedIndex] = None
-    _intent_extractor: Optional[GeminiIntentExtractor] = None
-    _reranker: Optional[GeminiReranker] = None
+    _intent_extractor: Optional[GeminiIntentExtractor | LocalIntentExtractor] = None
+    _reranker: Optional[GeminiReranker | CrossEncoderReranker] = None
     _query_expander: Optional[QueryExpander] = None
+    _result_cache: Optional[LRUCache] = None
+    _index_checked_at: float = 0.0
+    # Serializes loading and index swaps; requests keep the LoadedIndex they started with
+    _load_lock: threading.Lock = field(default_factory=threading.Lock)
+    # Concurrent requests for the same JD URL share one fetch
+    _jd_flight: SingleFlight = field(default_factory=lambda: SingleFlight("jd_fetch"))
 
-    def _lazy_load(self):
-        self.index_dir = Path(self.index_dir)
-        if self._idx is None:
-            self._idx = load_index(self.index_dir, embedding_model=self.embedding_model)
-        if self._intent_extractor is None:
-            settings = get_settings()
-            self._intent_extractor = GeminiIntentExtractor(settings, cache_path=str(self.index_dir / "gemini_cache.json"))
-        # CRITICAL FIX: Use settings toggle instead of hardcoded True
-        if self._reranker is None:
+    def _lazy_load(self) -> LoadedIndex:
+        """The current index, loading it (and the other components) on first use and
+        reloading it once data/index has been rebuilt."""
+        idx = self._idx
+        if idx is not None and self._components_ready() and not self._index_changed(idx):
+            return idx
+        with self._load_lock:
+            self.index_dir = Path(self.index_dir)
             settings = get_settings()
-            if settings.rerank_with_gemini:
-                self._reranker = GeminiReranker(settings)
-        # PHASE 3: Query expander for generic roles (cached)
-        if self._query_expander is None:
-            self._query_expander = QueryExpander(cache_path=str(self.index_dir / "query_expansion_cache.json"))
+            if self._result_cache is None:
+                self._result_cache = LRUCache(settings.result_cache_size, ttl_s=settings.result_cache_ttl_s)
+            current = self._idx
+            # Another thread may have (re)loaded it while this one waited for the lock
+            if current is None or (current is idx and self._index_changed(current, force=True)):
+                # Build the new index before replacing the reference: requests in flight
+                # keep using the one they captured
+                self._idx = self._load_index(settings)
+                if current is not None:
+                    self._result_cache.clear()
+            if self._intent_extractor is None:
+                self._intent_extractor = load_intent_extractor(
+                    self.index_dir,
+                    settings.intent_mode,
+                    self._encode_queries,
+                    GeminiIntentExtractor(settings, cache_path=str(self.index_dir / "gemini_cache.json")),
+                    min_confidence=settings.intent_model_min_confidence,
+                    embedding_model=self.embedding_model,
+                )
+            # CRITICAL FIX: Use settings toggle instead of hardcoded True
+            if self._reranker is None:
+                if settings.reranker == "gemini":
+                    self._reranker = GeminiReranker(settings, cache_path=str(self.index_dir / "rerank_cache.sqlite"))
+                elif settings.reranker == "cross_encoder":
+                    self._reranker = CrossEncoderReranker(settings, cache_path=str(self.index_dir / "rerank_cache.sqlite"))
+                elif settings.reranker != "none":
+                    raise ValueError(f"Unknown RERANKER {settings.reranker!r}; expected none, gemini or cross_encoder")
+            # PHASE 3: Query expander for generic roles (cached)
+            if self._query_expander is None:
+                self._query_expander = QueryExpander(cache_path=str(self.index_dir / "query_expansion_cache.json"))
+            return self._idx
+
+    def _components_ready(self) -> bool:
+        # Everything _lazy_load sets up exists (RERANKER=none leaves _reranker None)
+        return (
+            self._result_cache is not None
+            and self._intent_extractor is not None
+            and self._query_expander is not None
+            and (self._reranker is not None or get_settings().reranker == "none")
+        )
+
+    def _load_index(self, settings: Settings) -> LoadedIndex:
+        return load_index(
+            self.index_dir,
+            embedding_model=self.embedding_model,
+            query_cache_size=settings.query_cache_size,
+            query_cache_path=settings.query_cache_path or None,
+            embedding_dtype=settings.embedding_dtype,
+            mmap=settings.embedding_mmap,
+            rescore_n=settings.exact_rescore,
+            use_ann=settings.ann_enabled,
+            ann_nprobe=settings.ann_nprobe,
+            ann_lexical_candidates=settings.ann_lexical_candidates,
+            encoder_backend=settings.encoder_backend,
+            encoder_parity_tol=settings.encoder_parity_tol,
+            verify_checksums=settings.index_verify_checksums,
+            encode_batch_max=settings.encode_batch_max,
+            encode_batch_wait_ms=settings.encode_batch_wait_ms,
+            encode_batch_timeout_s=settings.encode_batch_timeout_s,
+            catalog_jsonl=settings.catalog_path or None,
+        )
+
+    def _encode_queries(self, queries: Sequence[str]) -> np.ndarray:
+        # For the local intent model: shares the query embedding cache with retrieval
+        idx = self._idx
+        assert idx is not None
+        return idx.encode_queries(queries)
+
+    def _index_changed(self, idx: LoadedIndex, force: bool = False) -> bool:
+        """Whether data/index was rebuilt since `idx` was loaded (checked at most every
+        INDEX_CHECK_INTERVAL_S unless `force`)."""
+        now = time.monotonic()
+        if not force and now - self._index_checked_at < get_settings().index_check_interval_s:
+            return False
+        self._index_checked_at = now
+        return index_fingerprint(self.index_dir) != idx.version
+
+    @staticmethod
+    def _result_key(idx: LoadedIndex, raw: str, k: int, settings: Settings) -> tuple:
+        return (
+            normalize_whitespace(raw),
+            int(k),
+            tuple(getattr(settings, f) for f in _RESULT_KEY_FIELDS),
+            idx.version,
+        )
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit/miss statistics of the result, query embedding, Gemini intent, query expansion
+        and rerank score caches."""
+        stats: Dict[str, Dict[str, Any]] = {}
+        if self._result_cache is not None:
+            stats["result_cache"] = self._result_cache.stats()
+        if self._idx is not None and self._idx.query_cache is not None:
+            stats["query_embedding_cache"] = self._idx.query_cache.stats()
+        if self._intent_extractor is not None:
+            stats["intent_cache"] = self._intent_extractor.cache.stats()
+        if self._query_expander is not None:
+            stats["query_expansion_cache"] = self._query_expander._cache.stats()
+        if self._reranker is not None:
+            stats["rerank_cache"] = self._reranker.cache.stats()
+        return stats
+
+    @staticmethod
+    def _fetch_jd(url: str) -> str:
+        with stage("jd_fetch"):
+            return extract_text_from_url(url)
+
+    def _resolve_query_text(self, raw: str) -> str:
+        """If the input is a URL, fetch the JD text; otherwise use it as is."""
+        if looks_like_url(raw):
+            try:
+                return self._jd_flight.do(raw, lambda: self._fetch_jd(raw))
+            except Exception:
+                # fallback: treat as plain text
+                count("jd_fetch_error")
+                return raw
+        return raw
 
     def recommend(self, query_or_url: str, k: int = 10) -> List[Dict[str, Any]]:
-        self._lazy_load()
-        assert self._idx is not None
+        with stage("recommend"):
+            return self._recommend(query_or_url, k)
+
+    def _recommend(self, query_or_url: str, k: int) -> List[Dict[str, Any]]:
+        idx = self._lazy_load()
         assert self._intent_extractor is not None
         assert self._query_expander is not None
 
@@ -52,21 +246,25 @@ class Recommender:
         if not raw:
             return []
 
+        # Full-result cache: identical (normalized) query + k + settings + index version
+        settings = get_settings()
+        key = self._result_key(idx, raw, k, settings)
+        cached = self._result_cache.get(key) if self._result_cache is not None else None
+        if cached is not None:
+            count("result_cache_hit")
+            return _copy_results(cached)
+        count("result_cache_miss")
+
         # If URL, fetch JD text
-        query_text = raw
-        if looks_like_url(raw):
-            try:
-                query_text = extract_text_from_url(raw)
-            except Exception:
-                # fallback: treat as plain text
-                query_text = raw
+        query_text = self._resolve_query_text(raw)
 
         # PHASE 3: Query expansion for generic roles (cached, rule-based first)
         # NOTE: Disabled - query expansion causes retrieval drift for other queries
         # expanded_query = self._query_expander.expand(query_text, use_gemini=False)
 
         # Gemini intent extraction (cached)
-        intent = self._intent_extractor.extract(query_text)
+        with stage("intent"):
+            intent = self._intent_extractor.extract(query_text)
         
         # PHASE 3: Extract test-type intent (personality, cognitive, admin, etc.)
         # NOTE: Disabled for now
@@ -76,32 +274,241 @@ class Recommender:
         # NOTE: Disabled for now
         # query_duration = parse_duration_from_query(expanded_query)
 
-        # Optimized retrieval with fine-tuned parameters
-        settings = get_settings()
+        # Optimized retrieval with fine-tuned parameters; duration/remote constraints
+        # are applied to the scores before the candidate pool is cut
         pairs = hybrid_retrieve(
-            self._idx,
+            idx,
             query_text,
             alpha=settings.hybrid_alpha,
             top_n=settings.candidate_pool,
+            constraints=ConstraintSet.from_intent(intent, idx.columns),
         )
+        out = self._finalize(idx, query_text, intent, pairs, k)
+        if self._result_cache is not None:
+            self._result_cache.put(key, _copy_results(out))
+        return out
+
+    async def arecommend(self, query_or_url: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Async recommend with concurrent stages, each under its own deadline (see Settings).
+
+        The JD fetch runs first; intent extraction (on the shared LLM client, holding no
+        thread while it waits) and retrieval scoring (in the default executor) then run
+        side by side, so latency is bounded by the slower of the two rather than their
+        sum. Both need the query embedding, which is encoded once for the two of them.
+        Constraints from the intent are applied to the finished scores.
+        A late intent falls back to heuristic_intent and a late rerank is skipped; results
+        degraded that way are not cached.
+        """
+        with stage("arecommend"):
+            return await self._arecommend(query_or_url, k)
+
+    async def _arecommend(self, query_or_url: str, k: int) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        idx = await _in_executor(loop, self._lazy_load)
+        assert self._intent_extractor is not None
+
+        raw = (query_or_url or "").strip()
+        if not raw:
+            return []
+
+        settings = get_settings()
+        key = self._result_key(idx, raw, k, settings)
+        cached = self._result_cache.get(key) if self._result_cache is not None else None
+        if cached is not None:
+            count("result_cache_hit")
+            return _copy_results(cached)
+        count("result_cache_miss")
+
+        query_text = raw
+        if looks_like_url(raw):
+            query_text = await _within(
+                _in_executor(loop, self._resolve_query_text, raw), settings.url_fetch_timeout_s, None
+            )
+            if query_text is None:
+                count("jd_fetch_timeout")
+                query_text = raw
+
+        # Intent (network-bound) and hybrid scoring (CPU-bound) are independent
+        intent_fut = asyncio.ensure_future(self._intent_extractor.aextract(query_text))
+        scores_fut = _in_executor(
+            loop,
+            partial(hybrid_scores, idx, [query_text], alpha=settings.hybrid_alpha, min_candidates=settings.candidate_pool),
+        )
+        with stage("intent"):
+            intent = await _within(intent_fut, settings.intent_timeout_s, None)
+        degraded = intent is None
+        if intent is None:
+            count("intent_timeout")
+            intent = heuristic_intent(query_text)
+        scores = await asyncio.wait_for(scores_fut, settings.retrieval_timeout_s or None)
+
+        with stage("filter"):
+            apply_constraints(scores, [ConstraintSet.from_intent(intent, idx.columns)])
+        with stage("top_n"):
+            pairs = top_n_rows(scores, settings.candidate_pool)[0]
+
+        out = None
+        if self._reranker is not None:
+            out = await _within(
+                _in_executor(loop, self._finalize, idx, query_text, intent, pairs, k),
+                settings.rerank_timeout_s,
+                None,
+            )
+            if out is None:
+                count("rerank_timeout")
+                degraded = True
+        if out is None:
+            out = await _in_executor(loop, partial(self._finalize, idx, query_text, intent, pairs, k, rerank=False))
+
+        if self._result_cache is not None and not degraded:
+            self._result_cache.put(key, _copy_results(out))
+        return out
+
+    def recommend_many(self, queries: Sequence[str], k: int = 10, batch_size: int = 64) -> List[List[Dict[str, Any]]]:
+        """Batched recommend: queries are encoded and scored `batch_size` at a time.
+
+        Repeated queries (same normalized text) are resolved once, and so is each
+        distinct JD text's intent.
+        """
+        idx = self._lazy_load()
+        assert self._intent_extractor is not None
+
+        settings = get_settings()
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        # result key -> (raw query, positions it answers)
+        live: Dict[tuple, Tuple[str, List[int]]] = {}
+        for i, q in enumerate(queries):
+            raw = (q or "").strip()
+            if not raw:
+                continue
+            key = self._result_key(idx, raw, k, settings)
+            if key in live:
+                live[key][1].append(i)
+                continue
+            cached = self._result_cache.get(key) if self._result_cache is not None else None
+            if cached is not None:
+                count("result_cache_hit")
+                results[i] = _copy_results(cached)
+            else:
+                count("result_cache_miss")
+                live[key] = (raw, [i])
+
+        pending = list(live.items())
+        for start in range(0, len(pending), max(1, batch_size)):
+            batch = pending[start:start + batch_size]
+            texts = [self._resolve_query_text(raw) for _, (raw, _) in batch]
+            with stage("intent"):
+                by_text = {t: self._intent_extractor.extract(t) for t in dict.fromkeys(texts)}
+            intents = [by_text[t] for t in texts]
+            all_pairs = hybrid_retrieve_many(
+                idx,
+                texts,
+                alpha=settings.hybrid_alpha,
+                top_n=settings.candidate_pool,
+                constraints=[ConstraintSet.from_intent(it, idx.columns) for it in intents],
+            )
+            for (key, (_, positions)), text, intent, pairs in zip(batch, texts, intents, all_pairs):
+                out = self._finalize(idx, text, intent, pairs, k)
+                for i in positions:
+                    results[i] = _copy_results(out)
+                if self._result_cache is not None:
+                    self._result_cache.put(key, _copy_results(out))
+        return results
+
+    async def arecommend_stream(
+        self,
+        queries: "Iterable[str] | AsyncIterable[str]",
+        k: int = 10,
+        batch_size: int = 32,
+        concurrency: int = 2,
+    ) -> AsyncIterator[Tuple[int, List[Dict[str, Any]], Optional[str]]]:
+        """Recommend for a (possibly streamed) sequence of queries, yielding
+        (position, results, error) as each batch of `batch_size` queries completes.
+
+        Batches go through recommend_many in the default executor, at most `concurrency`
+        at a time; the input is read only as fast as batches are taken on. `error` is
+        None, or the message of the exception that failed the query's batch. An error
+        raised by `queries` itself is re-raised once the queries read before it are yielded.
+        """
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(max(1, concurrency))
+        done: "asyncio.Queue[Optional[List[Tuple[int, List[Dict[str, Any]], Optional[str]]]]]" = asyncio.Queue()
+        running: List[asyncio.Task] = []
+
+        async def run(start: int, batch: List[str]) -> None:
+            try:
+                out = await _in_executor(loop, self.recommend_many, batch, k, batch_size)
+                await done.put([(start + j, res, None) for j, res in enumerate(out)])
+            except Exception as e:
+                count("batch_error")
+                await done.put([(start + j, [], str(e) or type(e).__name__) for j in range(len(batch))])
+            finally:
+                slots.release()
+
+        async def produce() -> None:
+            try:
+                batch: List[str] = []
+                start = 0
+                error: Optional[Exception] = None
+                try:
+                    async for q in _aiter(queries):
+                        batch.append(q)
+                        if len(batch) >= batch_size:
+                            await slots.acquire()
+                            running.append(asyncio.create_task(run(start, batch)))
+                            start += len(batch)
+                            batch = []
+                except Exception as e:
+                    # Bad input: the queries read before it are still answered, then it is raised
+                    error = e
+                if batch:
+                    await slots.acquire()
+                    running.append(asyncio.create_task(run(start, batch)))
+                await asyncio.gather(*running)
+                if error is not None:
+                    raise error
+            finally:
+                await done.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                rows = await done.get()
+                if rows is None:
+                    break
+                for row in rows:
+                    yield row
+            await producer  # re-raise input errors
+        finally:
+            producer.cancel()
+            for task in running:
+                task.cancel()
+
+    def _finalize(
+        self,
+        idx: LoadedIndex,
+        query_text: str,
+        intent: Intent,
+        pairs: List[Tuple[int, float]],
+        k: int,
+        rerank: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Turn retrieval pairs into the final list: optional rerank (unless `rerank` is False), K/P balancing.
 
-        # Build candidate list
-        candidates: List[Dict[str, Any]] = []
-        for doc_id, score in pairs:
-            it = dict(self._idx.meta[doc_id])
-            it["_score"] = score
-            it["url"] = canonical_shl_url(it.get("url", ""))
-            # Ensure required fields exist with proper types
-            it["adaptive_support"] = (it.get("adaptive_support") or "No")
-            it["remote_support"] = (it.get("remote_support") or "Yes")
-            it["duration"] = int(it.get("duration") or 0)
-            it["test_type"] = list(it.get("test_type") or [])
-            it["description"] = it.get("description") or ""
-            it["name"] = it.get("name") or ""
-            candidates.append(it)
+        `pairs` must come from a retrieval over `idx` constrained with ConstraintSet.from_intent(intent).
+
+        Balancing runs on the index's columnar metadata; response dicts are
+        only built for the selected results (or for the rerank pool when reranking).
+        """
+        cols = idx.columns
+        meta = idx.meta
+
+        # Candidate list as parallel arrays
+        ids = np.fromiter((d for d, _ in pairs), dtype=np.int64, count=len(pairs))
+        scores = np.fromiter((s for _, s in pairs), dtype=np.float64, count=len(pairs))
 
         # PHASE 3: Apply duration-aware score boost (before filtering)
-        # NOTE: Disabled - can hurt relevance. Duration constraint still applied below.
+        # NOTE: Disabled - can hurt relevance. Duration constraint is applied during retrieval.
         # if query_duration:
         #     candidates = apply_duration_scoring_boost(candidates, query_duration, max_boost=0.10)
         
@@ -109,26 +516,22 @@ class Recommender:
         # NOTE: Disabled - aggressive boosting disrupts core ranking. Query expansion sufficient.
         # candidates = boost_matching_test_types(candidates, test_type_intent, boost_factor=0.08)
 
-        # Constraint filtering (duration, remote), but do not over-filter
-        filtered = candidates
-
-        if intent.duration_limit_minutes is not None:
-            under = [c for c in filtered if c.get("duration", 0) and c["duration"] <= intent.duration_limit_minutes]
-            if len(under) >= 5:
-                filtered = under
-
-        if intent.remote_required is True:
-            rem = [c for c in filtered if str(c.get("remote_support", "")).lower().startswith("y")]
-            if len(rem) >= 5:
-                filtered = rem
-
-        # LLM-based reranking if available (improves relevance)
-        # CRITICAL FIX: Limit reranking to top 60 instead of all candidates
-        if self._reranker and len(filtered) > 0:
-            filtered = self._reranker.rerank(query_text, filtered, top_k=min(len(filtered), 60))
+        k_out = min(10, max(5, k))
 
-        # Balance K/P mix with improved score-aware algorithm
-        out = pick_balanced_improved(filtered, k=min(10, max(5, k)), kp_weights=intent.domain_mix)
+        if rerank and self._reranker and len(ids) > 0:
+            # LLM-based reranking if available (improves relevance)
+            # CRITICAL FIX: Limit reranking to top 60 instead of all candidates
+            filtered = cols.materialize_many(meta, ids, scores)
+            with stage("rerank"):
+                filtered = self._reranker.rerank(query_text, filtered, top_k=min(len(filtered), 60))
+            # Balance K/P mix with improved score-aware algorithm
+            with stage("balance"):
+                out = pick_balanced_improved(filtered, k=k_out, kp_weights=intent.domain_mix)
+        else:
+            # Balance K/P mix on the columns, then materialize only the picks
+            with stage("balance"):
+                sel = pick_balanced_improved_ids(scores, cols.kp_flags[ids], cols.url_id[ids], k_out, intent.domain_mix)
+                out = cols.materialize_many(meta, ids[sel], scores[sel])
 
         # Remove internal scores before returning
         for o in out:
@@ -1,34 +1,211 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import pickle
-from dataclasses import dataclass
+import warnings
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
 
+from .ann import IVFIndex
+from .bm25 import SparseBM25
+from .caching import SingleFlight
+from .catalog_columns import CatalogColumns
+from .constraints import ConstraintSet
+from .embedding_store import EmbeddingStore
+from .encoders import ONNX_DIRNAME, MicroBatchEncoder, QueryEncoder, encoder_id, load_encoder, parity_score
+from .index_bundle import BUNDLE_FILENAME, CATALOG_STAMP_FILENAME, IndexBundle, catalog_file_sha1
+from .indexer import corpus_text
+from .query_cache import QueryEmbeddingCache
+from .telemetry import stage
 from .utils import normalize_whitespace
 
 
 @dataclass
 class LoadedIndex:
-    meta: List[Dict[str, Any]]
-    bm25: BM25Okapi
-    embeddings: np.ndarray
-    embedder: SentenceTransformer
+    meta: Sequence[Dict[str, Any]]
+    bm25: SparseBM25
+    embeddings: EmbeddingStore
+    embedder: QueryEncoder
+    query_cache: Optional[QueryEmbeddingCache] = None
+    # With quantized embeddings: rescore this many top candidates per query in exact float32
+    rescore_n: int = 0
+    # Optional IVF index for the semantic leg (None = exact brute-force search)
+    ann: Optional[IVFIndex] = None
+    ann_nprobe: int = 8
+    ann_lexical_candidates: int = 200
+    # Cleaned columnar view of meta (durations, flags, test types, canonical URLs)
+    columns: Optional[CatalogColumns] = None
+    # Fingerprint of the index files this was loaded from (see index_fingerprint)
+    version: str = ""
+    # Documents removed by an incremental update (never returned), or None
+    tombstones: Optional[np.ndarray] = None
+    # Concurrent encodes of the same queries (e.g. intent model and scoring) share one pass
+    _encode_flight: SingleFlight = field(default_factory=lambda: SingleFlight("query_encode"), repr=False)
 
+    def __post_init__(self):
+        if self.columns is None:
+            self.columns = CatalogColumns.from_meta(self.meta)
 
-def load_index(index_dir: str | Path, embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2") -> LoadedIndex:
+    def encode_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """Normalized float32 query embeddings, served from the query cache when possible."""
+        return self._encode_flight.do(tuple(queries), lambda: self._encode(queries))
+
+    def _encode(self, queries: Sequence[str]) -> np.ndarray:
+        if self.query_cache is not None:
+            return self.query_cache.encode(self.embedder, queries)
+        return np.asarray(self.embedder.encode(list(queries), normalize_embeddings=True), dtype=np.float32)
+
+
+def load_index(
+    index_dir: str | Path,
+    embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+    query_cache_size: int = 1024,
+    query_cache_path: Optional[str | Path] = None,
+    embedding_dtype: str = "float32",
+    mmap: bool = True,
+    rescore_n: int = 0,
+    use_ann: bool = False,
+    ann_nprobe: int = 8,
+    ann_lexical_candidates: int = 200,
+    encoder_backend: str = "torch",
+    encoder_parity_tol: float = 0.02,
+    verify_checksums: bool = False,
+    encode_batch_max: int = 1,
+    encode_batch_wait_ms: float = 2.0,
+    encode_batch_timeout_s: float = 10.0,
+    catalog_jsonl: Optional[str | Path] = None,
+) -> LoadedIndex:
+    """Load `index_dir`: the index.shlidx bundle when present, else the older one-file-per-artifact layout.
+
+    A bundle built with another embedding model (or another schema version) raises IndexFormatError,
+    and so does one built from a catalog other than `catalog_jsonl` (when that file exists; its hash
+    is kept in catalog_stamp.json and recomputed only when the file's size or mtime changes).
+    With `encode_batch_max` > 1, concurrent query encodes share forward passes (MicroBatchEncoder).
+    """
     index_dir = Path(index_dir)
-    meta = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
-    with open(index_dir / "bm25.pkl", "rb") as f:
-        bm25 = pickle.load(f)
-    embeddings = np.load(index_dir / "embeddings.npy")
-    embedder = SentenceTransformer(embedding_model)
-    return LoadedIndex(meta=meta, bm25=bm25, embeddings=embeddings, embedder=embedder)
+    bundle_path = index_dir / BUNDLE_FILENAME
+    if bundle_path.exists():
+        expected_sha1 = None
+        if catalog_jsonl and Path(catalog_jsonl).is_file():
+            # Re-hashed only when the catalog file's size or mtime changed since the last load
+            expected_sha1 = catalog_file_sha1(catalog_jsonl, stamp_path=index_dir / CATALOG_STAMP_FILENAME)
+        bundle = IndexBundle.open(
+            bundle_path,
+            embedding_model=embedding_model,
+            catalog_sha1=expected_sha1,
+            mmap=mmap,
+            verify=verify_checksums,
+        )
+        meta = bundle.meta()
+        bm25 = bundle.bm25()
+        columns = bundle.columns()
+        embeddings = bundle.embeddings(embedding_dtype)
+        ann = bundle.ivf() if use_ann else None
+        tombstones = bundle.tombstones()
+    else:
+        meta = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+        bm25 = _load_bm25(index_dir)
+        columns_path = index_dir / "columns.npz"
+        columns = CatalogColumns.load(columns_path) if columns_path.exists() else CatalogColumns.from_meta(meta)
+        embeddings = EmbeddingStore.open(index_dir, dtype=embedding_dtype, mmap=mmap)
+        ann = None
+        if use_ann and (index_dir / "ivf.npz").exists():
+            ann = IVFIndex.load(index_dir / "ivf.npz")
+        tombstones = None
+    embedder = _load_embedder(index_dir, meta, embeddings, embedding_model, encoder_backend, encoder_parity_tol)
+    if encode_batch_max > 1:
+        embedder = MicroBatchEncoder(
+            embedder, max_batch=encode_batch_max, max_wait_ms=encode_batch_wait_ms, timeout_s=encode_batch_timeout_s
+        )
+    query_cache = None
+    if query_cache_size > 0:
+        query_cache = QueryEmbeddingCache(
+            encoder_id(embedder, embedding_model), max_size=query_cache_size, spill_path=query_cache_path
+        )
+    return LoadedIndex(
+        meta=meta,
+        bm25=bm25,
+        embeddings=embeddings,
+        embedder=embedder,
+        query_cache=query_cache,
+        rescore_n=rescore_n,
+        ann=ann,
+        ann_nprobe=ann_nprobe,
+        ann_lexical_candidates=ann_lexical_candidates,
+        columns=columns,
+        version=index_fingerprint(index_dir),
+        tombstones=tombstones,
+    )
+
+
+# Files whose change means the index was rebuilt
+_INDEX_FILES = (
+    BUNDLE_FILENAME,
+    "meta.json",
+    "columns.npz",
+    "bm25.npz",
+    "embeddings.npy",
+    "embeddings.f16.npy",
+    "embeddings.i8.npy",
+    "ivf.npz",
+)
+
+
+def index_fingerprint(index_dir: str | Path) -> str:
+    """Cheap version id of an index dir from the size/mtime of its artifacts (stat calls only)."""
+    index_dir = Path(index_dir)
+    h = hashlib.sha1()
+    for name in _INDEX_FILES:
+        try:
+            st = (index_dir / name).stat()
+        except FileNotFoundError:
+            continue
+        h.update(f"{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()[:16]
+
+
+def _load_embedder(
+    index_dir: Path,
+    meta: Sequence[Dict[str, Any]],
+    embeddings: EmbeddingStore,
+    embedding_model: str,
+    backend: str,
+    parity_tol: float,
+    n_probe_docs: int = 8,
+) -> QueryEncoder:
+    """Load the query encoder; a non-torch backend must reproduce the stored catalog vectors.
+
+    The parity check re-encodes a few catalog items and compares them with the
+    embeddings the PyTorch encoder wrote at build time. If the minimum cosine falls
+    below 1 - parity_tol (or the backend cannot load), we fall back to PyTorch.
+    """
+    if backend == "torch":
+        return load_encoder(embedding_model, backend="torch")
+    try:
+        encoder = load_encoder(embedding_model, backend=backend, model_dir=index_dir / ONNX_DIRNAME)
+        ids = np.linspace(0, len(meta) - 1, num=min(n_probe_docs, len(meta)), dtype=int)
+        score = parity_score(encoder, [corpus_text(meta[i]) for i in ids], embeddings.exact_rows(ids))
+    except Exception as e:
+        warnings.warn(f"{backend} encoder unavailable ({e}); using PyTorch encoder")
+        return load_encoder(embedding_model, backend="torch")
+    if score < 1.0 - parity_tol:
+        warnings.warn(f"{backend} encoder parity {score:.4f} < {1.0 - parity_tol:.4f}; using PyTorch encoder")
+        return load_encoder(embedding_model, backend="torch")
+    return encoder
+
+
+def _load_bm25(index_dir: Path) -> SparseBM25:
+    path = index_dir / "bm25.npz"
+    if path.exists():
+        return SparseBM25.load(path)
+    # Index built before bm25.npz existed: rebuild the postings from the saved tokens
+    with open(index_dir / "corpus_tokens.pkl", "rb") as f:
+        corpus_tokens = pickle.load(f)
+    return SparseBM25.from_corpus_tokens(corpus_tokens)
 
 
 def _tokenize(text: str) -> List[str]:
@@ -36,25 +213,150 @@ def _tokenize(text: str) -> List[str]:
     return [t for t in normalize_whitespace(text).split(" ") if t]
 
 
+def hybrid_scores(
+    idx: LoadedIndex,
+    queries: Sequence[str],
+    alpha: float = 0.35,
+    min_candidates: int = 0,
+) -> np.ndarray:
+    """Return a (len(queries), n_docs) matrix of blended BM25 + cosine scores.
+
+    With an ANN index loaded, documents outside a query's candidate set score -inf; a
+    query whose candidate set is smaller than `min_candidates` is scored exhaustively.
+    Tombstoned documents always score -inf.
+    """
+    # BM25 (each row max-normalized)
+    with stage("bm25"):
+        bm = np.stack([idx.bm25.get_scores(_tokenize(q)) for q in queries]).astype(np.float32)
+        bm_max = bm.max(axis=1, keepdims=True)
+        bm = np.where(bm_max > 0, bm / (bm_max + 1e-6), bm)
+
+    with stage("encode"):
+        qembs = idx.encode_queries(queries)
+    if idx.ann is None:
+        with stage("dense"):
+            return _exact_scores(idx, qembs, bm, alpha)
+
+    with stage("dense"):
+        return _ann_scores(idx, qembs, bm, alpha, min_candidates)
+
+
+def _ann_scores(idx: LoadedIndex, qembs: np.ndarray, bm: np.ndarray, alpha: float, min_candidates: int) -> np.ndarray:
+    assert idx.ann is not None
+    score = np.full(bm.shape, -np.inf, dtype=np.float32)
+    fallback = []
+    for r, qemb in enumerate(qembs):
+        cand = idx.ann.search(qemb, nprobe=idx.ann_nprobe)
+        # The lexical leg is exhaustive already: keep its best matches in the candidate set
+        n_lex = min(idx.ann_lexical_candidates, bm.shape[1])
+        if n_lex > 0:
+            lex = np.argpartition(-bm[r], n_lex - 1)[:n_lex]
+            cand = np.union1d(cand, lex[bm[r, lex] > 0])
+        if idx.tombstones is not None:
+            cand = cand[~idx.tombstones[cand]]
+        if len(cand) < max(min_candidates, 1):
+            fallback.append(r)
+            continue
+        cos = _gather_cosine(idx.embeddings, cand, qemb)
+        cosn = (cos - cos.min()) / (cos.max() - cos.min() + 1e-6)
+        score[r, cand] = alpha * bm[r, cand] + (1 - alpha) * cosn
+
+    if fallback:
+        score[fallback] = _exact_scores(idx, qembs[fallback], bm[fallback], alpha)
+    return score
+
+
+def _exact_scores(idx: LoadedIndex, qembs: np.ndarray, bm: np.ndarray, alpha: float) -> np.ndarray:
+    # Embedding cosine similarity (embeddings are normalized): one matmul for the whole batch
+    cos = (idx.embeddings @ qembs.T).T
+    # normalize each row to 0..1 (over live documents only)
+    dead = idx.tombstones
+    if dead is None:
+        cmin = cos.min(axis=1, keepdims=True)
+        cmax = cos.max(axis=1, keepdims=True)
+    else:
+        cmin = np.where(dead, np.inf, cos).min(axis=1, keepdims=True)
+        cmax = np.where(dead, -np.inf, cos).max(axis=1, keepdims=True)
+    cosn = (cos - cmin) / (cmax - cmin + 1e-6)
+
+    score = alpha * bm + (1 - alpha) * cosn
+    if dead is not None:
+        score[:, dead] = -np.inf
+
+    # Quantized vectors: recompute the cosine of each row's best candidates exactly
+    n_rescore = min(idx.rescore_n, score.shape[1])
+    if n_rescore > 0 and getattr(idx.embeddings, "is_quantized", False):
+        for r in range(score.shape[0]):
+            cand = np.argpartition(-score[r], n_rescore - 1)[:n_rescore]
+            exact = idx.embeddings.exact_scores(cand, qembs[r])
+            exact_n = (exact - cmin[r]) / (cmax[r] - cmin[r] + 1e-6)
+            score[r, cand] = alpha * bm[r, cand] + (1 - alpha) * exact_n
+
+    return score
+
+
+def _gather_cosine(embeddings, ids: np.ndarray, qemb: np.ndarray) -> np.ndarray:
+    """Cosine of `qemb` with selected rows, in exact float32 when the store keeps a copy."""
+    if hasattr(embeddings, "exact_scores"):
+        return embeddings.exact_scores(ids, qemb)
+    return np.asarray(embeddings[ids], dtype=np.float32) @ qemb
+
+
+def top_n_rows(scores: np.ndarray, top_n: int) -> List[List[Tuple[int, float]]]:
+    """Per-row top-n (doc_idx, score) lists sorted desc, via argpartition + a sort of the survivors."""
+    out: List[List[Tuple[int, float]]] = []
+    for row in scores:
+        n = min(int(top_n), row.shape[0])
+        if n <= 0:
+            out.append([])
+            continue
+        if n < row.shape[0]:
+            part = np.argpartition(-row, n - 1)[:n]
+        else:
+            part = np.arange(row.shape[0])
+        top_idx = part[np.argsort(-row[part], kind="stable")]
+        # -inf marks documents that were never scored (outside the ANN candidates)
+        top_idx = top_idx[np.isfinite(row[top_idx])]
+        out.append([(int(i), float(row[i])) for i in top_idx])
+    return out
+
+
+def apply_constraints(scores: np.ndarray, constraints: Sequence[Optional[ConstraintSet]]) -> np.ndarray:
+    """Set the scores of documents each row's constraints exclude to -inf (in place)."""
+    for r, cs in enumerate(constraints):
+        if cs:
+            row = scores[r]
+            row[~cs.mask(np.isfinite(row))] = -np.inf
+    return scores
+
+
+def hybrid_retrieve_many(
+    idx: LoadedIndex,
+    queries: Sequence[str],
+    alpha: float = 0.35,
+    top_n: int = 80,
+    constraints: Optional[Sequence[Optional[ConstraintSet]]] = None,
+) -> List[List[Tuple[int, float]]]:
+    """Batched hybrid_retrieve: one list[(doc_idx, score)] per query, sorted desc.
+
+    `constraints` (one per query, or None) filter documents before the top-n cut.
+    """
+    if not len(queries):
+        return []
+    scores = hybrid_scores(idx, queries, alpha=alpha, min_candidates=top_n)
+    if constraints is not None:
+        with stage("filter"):
+            apply_constraints(scores, constraints)
+    with stage("top_n"):
+        return top_n_rows(scores, top_n)
+
+
 def hybrid_retrieve(
     idx: LoadedIndex,
     query: str,
     alpha: float = 0.35,
     top_n: int = 80,
+    constraints: Optional[ConstraintSet] = None,
 ) -> List[Tuple[int, float]]:
     """Return list[(doc_idx, score)] sorted desc."""
-    # BM25
-    qtok = _tokenize(query)
-    bm = np.array(idx.bm25.get_scores(qtok), dtype=np.float32)
-    if bm.max() > 0:
-        bm = bm / (bm.max() + 1e-6)
-
-    # Embedding cosine similarity (embeddings are normalized)
-    qemb = idx.embedder.encode([query], normalize_embeddings=True)[0].astype(np.float32)
-    cos = idx.embeddings @ qemb
-    # normalize to 0..1
-    cosn = (cos - cos.min()) / (cos.max() - cos.min() + 1e-6)
-
-    score = alpha * bm + (1 - alpha) * cosn
-    top_idx = np.argsort(-score)[:top_n]
-    return [(int(i), float(score[i])) for i in top_idx]
+    return hybrid_retrieve_many(idx, [query], alpha=alpha, top_n=top_n, constraints=[constraints])[0]
@@ -19,18 +19,115 @@ class Settings:
 
     # Storage
     index_dir: Path = Path(os.getenv("INDEX_DIR", "data/index"))
+    # Verify the crc32 of every index.shlidx section at load (reads the whole file once)
+    index_verify_checksums: bool = os.getenv("INDEX_VERIFY_CHECKSUMS", "0") in ("1", "true", "True")
+    # Catalog the index was built from; when the file exists, an index built from another
+    # catalog fails to load (empty = not checked)
+    catalog_path: str = os.getenv("CATALOG_PATH", "data/catalog.jsonl")
+    # Build-time cache of catalog embeddings keyed on (model, text hash); empty = disabled
+    embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", "data/index/embedding_cache.sqlite")
 
     # Gemini
     gemini_api_key: str = os.getenv("GEMINI_API_KEY", "")
     gemini_model: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 
+    # LLM client shared by intent, rerank and expansion calls: gemini | stub (local HTTP
+    # stub at LLM_STUB_URL, see scripts/llm_stub_server.py) | none
+    llm_backend: str = os.getenv("LLM_BACKEND", "gemini")
+    llm_stub_url: str = os.getenv("LLM_STUB_URL", "http://127.0.0.1:8765")
+    # Per-attempt timeout (also bounds the wait for a slot), retries with jittered
+    # exponential backoff, calls in flight per process
+    llm_timeout_s: float = float(os.getenv("LLM_TIMEOUT_S", "5"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "1"))
+    llm_retry_backoff_s: float = float(os.getenv("LLM_RETRY_BACKOFF_S", "0.2"))
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    # Circuit breaker: open after LLM_BREAKER_FAILURES failed calls in a row (callers use
+    # their heuristics), try again after LLM_BREAKER_RESET_S
+    llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    llm_breaker_reset_s: float = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+
+    # Intent source: gemini | hybrid (local model from scripts/train_intent_model.py, Gemini
+    # below INTENT_MODEL_MIN_CONFIDENCE) | local (model and rules only, no Gemini calls)
+    intent_mode: str = os.getenv("INTENT_MODE", "gemini")
+    intent_model_min_confidence: float = float(os.getenv("INTENT_MODEL_MIN_CONFIDENCE", "0.6"))
+
+    # Persistent Gemini intent / query-expansion caches (SQLite); 0 = unbounded / no expiry
+    llm_cache_max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+    llm_cache_ttl_s: float = float(os.getenv("LLM_CACHE_TTL_S", "0"))
+
     # Retrieval params
     hybrid_alpha: float = float(os.getenv("HYBRID_ALPHA", "0.39"))  # BM25 weight (fine-tuned: 0.39)
     candidate_pool: int = int(os.getenv("CANDIDATE_POOL", "200"))   # INCREASED: was 60, now 200 for better coverage
     top_k: int = int(os.getenv("TOP_K", "10"))                      # final k returned
 
+    # Query embedding cache (QUERY_CACHE_PATH enables an on-disk spill file)
+    query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    query_cache_path: str = os.getenv("QUERY_CACHE_PATH", "")
+
+    # Embedding storage: float32 | float16 | int8 (needs an index built with that dtype),
+    # memory-mapped so workers share pages; quantized scores of the top EXACT_RESCORE
+    # candidates are recomputed in float32
+    embedding_dtype: str = os.getenv("EMBEDDING_DTYPE", "float32")
+    embedding_mmap: bool = os.getenv("EMBEDDING_MMAP", "1") in ("1", "true", "True")
+    exact_rescore: int = int(os.getenv("EXACT_RESCORE", "100"))
+
+    # Approximate nearest-neighbour search for the semantic leg (needs ivf.npz, see
+    # `scripts/build_index.py --ann`). More probed lists = higher recall, more latency.
+    ann_enabled: bool = os.getenv("ANN_ENABLED", "0") in ("1", "true", "True")
+    ann_nprobe: int = int(os.getenv("ANN_NPROBE", "8"))
+    ann_lexical_candidates: int = int(os.getenv("ANN_LEXICAL_CANDIDATES", "200"))
+
+    # Query encoder backend: torch | onnx (int8 model exported to <index_dir>/onnx by
+    # scripts/export_onnx_encoder.py, checked against the stored catalog vectors at load)
+    encoder_backend: str = os.getenv("ENCODER_BACKEND", "torch")
+    encoder_parity_tol: float = float(os.getenv("ENCODER_PARITY_TOL", "0.02"))
+    # Concurrent query encodes share forward passes of up to ENCODE_BATCH_MAX texts (1 = off);
+    # under load a pass waits up to ENCODE_BATCH_WAIT_MS for more callers
+    encode_batch_max: int = int(os.getenv("ENCODE_BATCH_MAX", "32"))
+    encode_batch_wait_ms: float = float(os.getenv("ENCODE_BATCH_WAIT_MS", "2"))
+    # A batched encode not answered in time is encoded directly by its caller (<= 0: no limit)
+    encode_batch_timeout_s: float = float(os.getenv("ENCODE_BATCH_TIMEOUT_S", "10"))
+
+    # Full-result cache in front of Recommender.recommend; entries are also dropped when
+    # the index files change (checked at most every INDEX_CHECK_INTERVAL_S seconds)
+    result_cache_size: int = int(os.getenv("RESULT_CACHE_SIZE", "2048"))
+    result_cache_ttl_s: float = float(os.getenv("RESULT_CACHE_TTL_S", "3600"))
+    index_check_interval_s: float = float(os.getenv("INDEX_CHECK_INTERVAL_S", "5"))
+
+    # API: threads running recommendation work (the event loop's default executor)
+    api_threadpool_size: int = int(os.getenv("API_THREADPOOL_SIZE", "8"))
+    # /recommend/batch: queries per encoder/scoring batch, and batches in flight per request
+    api_batch_size: int = int(os.getenv("API_BATCH_SIZE", "32"))
+    api_batch_concurrency: int = int(os.getenv("API_BATCH_CONCURRENCY", "2"))
+
+    # Per-stage deadlines of Recommender.arecommend (seconds, 0 = none). A late JD fetch
+    # falls back to the raw input, a late intent to heuristic_intent, a late rerank to the
+    # retrieval order; retrieval itself has no fallback and raises TimeoutError.
+    url_fetch_timeout_s: float = float(os.getenv("URL_FETCH_TIMEOUT_S", "10"))
+    intent_timeout_s: float = float(os.getenv("INTENT_TIMEOUT_S", "4"))
+    retrieval_timeout_s: float = float(os.getenv("RETRIEVAL_TIMEOUT_S", "0"))
+    rerank_timeout_s: float = float(os.getenv("RERANK_TIMEOUT_S", "8"))
+
     # Optional rerank
     rerank_with_gemini: bool = os.getenv("RERANK_WITH_GEMINI", "0") in ("1", "true", "True")
+    # Reranker: none | gemini | cross_encoder (local CPU model); defaults to gemini when
+    # RERANK_WITH_GEMINI is set
+    reranker: str = os.getenv("RERANKER", "gemini" if rerank_with_gemini else "none")
+    cross_encoder_model: str = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    # What the cross-encoder outputs: logit (mapped to 0..1 with a sigmoid) | probability |
+    # auto (probability when the model's configured activation is a sigmoid, else logit)
+    cross_encoder_output: str = os.getenv("CROSS_ENCODER_OUTPUT", "auto")
+    # Candidates scored by the cross-encoder (0 = all); the rest keep a neutral score
+    cross_encoder_max_candidates: int = int(os.getenv("CROSS_ENCODER_MAX_CANDIDATES", "60"))
+    # Gemini reranking: the first GEMINI_RERANK_MAX_CANDIDATES (0 = all) are scored in
+    # prompts of GEMINI_RERANK_CHUNK_SIZE, up to GEMINI_RERANK_CONCURRENCY at once, each
+    # bounded by GEMINI_RERANK_CHUNK_TIMEOUT_S (0 = none)
+    gemini_rerank_max_candidates: int = int(os.getenv("GEMINI_RERANK_MAX_CANDIDATES", "60"))
+    gemini_rerank_chunk_size: int = int(os.getenv("GEMINI_RERANK_CHUNK_SIZE", "20"))
+    gemini_rerank_concurrency: int = int(os.getenv("GEMINI_RERANK_CONCURRENCY", "3"))
+    gemini_rerank_chunk_timeout_s: float = float(os.getenv("GEMINI_RERANK_CHUNK_TIMEOUT_S", "6"))
+    # In-memory (query, item) -> rerank score entries, in front of data/index/rerank_cache.sqlite
+    rerank_cache_size: int = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
 
 
 def get_settings() -> Settings:
@@ -0,0 +1,197 @@
+"""
+Low-overhead stage timers and event counters for the recommendation pipeline.
+
+Stages are timed with ``with stage("bm25"): ...`` into process-wide latency histograms
+(REGISTRY); events such as cache hits are counted with ``count("result_cache_hit")``.
+``render_prometheus`` formats both (plus cache statistics) in the Prometheus text
+format for the API's /metrics endpoint, and ``trace()`` collects the stage timings of
+a single call for scripts.
+"""
+from __future__ import annotations
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+# Histogram upper bounds (seconds): sub-millisecond numpy work up to multi-second LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds for count-valued histograms (batch sizes)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Stage -> seconds of the calls running under trace() (shared with executor threads
+# that run in a copy of the caller's context)
+_trace: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("shlrec_trace", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: above the largest bound
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if past the last bound)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Thread-safe stage histograms and event counters."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._stages: Dict[str, Histogram] = {}
+        # Non-latency histograms (e.g. batch sizes), each with its own buckets
+        self._values: Dict[str, Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            hist = self._stages.get(name)
+            if hist is None:
+                hist = self._stages[name] = Histogram(self._buckets)
+            hist.observe(seconds)
+        trace = _trace.get()
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + seconds
+
+    def observe_value(self, name: str, value: float, buckets: Sequence[float] = SIZE_BUCKETS) -> None:
+        with self._lock:
+            hist = self._values.get(name)
+            if hist is None:
+                hist = self._values[name] = Histogram(buckets)
+            hist.observe(value)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-stage count / total / mean / p50 / p95 / p99 seconds, the same summary of
+        the value histograms, and the counters."""
+        def summary(h: Histogram, unit: str) -> Dict[str, float]:
+            return {
+                "count": h.count,
+                f"total{unit}": h.sum,
+                f"mean{unit}": h.sum / h.count if h.count else 0.0,
+                f"p50{unit}": h.quantile(0.5),
+                f"p95{unit}": h.quantile(0.95),
+                f"p99{unit}": h.quantile(0.99),
+            }
+
+        with self._lock:
+            return {
+                "stages": {name: summary(h, "_s") for name, h in self._stages.items()},
+                "values": {name: summary(h, "") for name, h in self._values.items()},
+                "counters": dict(self._counters),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._values.clear()
+            self._counters.clear()
+
+    def render_prometheus(self, cache_stats: Optional[Mapping[str, Mapping[str, Any]]] = None) -> str:
+        """Prometheus text exposition of the stage histograms, counters and `cache_stats`
+        (name -> stats dict with hits / misses / size, as from Recommender.cache_stats)."""
+        with self._lock:
+            stages = {name: _frozen(h) for name, h in self._stages.items()}
+            values = {name: _frozen(h) for name, h in self._values.items()}
+            counters = dict(self._counters)
+        lines = [
+            "# HELP shlrec_stage_seconds Time spent per recommendation pipeline stage.",
+            "# TYPE shlrec_stage_seconds histogram",
+        ]
+        for name in sorted(stages):
+            lines += _histogram_lines("shlrec_stage_seconds", f'stage="{name}"', *stages[name])
+        for name in sorted(values):
+            lines.append(f"# TYPE shlrec_{name} histogram")
+            lines += _histogram_lines(f"shlrec_{name}", "", *values[name])
+
+        lines += ["# HELP shlrec_events_total Pipeline events.", "# TYPE shlrec_events_total counter"]
+        for name in sorted(counters):
+            lines.append(f'shlrec_events_total{{event="{name}"}} {counters[name]}')
+
+        if cache_stats:
+            for metric, field, kind in (
+                ("shlrec_cache_hits_total", "hits", "counter"),
+                ("shlrec_cache_misses_total", "misses", "counter"),
+                ("shlrec_cache_entries", "size", "gauge"),
+            ):
+                lines.append(f"# TYPE {metric} {kind}")
+                for cache in sorted(cache_stats):
+                    if field in cache_stats[cache]:
+                        lines.append(f'{metric}{{cache="{cache}"}} {cache_stats[cache][field]}')
+        return "\n".join(lines) + "\n"
+
+
+def _frozen(h: Histogram) -> Tuple[Tuple[float, ...], List[int], float, int]:
+    return h.buckets, list(h.counts), h.sum, h.count
+
+
+def _histogram_lines(
+    metric: str, labels: str, buckets: Sequence[float], counts: List[int], total: float, n: int
+) -> List[str]:
+    sep = "," if labels else ""
+    lines = []
+    cumulative = 0
+    for bound, c in zip(buckets, counts):
+        cumulative += c
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{bound:g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {n}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {total:.9g}")
+    lines.append(f"{metric}_count{suffix} {n}")
+    return lines
+
+
+REGISTRY = MetricsRegistry()
+
+
+def stage(name: str):
+    """Time a block into REGISTRY under `name`."""
+    return REGISTRY.stage(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    REGISTRY.count(name, n)
+
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+    """Collect stage -> seconds for the calls made inside the block (nested stages overlap)."""
+    timings: Dict[str, float] = {}
+    token = _trace.set(timings)
+    try:
+        yield timings
+    finally:
+        _trace.reset(token)
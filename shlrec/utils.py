@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import json
 import re
-from pathlib import Path
 from typing import Any, Dict, Optional
 
 
@@ -67,21 +66,3 @@ def safe_json_loads(text: str) -> Optional[Dict[str, Any]]:
         return None
     return None
 
-
-class DiskJSONCache:
-    """Tiny disk cache for Gemini calls to reduce free-tier usage."""
-
-    def __init__(self, path: str | Path):
-        self.path = Path(path)
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.path.exists():
-            self.path.write_text("{}", encoding="utf-8")
-
-    def get(self, key: str) -> Optional[dict]:
-        data = json.loads(self.path.read_text(encoding="utf-8"))
-        return data.get(key)
-
-    def set(self, key: str, value: dict) -> None:
-        data = json.loads(self.path.read_text(encoding="utf-8"))
-        data[key] = value
-        self.path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
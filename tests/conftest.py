@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+CATALOG = Path(__file__).resolve().parents[1] / "data" / "catalog.jsonl"
+DIM = 32
+
+
+class FakeEncoder:
+    """Deterministic stand-in for the sentence-transformers model: a hash-seeded unit
+    vector per text, so tests run without downloading a model."""
+
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        self.calls += 1
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+            v = np.random.default_rng(seed).standard_normal(self.dim)
+            out[i] = v / np.linalg.norm(v)
+        return out
+
+
+@pytest.fixture
+def fake_encoder(monkeypatch):
+    encoder = FakeEncoder()
+    load = lambda *args, **kwargs: encoder
+    for module in ("shlrec.indexer", "shlrec.build_pipeline", "shlrec.retrieval"):
+        monkeypatch.setattr(f"{module}.load_encoder", load)
+    return encoder
+
+
+def read_catalog(n: int = 40):
+    with open(CATALOG, encoding="utf-8") as f:
+        return [json.loads(line) for line, _ in zip(f, range(n))]
+
+
+def write_catalog(path: Path, items) -> Path:
+    path.write_text("".join(json.dumps(it) + "\n" for it in items), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def catalog_items():
+    return read_catalog()
+
+
+@pytest.fixture
+def index_dir(tmp_path, fake_encoder, catalog_items):
+    """A small index.shlidx built from the first catalog items."""
+    from shlrec.build_pipeline import build_streaming
+
+    out = tmp_path / "index"
+    out.mkdir()
+    build_streaming(write_catalog(tmp_path / "catalog.jsonl", catalog_items), out, "fake", progress=False)
+    return out
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Settings factory: offline defaults (no LLM, no reranker) plus `overrides`, installed
+    as get_settings() for the modules that read it."""
+    from shlrec.llm_client import close_llm_client
+    from shlrec.settings import Settings
+
+    def make(**overrides):
+        values = dict(llm_backend="none", reranker="none", intent_mode="gemini", query_cache_path="", catalog_path="")
+        values.update(overrides)
+        s = dataclasses.replace(Settings(), **values)
+        for module in ("shlrec.settings", "shlrec.recommender", "shlrec.llm_client"):
+            monkeypatch.setattr(f"{module}.get_settings", lambda: s)
+        return s
+
+    yield make
+    close_llm_client()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from functools import partial
+
+import pytest
+
+pytest.importorskip("httpx")  # needed by TestClient
+
+from fastapi.testclient import TestClient
+
+import api.main as api_main
+from api.main import _ndjson_queries, _query_of
+from shlrec.recommender import Recommender
+
+
+class ChunkedRequest:
+    """Just enough of starlette's Request for _ndjson_queries: a body in chunks."""
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+async def _collect(request) -> list:
+    return [q async for q in _ndjson_queries(request)]
+
+
+def test_ndjson_lines_split_across_chunks():
+    body = b'"java developer"\n{"query": "sales lead"}\n\n  \n"analyst'
+    request = ChunkedRequest(body[:5], body[5:23], body[23:], b' with sql"')
+    assert asyncio.run(_collect(request)) == ["java developer", "sales lead", "analyst with sql"]
+
+
+def test_ndjson_crlf_and_trailing_newline():
+    request = ChunkedRequest(b'"a"\r\n{"query": "b"}\r\n')
+    assert asyncio.run(_collect(request)) == ["a", "b"]
+
+
+def test_ndjson_malformed_line():
+    request = ChunkedRequest(b'"ok"\n{not json}\n"never read"\n')
+
+    async def main():
+        seen = []
+        with pytest.raises(json.JSONDecodeError):
+            async for q in _ndjson_queries(request):
+                seen.append(q)
+        return seen
+
+    assert asyncio.run(main()) == ["ok"]
+
+
+@pytest.mark.parametrize("entry", [42, {"q": "x"}, {"query": 1}, None])
+def test_query_of_rejects(entry):
+    with pytest.raises(ValueError):
+        _query_of(entry)
+
+
+@pytest.fixture
+def api(monkeypatch, index_dir, settings):
+    """The app over the conftest index, with load state reset and the warm-up gated by
+    `api.release` (set it to let the startup load finish)."""
+    s = settings(index_dir=index_dir, top_k=5, api_batch_size=2)
+    monkeypatch.setattr(api_main, "get_settings", lambda: s)
+    monkeypatch.setattr(api_main, "Recommender", partial(Recommender, embedding_model="fake"))
+    for name, value in (("_recommender", None), ("_ready", False), ("_load_error", None), ("_load_seconds", None)):
+        monkeypatch.setattr(api_main, name, value)
+
+    release = threading.Event()
+    load = api_main.load_recommender
+
+    def gated_load():
+        release.wait(10)
+        load()
+
+    monkeypatch.setattr(api_main, "load_recommender", gated_load)
+    with TestClient(api_main.app) as client:
+        client.release = release
+        yield client
+        release.set()
+
+
+def _wait_ready(client, timeout_s=10.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        r = client.get("/ready")
+        if r.status_code == 200:
+            return r
+        time.sleep(0.02)
+    raise AssertionError(f"not ready: {r.json()}")
+
+
+def _assert_assessments(items, k=5):
+    assert 0 < len(items) <= k
+    for it in items:
+        assert isinstance(it["name"], str) and it["url"].startswith("https://")
+        assert isinstance(it["test_type"], list)
+
+
+def test_ready_after_warm_up(api):
+    r = api.get("/ready")
+    assert r.status_code == 503 and r.json()["status"] == "loading"
+    assert api.post("/recommend", json={"query": "java developer"}).status_code == 503
+    assert api.get("/health").json() == {"status": "healthy", "ready": False, "load_error": None}
+
+    api.release.set()
+    body = _wait_ready(api).json()
+    assert body["status"] == "ready" and body["load_seconds"] > 0
+    assert api.get("/health").json()["ready"] is True
+    # The warm-up query went through every stage
+    assert api_main._recommender._idx is not None
+
+
+def test_ready_reports_a_failed_load(api, monkeypatch, tmp_path):
+    monkeypatch.setattr(api_main, "_index_dir", lambda: tmp_path / "missing")
+    api.release.set()
+    deadline = time.monotonic() + 10
+    while api_main._load_error is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    r = api.get("/ready")
+    assert r.status_code == 503 and r.json()["status"] == "failed"
+    assert api.post("/recommend", json={"query": "java developer"}).status_code == 503
+
+
+def test_recommend(api):
+    api.release.set()
+    _wait_ready(api)
+    r = api.post("/recommend", json={"query": "java developer who works with stakeholders"})
+    assert r.status_code == 200
+    assert list(r.json()) == ["recommended_assessments"]
+    _assert_assessments(r.json()["recommended_assessments"])
+    assert api.post("/recommend", json={}).status_code == 422
+
+
+def test_metrics(api):
+    api.release.set()
+    _wait_ready(api)
+    api.post("/recommend", json={"query": "sales manager"})
+    r = api.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    assert 'shlrec_stage_seconds_count{stage="api_recommend"}' in text
+    assert "# TYPE shlrec_events_total counter" in text
+    assert 'shlrec_cache_hits_total{cache="result_cache"}' in text
+
+
+def _rows(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_recommend_batch_json(api):
+    api.release.set()
+    _wait_ready(api)
+    queries = ["java developer", "sales manager", "numerical reasoning"]
+    r = api.post("/recommend/batch", json={"queries": queries})
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+    rows = sorted(_rows(r), key=lambda row: row["index"])
+    assert [(row["index"], row["query"]) for row in rows] == list(enumerate(queries))
+    for row in rows:
+        _assert_assessments(row["recommended_assessments"])
+    single = api.post("/recommend", json={"query": "sales manager"}).json()["recommended_assessments"]
+    assert rows[1]["recommended_assessments"] == single
+
+    assert api.post("/recommend/batch", json={"queries": "java"}).status_code == 400
+    assert api.post("/recommend/batch", json=[1, 2]).status_code == 400
+
+
+def test_recommend_batch_ndjson(api):
+    api.release.set()
+    _wait_ready(api)
+    body = '"java developer"\n{"query": "sales manager"}\n{not json}\n"never read"\n'
+    r = api.post("/recommend/batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert r.status_code == 200
+    rows = _rows(r)
+    ok = sorted((row for row in rows if "recommended_assessments" in row), key=lambda row: row["index"])
+    assert [(row["index"], row["query"]) for row in ok] == [(0, "java developer"), (1, "sales manager")]
+    errors = [row for row in rows if "error" in row]
+    assert len(errors) == 1 and errors[0]["index"] == 2 and errors[0]["error"].startswith("invalid input")
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from shlrec.bm25 import SparseBM25
+from shlrec.index_bundle import BUNDLE_FILENAME, IndexBundle
+from shlrec.indexer import _tokenize, corpus_text
+
+# Reference implementation; no longer a runtime dependency
+BM25Okapi = pytest.importorskip("rank_bm25").BM25Okapi
+
+QUERIES = [
+    "java developer",
+    "personality questionnaire for sales managers",
+    "java java java developer",        # repeated terms count once per occurrence
+    "zzqx unknownterm",                 # out of vocabulary only
+    "verbal zzqx reasoning reasoning",  # OOV mixed with repeats
+    "",
+]
+
+
+@pytest.fixture
+def corpus(catalog_items):
+    return [_tokenize(corpus_text(it)) for it in catalog_items]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_bm25okapi(corpus, query):
+    tokens = _tokenize(query)
+    expected = BM25Okapi(corpus).get_scores(tokens)
+    np.testing.assert_allclose(SparseBM25.from_corpus_tokens(corpus).get_scores(tokens), expected, rtol=1e-9, atol=1e-12)
+
+
+def test_bundle_and_npz_match_bm25okapi(tmp_path, corpus, index_dir):
+    okapi = BM25Okapi(corpus)
+    bundled = IndexBundle.open(index_dir / BUNDLE_FILENAME).bm25()
+    path = tmp_path / "bm25.npz"
+    SparseBM25.from_corpus_tokens(corpus).save(path)
+    loaded = SparseBM25.load(path)
+    for query in QUERIES:
+        tokens = _tokenize(query)
+        expected = okapi.get_scores(tokens)
+        # The bundle's index is built from postings by the streaming pipeline
+        np.testing.assert_allclose(bundled.get_scores(tokens), expected, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(loaded.get_scores(tokens), expected, rtol=1e-9, atol=1e-12)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from shlrec.bm25 import SparseBM25
+from shlrec.build_pipeline import build_streaming
+from shlrec.embedding_cache import EmbeddingCache
+from shlrec.index_bundle import BUNDLE_FILENAME, IndexBundle
+from shlrec.indexer import _tokenize, corpus_text
+
+from conftest import FakeEncoder, write_catalog
+
+
+def _terms(bm25):
+    terms = np.asarray(bm25.terms)
+    return np.char.decode(terms, "utf-8") if terms.dtype.kind == "S" else terms
+
+
+def _assert_matches_in_process(bundle: IndexBundle, items):
+    """Compare a streamed bundle with the index built in one go from the same items."""
+    texts = [corpus_text(it) for it in items]
+    assert list(bundle.meta()) == items
+
+    expected = SparseBM25.from_corpus_tokens([_tokenize(t) for t in texts])
+    got = bundle.bm25()
+    np.testing.assert_array_equal(_terms(got), _terms(expected))
+    np.testing.assert_array_equal(got.indptr, expected.indptr)
+    np.testing.assert_array_equal(got.doc_ids, expected.doc_ids)
+    np.testing.assert_allclose(got.weights, expected.weights, rtol=1e-12)
+
+    np.testing.assert_array_equal(bundle.section("embeddings.float32"), FakeEncoder().encode(texts))
+
+
+@pytest.mark.parametrize("chunk_size", [4096, 7, 1])
+def test_matches_in_process_build(tmp_path, fake_encoder, catalog_items, chunk_size):
+    catalog = write_catalog(tmp_path / "catalog.jsonl", catalog_items)
+    stats = build_streaming(catalog, tmp_path / "index", "fake", workers=1, chunk_size=chunk_size, progress=False)
+
+    assert stats["n_docs"] == stats["encoded"] == len(catalog_items)
+    assert fake_encoder.calls == -(-len(catalog_items) // chunk_size)
+    _assert_matches_in_process(IndexBundle.open(tmp_path / "index" / BUNDLE_FILENAME), catalog_items)
+    assert not list((tmp_path / "index").glob(".*.vectors"))
+
+
+def test_embedding_cache_fully_hit(tmp_path, fake_encoder, catalog_items):
+    catalog = write_catalog(tmp_path / "catalog.jsonl", catalog_items)
+    cache = EmbeddingCache(tmp_path / "embedding_cache.sqlite")
+    try:
+        build_streaming(catalog, tmp_path / "first", "fake", embedding_cache=cache, chunk_size=16, progress=False)
+        calls = fake_encoder.calls
+        # Every chunk is served from the cache, so dim is only known from the cached rows
+        stats = build_streaming(catalog, tmp_path / "second", "fake", embedding_cache=cache, chunk_size=7, progress=False)
+        assert stats["encoded"] == 0 and fake_encoder.calls == calls
+        assert cache.hits == len(catalog_items)
+    finally:
+        cache.close()
+    _assert_matches_in_process(IndexBundle.open(tmp_path / "second" / BUNDLE_FILENAME), catalog_items)
+
+
+def test_partial_cache_hits_keep_row_order(tmp_path, fake_encoder, catalog_items):
+    cache = EmbeddingCache(tmp_path / "embedding_cache.sqlite")
+    try:
+        # Warm the cache with every other item only
+        build_streaming(write_catalog(tmp_path / "half.jsonl", catalog_items[::2]), tmp_path / "half", "fake",
+                        embedding_cache=cache, progress=False)
+        stats = build_streaming(write_catalog(tmp_path / "catalog.jsonl", catalog_items), tmp_path / "index", "fake",
+                                embedding_cache=cache, chunk_size=5, progress=False)
+        assert stats["encoded"] == len(catalog_items[1::2])
+    finally:
+        cache.close()
+    _assert_matches_in_process(IndexBundle.open(tmp_path / "index" / BUNDLE_FILENAME), catalog_items)
+
+
+def test_empty_catalog(tmp_path, fake_encoder):
+    with pytest.raises(ValueError, match="No catalog items"):
+        build_streaming(write_catalog(tmp_path / "catalog.jsonl", []), tmp_path / "index", "fake", progress=False)
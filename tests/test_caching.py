@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from shlrec.caching import LRUCache, RerankScoreCache, SingleFlight
+from shlrec.telemetry import REGISTRY
+
+
+def _counter(name: str) -> int:
+    return REGISTRY.snapshot()["counters"].get(name, 0)
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight = SingleFlight("test_sf")
+    calls = []
+    started = threading.Event()
+
+    def work():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "value"
+
+    coalesced = _counter("test_sf_coalesced")
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+
+    assert results == ["value"] * 6
+    assert len(calls) == 1
+    assert _counter("test_sf_coalesced") - coalesced == 5
+    assert flight.in_flight() == 0
+    # Nothing is remembered once the call is done
+    assert flight.do("k", lambda: "again") == "again"
+
+
+def test_single_flight_propagates_errors():
+    flight = SingleFlight("test_sf_err")
+    started = threading.Event()
+    errors = []
+
+    def work():
+        started.set()
+        time.sleep(0.1)
+        raise KeyError("boom")
+
+    def call():
+        try:
+            flight.do("k", work)
+        except KeyError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2 and all(str(e) == "'boom'" for e in errors)
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_async():
+    flight = SingleFlight("test_sf_async")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError("bad")
+
+    async def main():
+        ok = await asyncio.gather(*(flight.ado("a", work) for _ in range(4)))
+        bad = await asyncio.gather(*(flight.ado("b", failing) for _ in range(3)), return_exceptions=True)
+        return ok, bad
+
+    ok, bad = asyncio.run(main())
+    assert ok == [1, 1, 1, 1]
+    assert all(isinstance(e, ValueError) for e in bad)
+
+
+def test_single_flight_async_caller_timeout_keeps_work_running():
+    flight = SingleFlight("test_sf_timeout")
+    done = []
+
+    async def work():
+        await asyncio.sleep(0.1)
+        done.append(1)
+        return "late"
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flight.ado("k", work), 0.01)
+        # A second caller joins the flight that is still running
+        return await flight.ado("k", work)
+
+    assert asyncio.run(main()) == "late"
+    assert done == [1]
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_rerank_score_cache_normalizes_query():
+    cache = RerankScoreCache(None, version="v1")
+    item = {"url": "https://www.shl.com/solutions/products/product-catalog/view/x/", "name": "X"}
+    key = RerankScoreCache.item_key(item)
+    cache.put_many("Java  Developer ", {key: 0.75})
+    assert cache.get_many("java developer", [key, "other"]) == {key: 0.75}
+    assert RerankScoreCache(None, version="v2").get_many("java developer", [key]) == {}
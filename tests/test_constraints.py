@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import numpy as np
+
+from shlrec.catalog_columns import CatalogColumns
+from shlrec.constraints import ConstraintSet
+from shlrec.llm_gemini import Intent
+from shlrec.retrieval import apply_constraints
+
+
+def _intent(duration=None, remote=None) -> Intent:
+    return Intent(
+        hard_skills=[],
+        soft_skills=[],
+        roles=[],
+        seniority="unknown",
+        duration_limit_minutes=duration,
+        remote_required=remote,
+        domain_mix={"K": 0.5, "P": 0.5},
+    )
+
+
+def _columns(durations, remote):
+    meta = [
+        {"name": f"t{i}", "url": f"https://www.shl.com/products/product-catalog/view/t{i}/",
+         "duration": d, "remote_support": "Yes" if r else "No", "test_type": ["K"]}
+        for i, (d, r) in enumerate(zip(durations, remote))
+    ]
+    return CatalogColumns.from_meta(meta)
+
+
+COLS = _columns([10, 20, 30, 45, 60, 0, 25, 15], [True, False, True, True, False, True, True, True])
+
+
+def test_no_constraints():
+    cs = ConstraintSet.from_intent(_intent(), COLS)
+    assert not cs
+    assert cs.mask().all()
+
+
+def test_duration_limit():
+    cs = ConstraintSet.from_intent(_intent(duration=30), COLS, min_results=1)
+    # Unknown durations (0) do not pass a limit
+    np.testing.assert_array_equal(cs.mask(), [1, 1, 1, 0, 0, 0, 1, 1])
+
+
+def test_duration_limit_off_bucket():
+    cs = ConstraintSet.from_intent(_intent(duration=22), COLS, min_results=1)
+    np.testing.assert_array_equal(cs.mask(), [1, 1, 0, 0, 0, 0, 0, 1])
+
+
+def test_duration_and_remote():
+    cs = ConstraintSet.from_intent(_intent(duration=30, remote=True), COLS, min_results=1)
+    np.testing.assert_array_equal(cs.mask(), [1, 0, 1, 0, 0, 0, 1, 1])
+
+
+def test_relaxes_a_constraint_leaving_too_few():
+    # duration <= 10 keeps a single document: dropped, the remote filter still applies
+    cs = ConstraintSet.from_intent(_intent(duration=10, remote=True), COLS, min_results=2)
+    np.testing.assert_array_equal(cs.mask(), [1, 0, 1, 1, 0, 1, 1, 1])
+
+
+def test_min_results_counts_available_docs_only():
+    available = np.array([0, 0, 0, 1, 1, 1, 1, 0], dtype=bool)
+    cs = ConstraintSet.from_intent(_intent(duration=30), COLS, min_results=2)
+    # Of the scored docs only #6 meets the limit: the constraint is relaxed
+    np.testing.assert_array_equal(cs.mask(available), available)
+
+
+def test_apply_constraints_per_row():
+    scores = np.ones((2, COLS.n_docs), dtype=np.float32)
+    scores[1, 0] = -np.inf
+    cs = ConstraintSet.from_intent(_intent(remote=True), COLS, min_results=1)
+    apply_constraints(scores, [cs, None])
+    assert np.isneginf(scores[0, [1, 4]]).all() and np.isfinite(np.delete(scores[0], [1, 4])).all()
+    assert np.isneginf(scores[1, 0]) and np.isfinite(scores[1, 1:]).all()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import dataclasses
+
+import numpy as np
+import pytest
+
+from shlrec.cross_encoder_reranker import CrossEncoderReranker
+from shlrec.settings import Settings
+
+
+class Tokenizer:
+    def __init__(self, do_lower_case):
+        self.do_lower_case = do_lower_case
+
+
+class FakeCrossEncoder:
+    def __init__(self, do_lower_case=True):
+        self.pairs = []
+        self.tokenizer = Tokenizer(do_lower_case)
+
+    def predict(self, pairs, **kwargs):
+        self.pairs.extend(pairs)
+        return np.array([len(q) / (len(q) + len(t)) for q, t in pairs])
+
+
+def _items(n):
+    return [
+        {"name": f"Test {i}", "url": f"https://www.shl.com/products/product-catalog/view/test-{i}/", "_score": 0.1 * i}
+        for i in range(n)
+    ]
+
+
+def test_scores_the_query_the_cache_is_keyed_on():
+    model = FakeCrossEncoder()
+    rr = CrossEncoderReranker(dataclasses.replace(Settings(), cross_encoder_max_candidates=0), model=model)
+    first = rr.score("  Java   DEVELOPER ", _items(3))
+    assert {q for q, _ in model.pairs} == {"java developer"}
+
+    model.pairs.clear()
+    np.testing.assert_array_equal(rr.score("java developer", _items(3)), first)
+    assert model.pairs == []
+
+
+def test_cased_model_sees_the_original_case():
+    model = FakeCrossEncoder(do_lower_case=False)
+    rr = CrossEncoderReranker(dataclasses.replace(Settings(), cross_encoder_max_candidates=0), model=model)
+    rr.score("  Java   DEVELOPER ", _items(2))
+    assert {q for q, _ in model.pairs} == {"Java DEVELOPER"}
+
+    model.pairs.clear()
+    rr.score("Java DEVELOPER", _items(2))
+    assert model.pairs == []
+    rr.score("java developer", _items(2))
+    assert {q for q, _ in model.pairs} == {"java developer"}
+
+
+def test_rerank_window_and_blend():
+    rr = CrossEncoderReranker(dataclasses.replace(Settings(), cross_encoder_max_candidates=2), model=FakeCrossEncoder())
+    out = {c["name"]: c for c in rr.rerank("query", _items(4), top_k=4)}
+    assert out["Test 3"]["_llm_score"] == 0.5
+    assert out["Test 3"]["_score"] == 0.5 * 0.3 + 0.5 * 0.5
+    assert 0 < out["Test 0"]["_llm_score"] < 1
+
+
+class LogitCrossEncoder:
+    """Returns queued raw outputs, one array per predict() call."""
+
+    def __init__(self, *outputs, activation=None):
+        self.outputs = list(outputs)
+        if activation is not None:
+            self.activation_fn = activation
+
+    def predict(self, pairs, **kwargs):
+        out = np.asarray(self.outputs.pop(0), dtype=np.float64)
+        assert len(out) == len(pairs)
+        return out
+
+
+class Sigmoid:
+    pass
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-np.asarray(x, dtype=np.float64)))
+
+
+def test_logits_are_squashed_on_every_batch():
+    # The first batch happens to fall inside 0..1, the second does not: both are logits
+    model = LogitCrossEncoder([0.7], [-2.0, 3.0])
+    rr = CrossEncoderReranker(dataclasses.replace(Settings(), cross_encoder_max_candidates=0), model=model)
+    items = _items(3)
+    np.testing.assert_allclose(rr.score("q", items[:1]), _sigmoid([0.7]))
+    np.testing.assert_allclose(rr.score("q", items), _sigmoid([0.7, -2.0, 3.0]))
+
+
+def test_sigmoid_head_outputs_are_kept():
+    model = LogitCrossEncoder([0.7], [0.2, 0.9], activation=Sigmoid())
+    rr = CrossEncoderReranker(dataclasses.replace(Settings(), cross_encoder_max_candidates=0), model=model)
+    items = _items(3)
+    np.testing.assert_allclose(rr.score("q", items[:1]), [0.7])
+    np.testing.assert_allclose(rr.score("q", items), [0.7, 0.2, 0.9])
+
+
+def test_output_setting_overrides_the_model():
+    settings = dataclasses.replace(Settings(), cross_encoder_output="logit")
+    rr = CrossEncoderReranker(settings, model=LogitCrossEncoder([0.7], activation=Sigmoid()))
+    np.testing.assert_allclose(rr.score("q", _items(1)), _sigmoid([0.7]))
+    with pytest.raises(ValueError, match="CROSS_ENCODER_OUTPUT"):
+        CrossEncoderReranker(dataclasses.replace(Settings(), cross_encoder_output="softmax"))
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+from shlrec.embedding_cache import EmbeddingCache, text_sha1
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = EmbeddingCache(tmp_path / "embedding_cache.sqlite")
+    yield c
+    c.close()
+
+
+def _encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), 1.0, 0.5] for t in texts], dtype=np.float32)
+
+    return encode
+
+
+def test_write_through_and_hit_miss_counts(tmp_path, cache):
+    calls = []
+    first = cache.encode("m", ["a", "bb", "a"], _encoder(calls))
+    # Duplicate misses are encoded once
+    assert calls == [["a", "bb"]]
+    assert first.shape == (3, 3) and first[0, 0] == 1 and first[1, 0] == 2
+    np.testing.assert_array_equal(first[0], first[2])
+    assert cache.stats() == {"hits": 0, "misses": 3, "hit_rate": 0.0}
+
+    second = cache.encode("m", ["bb", "ccc"], _encoder(calls))
+    assert calls[-1] == ["ccc"]
+    np.testing.assert_array_equal(second[0], first[1])
+    assert cache.hits == 1 and cache.misses == 4
+
+    # Written through to disk: a fresh connection sees every vector
+    other = EmbeddingCache(tmp_path / "embedding_cache.sqlite")
+    try:
+        found = other.get_many("m", [text_sha1(t) for t in ("a", "bb", "ccc", "dddd")])
+        assert set(found) == {text_sha1("a"), text_sha1("bb"), text_sha1("ccc")}
+        assert other.get_many("other-model", [text_sha1("a")]) == {}
+    finally:
+        other.close()
+
+
+def test_evict_model(cache):
+    cache.encode("m1", ["a", "b"], _encoder([]))
+    cache.encode("m2", ["a"], _encoder([]))
+    assert cache.models() == {"m1": 2, "m2": 1}
+    assert cache.evict_model("m1") == 2
+    assert cache.models() == {"m2": 1}
+    calls = []
+    cache.encode("m1", ["a"], _encoder(calls))
+    assert calls == [["a"]]
+
+
+def test_failed_put_rolls_back(cache):
+    vectors = np.ones((2, 3), dtype=np.float32)
+    with pytest.raises(sqlite3.Error):
+        # The second key cannot be bound: the batch fails after its first row
+        cache.put_many("m", [text_sha1("a"), object()], vectors)
+    assert not cache._conn.in_transaction
+    assert cache.get_many("m", [text_sha1("a")]) == {}
+
+    cache.put_many("m", [text_sha1("a")], vectors[:1])
+    assert set(cache.get_many("m", [text_sha1("a")])) == {text_sha1("a")}
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from shlrec.embedding_store import EmbeddingStore, quantize_int8, save_embeddings
+
+
+def _unit_rows(n=200, dim=32, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+EMB = _unit_rows()
+Q = _unit_rows(3, seed=1).T  # (dim, Q)
+
+
+def _stores(exact=None):
+    q, scales = quantize_int8(EMB)
+    return {
+        "float16": EmbeddingStore(EMB.astype(np.float16), exact=exact),
+        "int8": EmbeddingStore(q, scales=scales, exact=exact),
+    }
+
+
+@pytest.mark.parametrize("dtype, tol", [("float16", 1e-3), ("int8", 2e-2)])
+def test_quantized_scores_match_float32(dtype, tol):
+    store = _stores()[dtype]
+    truth = EMB @ Q
+    assert store.is_quantized
+    np.testing.assert_allclose(store @ Q, truth, atol=tol)
+    np.testing.assert_allclose(store @ Q[:, 0], truth[:, 0], atol=tol)
+    ids = np.array([5, 0, 199, 42])
+    np.testing.assert_allclose(store[ids], EMB[ids], atol=tol)
+    # Without an exact copy the rescore dequantizes the stored rows
+    np.testing.assert_allclose(store.exact_scores(ids, Q[:, 0]), truth[ids, 0], atol=tol)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_exact_scores_use_the_float32_copy(dtype):
+    store = _stores(exact=EMB)[dtype]
+    ids = np.array([7, 3, 150])
+    np.testing.assert_allclose(store.exact_scores(ids, Q[:, 1]), (EMB @ Q)[ids, 1], rtol=1e-6)
+    np.testing.assert_array_equal(store.exact_rows(ids), EMB[ids])
+
+
+def test_quantize_int8_zero_row():
+    q, scales = quantize_int8(np.zeros((2, 4), dtype=np.float32))
+    assert not q.any() and (scales == 1.0).all()
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_save_and_open(tmp_path, dtype):
+    save_embeddings(tmp_path, EMB, dtype=dtype)
+    store = EmbeddingStore.open(tmp_path, dtype=dtype)
+    assert store.shape == EMB.shape and store.is_quantized == (dtype != "float32")
+    np.testing.assert_allclose(store @ Q, EMB @ Q, atol=2e-2)
+    np.testing.assert_array_equal(store.exact_rows([1, 2]), EMB[[1, 2]])
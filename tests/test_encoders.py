@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from shlrec.encoders import MicroBatchEncoder
+
+from conftest import FakeEncoder
+
+
+class SlowEncoder(FakeEncoder):
+    def __init__(self, delay_s: float = 0.0):
+        super().__init__()
+        self.delay_s = delay_s
+        self.batches = []
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        self.batches.append(list(texts))
+        time.sleep(self.delay_s)
+        return super().encode(texts, normalize_embeddings=normalize_embeddings)
+
+
+def _concurrently(fn, n):
+    results, errors = [None] * n, []
+
+    def run(i):
+        try:
+            results[i] = fn(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_passes():
+    inner = SlowEncoder(delay_s=0.02)
+    enc = MicroBatchEncoder(inner, max_batch=64, max_wait_ms=5)
+    results, errors = _concurrently(lambda i: enc.encode([f"q{i}"]), 16)
+    enc.close()
+
+    assert not errors
+    for i, emb in enumerate(results):
+        np.testing.assert_allclose(emb, FakeEncoder().encode([f"q{i}"]))
+    assert len(inner.batches) < 16
+    assert sorted(t for b in inner.batches for t in b) == sorted(f"q{i}" for i in range(16))
+
+
+def test_encoder_errors_reach_every_caller():
+    class Broken(SlowEncoder):
+        def encode(self, texts, normalize_embeddings=True, **kwargs):
+            time.sleep(0.01)
+            raise RuntimeError("encoder failed")
+
+    enc = MicroBatchEncoder(Broken(), max_batch=64)
+    _, errors = _concurrently(lambda i: enc.encode([f"q{i}"]), 8)
+    enc.close()
+    assert len(errors) == 8 and all(str(e) == "encoder failed" for e in errors)
+
+
+def test_timeout_falls_back_to_a_direct_encode():
+    inner = SlowEncoder()
+    enc = MicroBatchEncoder(inner, timeout_s=0.05)
+    # Worker stuck: nothing is taken off the queue
+    gate = threading.Event()
+    enc._serve = lambda batch: gate.wait()
+    t0 = time.perf_counter()
+    emb = enc.encode(["hello"])
+    assert time.perf_counter() - t0 < 1
+    np.testing.assert_allclose(emb, FakeEncoder().encode(["hello"]))
+    assert inner.batches == [["hello"]]
+    gate.set()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_worker_fails_pending_calls_and_restarts():
+    inner = SlowEncoder()
+    enc = MicroBatchEncoder(inner, timeout_s=5)
+    serve = enc._serve
+
+    def crash(batch):
+        batch.append(enc._queue.get())
+        raise SystemExit("worker killed")
+
+    enc._serve = crash
+    with pytest.raises(SystemExit):
+        enc.encode(["a"])
+    enc._worker.join()
+
+    enc._serve = serve
+    np.testing.assert_allclose(enc.encode(["b"]), FakeEncoder().encode(["b"]))
+    enc.close()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from shlrec.index_bundle import BUNDLE_FILENAME, IndexBundle, IndexFormatError, catalog_sha1, write_bundle
+
+
+def _rewrite(src: IndexBundle, path, tombstones=None, embedding_dtype="float32"):
+    return write_bundle(
+        path,
+        list(src.meta()),
+        src.bm25(),
+        src.columns(),
+        np.array(src.section("embeddings.float32")),
+        embedding_model=src.manifest["embedding_model"],
+        embedding_dtype=embedding_dtype,
+        tombstones=tombstones,
+    )
+
+
+def test_round_trip_with_tombstones(tmp_path, index_dir, catalog_items):
+    src = IndexBundle.open(index_dir / BUNDLE_FILENAME)
+    n = src.n_docs
+    dead = np.zeros(n, dtype=bool)
+    dead[[2, 5]] = True
+    path = tmp_path / "copy.shlidx"
+    manifest = _rewrite(src, path, tombstones=dead, embedding_dtype="int8")
+
+    out = IndexBundle.open(path, embedding_model="fake", verify=True)
+    assert out.n_docs == n
+    assert list(out.meta()) == list(src.meta())
+    np.testing.assert_array_equal(out.tombstones(), dead)
+    np.testing.assert_array_equal(out.section("embeddings.float32"), src.section("embeddings.float32"))
+    np.testing.assert_array_equal(out.columns().duration, src.columns().duration)
+    np.testing.assert_array_equal(out.bm25().doc_ids, src.bm25().doc_ids)
+    assert out.embedding_dtype() == "int8"
+    assert out.embeddings("int8").is_quantized
+    # The catalog hash covers live items only
+    live = [it for it, d in zip(catalog_items, dead) if not d]
+    assert manifest["catalog_sha1"] == catalog_sha1(live)
+    IndexBundle.open(path, catalog_sha1=catalog_sha1(live))
+
+
+def test_no_tombstones_section_when_none_removed(tmp_path, index_dir):
+    src = IndexBundle.open(index_dir / BUNDLE_FILENAME)
+    path = tmp_path / "copy.shlidx"
+    _rewrite(src, path, tombstones=np.zeros(src.n_docs, dtype=bool))
+    assert IndexBundle.open(path).tombstones() is None
+
+
+def test_rejects_other_embedding_model(index_dir):
+    with pytest.raises(IndexFormatError, match="built with 'fake'"):
+        IndexBundle.open(index_dir / BUNDLE_FILENAME, embedding_model="other-model")
+
+
+def test_rejects_stale_catalog(index_dir, catalog_items):
+    with pytest.raises(IndexFormatError, match="stale"):
+        IndexBundle.open(index_dir / BUNDLE_FILENAME, catalog_sha1=catalog_sha1(catalog_items[1:]))
+
+
+def test_rejects_bad_magic(tmp_path):
+    path = tmp_path / BUNDLE_FILENAME
+    path.write_bytes(b"\0" * 4096)
+    with pytest.raises(IndexFormatError, match="not an index bundle"):
+        IndexBundle.open(path)
+
+
+def test_rejects_truncated_file(tmp_path, index_dir):
+    data = (index_dir / BUNDLE_FILENAME).read_bytes()
+    path = tmp_path / BUNDLE_FILENAME
+    path.write_bytes(data[:-16])
+    with pytest.raises(IndexFormatError, match="truncated"):
+        IndexBundle.open(path)
+
+
+def test_detects_corrupt_section(tmp_path, index_dir):
+    src = IndexBundle.open(index_dir / BUNDLE_FILENAME)
+    entry = src.manifest["sections"]["embeddings.float32"]
+    data = bytearray((index_dir / BUNDLE_FILENAME).read_bytes())
+    data[len(data) - src.manifest["data_nbytes"] + entry["offset"] + 3] ^= 0xFF
+    path = tmp_path / BUNDLE_FILENAME
+    path.write_bytes(bytes(data))
+
+    # Only checked when asked for (INDEX_VERIFY_CHECKSUMS)
+    IndexBundle.open(path).section("embeddings.float32")
+    with pytest.raises(IndexFormatError, match="checksum mismatch in section 'embeddings.float32'"):
+        IndexBundle.open(path, verify=True).section("embeddings.float32")
+
+
+def test_corrupt_manifest(tmp_path, index_dir):
+    data = bytearray((index_dir / BUNDLE_FILENAME).read_bytes())
+    data[40] ^= 0xFF
+    path = tmp_path / BUNDLE_FILENAME
+    path.write_bytes(bytes(data))
+    with pytest.raises(IndexFormatError, match="manifest checksum mismatch"):
+        IndexBundle.open(path)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pytest
+
+from shlrec import index_bundle
+from shlrec.index_bundle import BUNDLE_FILENAME, CATALOG_STAMP_FILENAME, IndexBundle, IndexFormatError
+from shlrec.indexer import build_ann, update_index
+from shlrec.retrieval import hybrid_retrieve, load_index
+from shlrec.utils import canonical_shl_url
+
+from conftest import write_catalog
+
+
+def _urls(idx, hits):
+    return {canonical_shl_url(idx.meta[i]["url"]) for i, _ in hits}
+
+
+def test_build_ann_keeps_tombstones(tmp_path, index_dir, catalog_items):
+    removed = catalog_items[3]
+    catalog = write_catalog(tmp_path / "catalog.jsonl", catalog_items[:3] + catalog_items[4:])
+    stats = update_index(catalog, index_dir, embedding_model="fake", compact=False)
+    assert stats["removed"] == 1
+
+    build_ann(index_dir, nlist=4)
+    bundle = IndexBundle.open(index_dir / BUNDLE_FILENAME)
+    dead = bundle.tombstones()
+    assert dead is not None and dead.sum() == 1
+    assert not np.isin(np.flatnonzero(dead), bundle.ivf().list_ids).any()
+
+    idx = load_index(index_dir, embedding_model="fake", query_cache_size=0, use_ann=True, ann_nprobe=4)
+    hits = hybrid_retrieve(idx, removed["name"], top_n=len(catalog_items))
+    assert hits
+    assert canonical_shl_url(removed["url"]) not in _urls(idx, hits)
+
+
+def test_update_reencodes_only_changed_items(tmp_path, index_dir, catalog_items, fake_encoder):
+    items = [dict(it) for it in catalog_items]
+    items[0]["description"] = "Entirely new wording for this assessment."
+    items[1]["raw_test_type"] = "K P"  # not part of the indexed text
+    items.append(dict(catalog_items[0], name="Brand New Test", url="https://www.shl.com/products/product-catalog/view/brand-new-test/"))
+    calls = fake_encoder.calls
+    stats = update_index(write_catalog(tmp_path / "catalog.jsonl", items), index_dir, embedding_model="fake")
+
+    assert stats["added"] == 1 and stats["changed"] == 2 and stats["reencoded"] == 1
+    assert stats["unchanged"] == len(catalog_items) - 2
+    assert fake_encoder.calls == calls + 1
+    bundle = IndexBundle.open(index_dir / BUNDLE_FILENAME)
+    assert bundle.n_docs == len(items)
+    assert bundle.meta()[1]["raw_test_type"] == "K P"
+
+
+def test_update_compacts_past_the_dead_share(tmp_path, index_dir, catalog_items):
+    keep = catalog_items[: len(catalog_items) // 2]
+    stats = update_index(write_catalog(tmp_path / "catalog.jsonl", keep), index_dir, embedding_model="fake")
+
+    assert stats["compacted"] and stats["tombstones"] == 0
+    bundle = IndexBundle.open(index_dir / BUNDLE_FILENAME)
+    assert bundle.tombstones() is None
+    assert [it["url"] for it in bundle.meta()] == [it["url"] for it in keep]
+    idx = load_index(index_dir, embedding_model="fake", query_cache_size=0)
+    assert len(hybrid_retrieve(idx, "manager", top_n=100)) == len(keep)
+
+
+def test_ivf_recall(index_dir, catalog_items):
+    build_ann(index_dir, nlist=6)
+    exact = load_index(index_dir, embedding_model="fake", query_cache_size=0)
+    ann = load_index(index_dir, embedding_model="fake", query_cache_size=0, use_ann=True, ann_nprobe=3, ann_lexical_candidates=0)
+    recall = []
+    for it in catalog_items[:10]:
+        truth = {i for i, _ in hybrid_retrieve(exact, it["name"], alpha=0.0, top_n=5)}
+        found = {i for i, _ in hybrid_retrieve(ann, it["name"], alpha=0.0, top_n=5)}
+        recall.append(len(truth & found) / len(truth))
+    assert np.mean(recall) >= 0.5
+
+
+def test_load_index_checks_the_catalog(tmp_path, index_dir, catalog_items):
+    catalog = tmp_path / "catalog.jsonl"
+    load_index(index_dir, embedding_model="fake", query_cache_size=0, catalog_jsonl=catalog)
+    # Not checked when the catalog file is absent
+    load_index(index_dir, embedding_model="fake", query_cache_size=0, catalog_jsonl=tmp_path / "missing.jsonl")
+
+    write_catalog(catalog, catalog_items[1:])
+    with pytest.raises(IndexFormatError, match="stale"):
+        load_index(index_dir, embedding_model="fake", query_cache_size=0, catalog_jsonl=catalog)
+    update_index(catalog, index_dir, embedding_model="fake", compact=False)
+    load_index(index_dir, embedding_model="fake", query_cache_size=0, catalog_jsonl=catalog)
+
+
+def test_catalog_hash_is_stamped(tmp_path, index_dir, catalog_items, monkeypatch):
+    catalog = tmp_path / "catalog.jsonl"
+    load_index(index_dir, embedding_model="fake", query_cache_size=0, catalog_jsonl=catalog)
+    assert (index_dir / CATALOG_STAMP_FILENAME).exists()
+
+    hashed = []
+    real = index_bundle.item_sha1
+    monkeypatch.setattr(index_bundle, "item_sha1", lambda item: hashed.append(1) or real(item))
+    load_index(index_dir, embedding_model="fake", query_cache_size=0, catalog_jsonl=catalog)
+    assert not hashed
+
+    # Same content, new mtime: hashed again, and still accepted
+    st = catalog.stat()
+    os.utime(catalog, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    load_index(index_dir, embedding_model="fake", query_cache_size=0, catalog_jsonl=catalog)
+    assert len(hashed) == len(catalog_items)
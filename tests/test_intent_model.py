@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from shlrec.intent_model import (
+    MODEL_FILENAME,
+    IntentModel,
+    LocalIntentExtractor,
+    fit_head,
+    load_intent_extractor,
+    parse_duration_limit,
+)
+from shlrec.llm_gemini import Intent, heuristic_intent
+
+LogisticRegression = pytest.importorskip("sklearn.linear_model").LogisticRegression
+
+
+@pytest.mark.parametrize(
+    "text, minutes",
+    [
+        ("assessment of 30-40 mins", 40),
+        ("between 20 to 25 minutes", 25),
+        ("can take 1.5 hours", 90),
+        ("a 45-minute test", 45),
+        ("no more than 2 hrs", 120),
+        ("about half an hour", 30),
+        ("an hour at most", 60),
+        ("Java developer, 60 MIN", 60),
+        ("java developer", None),
+        ("", None),
+    ],
+)
+def test_parse_duration_limit(text, minutes):
+    assert parse_duration_limit(text) == minutes
+
+
+def _data(n_classes, n=120, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_classes, dim)) * 2
+    y = rng.integers(0, n_classes, n)
+    X = (centers[y] + rng.standard_normal((n, dim))).astype(np.float32)
+    return X, [f"c{i}" for i in y]
+
+
+@pytest.mark.parametrize("n_classes", [2, 3])
+def test_fit_head_matches_logistic_regression(n_classes):
+    X, labels = _data(n_classes)
+    head = fit_head(X, labels)
+    clf = LogisticRegression(C=1.0, max_iter=2000).fit(X, labels)
+    assert head.W.shape == (X.shape[1], n_classes)
+    assert list(head.classes) == list(clf.classes_)
+    # The binary logit split into [-W/2, W/2] gives the same softmax as predict_proba
+    np.testing.assert_allclose(head.proba(X), clf.predict_proba(X), atol=1e-5)
+
+
+def test_fit_head_skips_unlabelled_rows_and_single_class():
+    X, labels = _data(2)
+    labels = [y if i % 3 else None for i, y in enumerate(labels)]
+    rows = [i for i, y in enumerate(labels) if y is not None]
+    clf = LogisticRegression(C=1.0, max_iter=2000).fit(X[rows], [labels[i] for i in rows])
+    np.testing.assert_allclose(fit_head(X, labels).proba(X), clf.predict_proba(X), atol=1e-5)
+    assert fit_head(X, ["a"] * len(X)) is None
+    assert fit_head(X, [None] * len(X)) is None
+
+
+def _model(dim=8):
+    X, _ = _data(2, dim=dim)
+    k_share = ["0.9" if x[0] > 0 else "0.1" for x in X]
+    seniority = ["senior" if x[1] > 0 else "entry" for x in X]
+    remote = ["true" if x[2] > 0 else "false" for x in X]
+    heads = {
+        "domain_mix": fit_head(X, k_share),
+        "seniority": fit_head(X, seniority),
+        "remote": fit_head(X, remote),
+    }
+    return IntentModel(heads=heads, embedding_model="fake", dim=dim)
+
+
+def test_predict():
+    model = _model()
+    x = np.array([5, 5, -5, 0, 0, 0, 0, 0], dtype=np.float32)
+    intent, confidence = model.predict(x, "Senior analyst, 30 minutes")
+    assert intent.domain_mix["K"] > 0.7 and intent.domain_mix["K"] + intent.domain_mix["P"] == pytest.approx(1.0)
+    assert intent.seniority == "senior"
+    assert intent.remote_required is False
+    assert intent.duration_limit_minutes == 30
+    expected = min(float(h.proba(x).max()) for h in model.heads.values())
+    assert confidence == pytest.approx(expected)
+
+    # A remote mention wins over the head, which then does not lower the confidence
+    intent, remote_confidence = model.predict(x, "remote analyst")
+    assert intent.remote_required is True
+    assert remote_confidence >= confidence
+
+
+def test_predict_without_heads():
+    model = IntentModel(heads={}, embedding_model="fake", dim=0)
+    intent, confidence = model.predict(np.zeros(0, dtype=np.float32), "java developer under 40 minutes")
+    assert confidence == 0.0
+    assert intent.domain_mix == heuristic_intent("java developer under 40 minutes").domain_mix
+    assert intent.duration_limit_minutes == 40 and intent.seniority == "unknown"
+
+
+def test_save_load_round_trip(tmp_path):
+    model = _model()
+    model.save(tmp_path / MODEL_FILENAME)
+    loaded = IntentModel.load(tmp_path / MODEL_FILENAME)
+    assert loaded.embedding_model == "fake" and loaded.dim == model.dim
+    x = np.ones(model.dim, dtype=np.float32)
+    for name, head in model.heads.items():
+        assert list(loaded.heads[name].classes) == list(head.classes)
+        np.testing.assert_allclose(loaded.heads[name].proba(x), head.proba(x), rtol=1e-6)
+
+
+class FakeLLM:
+    """GeminiIntentExtractor stand-in that records where lookups run."""
+
+    def __init__(self, cached=None, available=True):
+        self.cached = cached or {}
+        self.client = SimpleNamespace(available=available)
+        self.lookup_threads = []
+        self.calls = []
+
+    def lookup(self, query):
+        self.lookup_threads.append(threading.current_thread())
+        return self.cached.get(query)
+
+    def extract(self, query):
+        self.calls.append(query)
+        return heuristic_intent(query)
+
+    async def aextract(self, query):
+        self.calls.append(query)
+        return heuristic_intent(query)
+
+
+def _encode(texts):
+    return np.array([[5, 5, -5, 0, 0, 0, 0, 0]] * len(texts), dtype=np.float32)
+
+
+def test_load_intent_extractor_modes(tmp_path):
+    llm = FakeLLM()
+    args = dict(encode=_encode, llm=llm, min_confidence=0.6, embedding_model="fake")
+    with pytest.raises(ValueError, match="INTENT_MODE"):
+        load_intent_extractor(tmp_path, "remote", **args)
+
+    # No trained model: hybrid is Gemini, local is rules only
+    assert load_intent_extractor(tmp_path, "gemini", **args) is llm
+    assert load_intent_extractor(tmp_path, "hybrid", **args) is llm
+    local = load_intent_extractor(tmp_path, "local", **args)
+    assert isinstance(local, LocalIntentExtractor) and not local.use_llm and not local.model.heads
+
+    _model().save(tmp_path / MODEL_FILENAME)
+    assert load_intent_extractor(tmp_path, "gemini", **args) is llm
+    hybrid = load_intent_extractor(tmp_path, "hybrid", **args)
+    assert isinstance(hybrid, LocalIntentExtractor) and hybrid.use_llm and set(hybrid.model.heads) == {"domain_mix", "seniority", "remote"}
+    local = load_intent_extractor(tmp_path, "local", **args)
+    assert not local.use_llm and local.model.heads
+
+    with pytest.raises(ValueError, match="trained on 'fake'"):
+        load_intent_extractor(tmp_path, "local", **dict(args, embedding_model="other"))
+
+
+def test_aextract_keeps_blocking_work_off_the_loop():
+    cached = heuristic_intent("cached query")
+    llm = FakeLLM(cached={"cached query": cached})
+    ex = LocalIntentExtractor(_model(), _encode, llm, min_confidence=0.6)
+
+    async def main():
+        loop_thread = threading.current_thread()
+        hit = await ex.aextract("cached query")
+        miss = await ex.aextract("senior analyst")
+        return loop_thread, hit, miss
+
+    loop_thread, hit, miss = asyncio.run(main())
+    assert hit is cached
+    assert isinstance(miss, Intent) and miss.seniority == "senior"
+    assert llm.lookup_threads and all(t is not loop_thread for t in llm.lookup_threads)
+    assert llm.calls == []
+
+
+def test_hybrid_low_confidence_goes_to_gemini():
+    llm = FakeLLM()
+    ex = LocalIntentExtractor(_model(), _encode, llm, min_confidence=1.01)
+    asyncio.run(ex.aextract("a"))
+    ex.extract("b")
+    assert llm.calls == ["a", "b"]
+    # Unless Gemini is down, or in local mode
+    for ex in (
+        LocalIntentExtractor(_model(), _encode, FakeLLM(available=False), min_confidence=1.01),
+        LocalIntentExtractor(_model(), _encode, FakeLLM(), min_confidence=1.01, use_llm=False),
+    ):
+        ex.extract("c")
+        assert ex.llm.calls == []
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+
+import pytest
+
+from shlrec.llm_client import CircuitBreaker, LLMClient, LLMUnavailable
+from shlrec.settings import Settings
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr("shlrec.llm_client.time.monotonic", c)
+    return c
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    br = CircuitBreaker(failures=3, reset_s=10)
+    br.record_failure()
+    br.record_failure()
+    br.record_success()
+    br.record_failure()
+    br.record_failure()
+    assert br.state == "closed" and br.allow()
+    br.record_failure()
+    assert br.state == "open"
+    assert not br.allow()
+
+
+def test_breaker_half_open_trial(clock):
+    br = CircuitBreaker(failures=1, reset_s=10)
+    br.record_failure()
+    clock.now += 9
+    assert br.state == "open" and not br.allow()
+    clock.now += 1
+    assert br.state == "half_open"
+    # One trial call at a time
+    assert br.allow()
+    assert not br.allow()
+    # A failed trial re-opens for another reset period
+    br.record_failure()
+    assert br.state == "open"
+    clock.now += 10
+    assert br.allow()
+    br.record_success()
+    assert br.state == "closed" and br.allow()
+
+
+def test_breaker_trial_that_never_reports_back(clock):
+    br = CircuitBreaker(failures=1, reset_s=10)
+    br.record_failure()
+    clock.now += 10
+    assert br.allow()
+    clock.now += 10
+    assert br.allow()
+
+
+class FlakyBackend:
+    name = "stub"
+
+    def __init__(self, fail: int):
+        self.fail = fail
+        self.calls = 0
+
+    async def generate(self, prompt, temperature, timeout_s):
+        self.calls += 1
+        if self.calls <= self.fail:
+            raise ConnectionError("upstream down")
+        return f"ok:{prompt}"
+
+
+def _settings(**overrides) -> Settings:
+    values = dict(
+        llm_timeout_s=2.0,
+        llm_max_retries=1,
+        llm_retry_backoff_s=0.0,
+        llm_breaker_failures=2,
+        llm_breaker_reset_s=60.0,
+        llm_max_concurrency=4,
+    )
+    values.update(overrides)
+    return dataclasses.replace(Settings(), **values)
+
+
+def test_client_retries_then_succeeds():
+    backend = FlakyBackend(fail=1)
+    client = LLMClient(_settings(), backend=backend)
+    try:
+        assert client.generate("hi") == "ok:hi"
+        assert backend.calls == 2
+        assert client.breaker.state == "closed"
+    finally:
+        client.close()
+
+
+def test_client_opens_circuit_and_stops_calling():
+    backend = FlakyBackend(fail=100)
+    client = LLMClient(_settings(), backend=backend)
+    try:
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                client.generate("hi")
+        assert backend.calls == 4
+        assert client.breaker.state == "open" and not client.available
+        with pytest.raises(LLMUnavailable):
+            client.generate("hi")
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(client.agenerate("hi"))
+        assert backend.calls == 4
+    finally:
+        client.close()
+
+
+def test_client_without_backend_is_unavailable():
+    client = LLMClient(_settings(llm_backend="none"))
+    assert not client.available
+    with pytest.raises(LLMUnavailable):
+        client.generate("hi")
+
+
+
+def test_queue_timeout_does_not_trip_the_breaker():
+    # The first call holds the only slot through a retry, longer than the second may wait
+    backend = FlakyBackend(fail=1)
+    generate = backend.generate
+
+    async def slow_generate(*args):
+        await asyncio.sleep(0.15)
+        return await generate(*args)
+
+    backend.generate = slow_generate
+    client = LLMClient(
+        _settings(llm_timeout_s=0.2, llm_max_retries=1, llm_max_concurrency=1, llm_breaker_failures=1),
+        backend=backend,
+    )
+
+    async def main():
+        first = asyncio.ensure_future(client.agenerate("a"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMUnavailable, match="in flight"):
+            await client.agenerate("b")
+        state = client.breaker.state
+        return state, await first
+
+    try:
+        assert asyncio.run(main()) == ("closed", "ok:a")
+    finally:
+        client.close()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import threading
+
+from shlrec.llm_client import LLMClient
+from shlrec.llm_gemini import GeminiIntentExtractor
+from shlrec.settings import Settings
+
+ANSWER = {
+    "hard_skills": ["java"],
+    "soft_skills": [],
+    "roles": ["developer"],
+    "seniority": "mid",
+    "duration_limit_minutes": 40,
+    "remote_required": None,
+    "domain_mix": {"K": 3, "P": 1},
+}
+
+
+class StubBackend:
+    name = "stub"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, temperature, timeout_s):
+        self.calls += 1
+        return json.dumps(ANSWER)
+
+
+class ThreadRecordingCache:
+    """Wraps the extractor's SQLiteCache and records the thread of every access."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return self.inner.get(key)
+
+    def set(self, key, value):
+        self.threads.append(threading.current_thread())
+        self.inner.set(key, value)
+
+
+def test_aextract_does_cache_io_off_the_loop(tmp_path):
+    settings = dataclasses.replace(Settings(), llm_max_retries=0, llm_retry_backoff_s=0.0)
+    backend = StubBackend()
+    client = LLMClient(settings, backend=backend)
+    try:
+        ex = GeminiIntentExtractor(settings, cache_path=str(tmp_path / "intent.sqlite"), client=client)
+        cache = ex.cache = ThreadRecordingCache(ex.cache)
+
+        async def main():
+            loop_thread = threading.current_thread()
+            miss = await ex.aextract("java developer")
+            hit = await ex.aextract("java developer")
+            return loop_thread, miss, hit
+
+        loop_thread, miss, hit = asyncio.run(main())
+    finally:
+        client.close()
+
+    assert backend.calls == 1
+    assert miss == hit and miss.duration_limit_minutes == 40 and miss.domain_mix == {"K": 0.75, "P": 0.25}
+    # get (miss), set, get (hit)
+    assert len(cache.threads) == 3
+    assert all(t is not loop_thread for t in cache.threads)
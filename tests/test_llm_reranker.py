@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import re
+
+from shlrec.llm_reranker import GeminiReranker
+from shlrec.settings import Settings
+
+
+def _names(prompt: str):
+    candidates = prompt.split("CANDIDATE ASSESSMENTS:")[1].split("For each assessment")[0]
+    return re.findall(r'"name": "([^"]*)"', candidates)
+
+
+class FakeLLM:
+    """Scores each candidate by the number in its name; a chunk holding a "fail" item
+    errors, and "skip" items are left out of the answer."""
+
+    model_id = "fake"
+    available = True
+
+    def __init__(self):
+        self.prompts = []
+
+    def run(self, coro):
+        return asyncio.run(coro)
+
+    async def agenerate(self, prompt, temperature=None):
+        self.prompts.append(prompt)
+        names = _names(prompt)
+        if any("fail" in n for n in names):
+            raise ConnectionError("upstream error")
+        return json.dumps([
+            {"name": n, "relevance_score": int(n.split()[-1]) / 10}
+            for n in names if "skip" not in n
+        ])
+
+
+def _item(name: str, score: float):
+    slug = name.replace(" ", "-")
+    return {"name": name, "url": f"https://www.shl.com/products/product-catalog/view/{slug}/", "_score": score}
+
+
+def _reranker(chunk_size=2):
+    settings = dataclasses.replace(Settings(), gemini_rerank_chunk_size=chunk_size, gemini_rerank_max_candidates=0)
+    return GeminiReranker(settings, cache_path=None, client=FakeLLM())
+
+
+def test_failed_chunk_keeps_retrieval_score_omitted_item_gets_neutral():
+    rr = _reranker()
+    candidates = [_item("a 9", 0.2), _item("skip 1", 0.2), _item("fail 1", 0.8), _item("b 1", 0.1)]
+    out = {c["name"]: c for c in rr.rerank("query", candidates, top_k=10)}
+
+    assert out["a 9"]["_llm_score"] == 0.9 and out["a 9"]["_score"] == 0.5 * 0.2 + 0.5 * 0.9
+    assert out["skip 1"]["_llm_score"] == 0.5 and out["skip 1"]["_score"] == 0.5 * 0.2 + 0.5 * 0.5
+    # The "fail" chunk: both items keep their retrieval score, unscored
+    assert "_llm_score" not in out["fail 1"] and out["fail 1"]["_score"] == 0.8
+    assert "_llm_score" not in out["b 1"] and out["b 1"]["_score"] == 0.1
+
+
+def test_scores_are_cached_but_omissions_and_failures_are_not():
+    rr = _reranker()
+    candidates = [_item("a 9", 0.2), _item("skip 1", 0.2), _item("fail 1", 0.8), _item("b 1", 0.1)]
+    rr.rerank("Query", candidates)
+    rr.client.prompts.clear()
+    rr.rerank("query ", candidates)
+    asked = [n for p in rr.client.prompts for n in _names(p)]
+    assert sorted(asked) == ["b 1", "fail 1", "skip 1"]
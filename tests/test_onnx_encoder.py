@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+tokenizers = pytest.importorskip("tokenizers")
+
+from shlrec import encoders
+from shlrec.build_pipeline import build_streaming
+from shlrec.encoders import ONNX_DIRNAME, OnnxEncoder, encoder_id, load_encoder
+from shlrec.indexer import corpus_text
+from shlrec.retrieval import load_index
+
+from conftest import DIM, FakeEncoder, write_catalog
+
+
+class StubSession:
+    """onnxruntime.InferenceSession stand-in: last hidden state from a per-token table.
+
+    The model file's text picks the export: "good" uses the reference table, "bad" adds
+    enough noise to break parity.
+    """
+
+    def __init__(self, path, sess_options=None, providers=None):
+        table = np.random.default_rng(0).standard_normal((512, DIM)).astype(np.float32)
+        if open(path, encoding="utf-8").read().strip() == "bad":
+            table += 2.0 * np.random.default_rng(1).standard_normal(table.shape).astype(np.float32)
+        self.table = table
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, output_names, feeds):
+        return [self.table[feeds["input_ids"] % len(self.table)]]
+
+
+def _export(model_dir, texts, kind="good"):
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    words = sorted({w for t in texts for w in t.split()})
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{w: i + 2 for i, w in enumerate(words)}}
+    tok = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tok.pre_tokenizer = Whitespace()
+    tok.save(str(model_dir / "tokenizer.json"))
+    (model_dir / "model.int8.onnx").write_text(kind, encoding="utf-8")
+    (model_dir / "encoder.json").write_text(
+        json.dumps({"model_name": "fake", "model_file": "model.int8.onnx", "max_seq_length": 128}), encoding="utf-8"
+    )
+    return model_dir
+
+
+@pytest.fixture
+def onnx_index(tmp_path, monkeypatch, catalog_items):
+    """An index whose catalog vectors come from the "good" ONNX export, plus that export."""
+    monkeypatch.setattr("onnxruntime.InferenceSession", StubSession)
+    texts = [corpus_text(it) for it in catalog_items]
+    reference = OnnxEncoder(_export(tmp_path / "reference", texts))
+    fallback = FakeEncoder()
+
+    def load(embedding_model, backend="torch", model_dir=None):
+        return OnnxEncoder(model_dir) if backend == "onnx" else fallback
+
+    monkeypatch.setattr("shlrec.build_pipeline.load_encoder", lambda *a, **k: reference)
+    monkeypatch.setattr("shlrec.retrieval.load_encoder", load)
+    index_dir = tmp_path / "index"
+    build_streaming(write_catalog(tmp_path / "catalog.jsonl", catalog_items), index_dir, "fake", progress=False)
+    return index_dir, texts, fallback
+
+
+def test_parity_accepts_a_matching_export(onnx_index, recwarn):
+    index_dir, texts, _ = onnx_index
+    _export(index_dir / ONNX_DIRNAME, texts, "good")
+    idx = load_index(index_dir, embedding_model="fake", query_cache_size=0, encoder_backend="onnx")
+    assert isinstance(idx.embedder, OnnxEncoder)
+    assert encoder_id(idx.embedder, "fake") == "onnx:fake/model.int8.onnx"
+    assert not [w for w in recwarn if "encoder" in str(w.message)]
+
+
+def test_parity_rejects_a_mismatching_export(onnx_index):
+    index_dir, texts, fallback = onnx_index
+    _export(index_dir / ONNX_DIRNAME, texts, "bad")
+    with pytest.warns(UserWarning, match="onnx encoder parity .* using PyTorch encoder"):
+        idx = load_index(index_dir, embedding_model="fake", query_cache_size=0, encoder_backend="onnx")
+    assert idx.embedder is fallback
+    assert encoder_id(idx.embedder, "fake") == "torch:fake"
+
+
+def test_missing_export_falls_back(onnx_index):
+    index_dir, _, fallback = onnx_index
+    with pytest.warns(UserWarning, match="onnx encoder unavailable"):
+        idx = load_index(index_dir, embedding_model="fake", query_cache_size=0, encoder_backend="onnx")
+    assert idx.embedder is fallback
+
+
+def test_torch_backend_skips_the_export(onnx_index):
+    index_dir, texts, fallback = onnx_index
+    _export(index_dir / ONNX_DIRNAME, texts, "good")
+    assert load_index(index_dir, embedding_model="fake", query_cache_size=0).embedder is fallback
+
+
+def test_load_encoder_arguments():
+    with pytest.raises(ValueError, match="exported model directory"):
+        load_encoder("fake", backend="onnx")
+    with pytest.raises(ValueError, match="Unknown encoder backend"):
+        load_encoder("fake", backend="tensorrt")
+
+
+def test_parity_score():
+    fake = FakeEncoder()
+    ref = fake.encode(["a", "b"])
+    assert encoders.parity_score(fake, ["a", "b"], ref) == pytest.approx(1.0)
+    assert encoders.parity_score(fake, ["a", "b"], ref[::-1]) < 0.9
+    assert encoders.parity_score(fake, [], ref[:0]) == 1.0
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+
+from shlrec.encoders import MicroBatchEncoder, encoder_id
+from shlrec.query_cache import QueryEmbeddingCache
+
+from conftest import FakeEncoder
+
+
+def test_encodes_misses_once_and_normalizes():
+    enc = FakeEncoder()
+    cache = QueryEmbeddingCache("torch:fake")
+    a = cache.encode(enc, ["Java  Developer", "java developer", "sql"])
+    b = cache.encode(enc, ["JAVA developer "])
+    assert enc.calls == 1
+    np.testing.assert_array_equal(a[0], a[1])
+    np.testing.assert_array_equal(a[0], b[0])
+    np.testing.assert_array_equal(a[0], enc.encode(["java developer"])[0])
+
+
+def test_spill_round_trip_is_per_encoder(tmp_path):
+    path = tmp_path / "qcache.npz"
+    enc = FakeEncoder()
+    cache = QueryEmbeddingCache("torch:fake", spill_path=path)
+    cache.encode(enc, ["a", "b"])
+    cache.save()
+
+    enc.calls = 0
+    QueryEmbeddingCache("torch:fake", spill_path=path).encode(enc, ["a", "b"])
+    assert enc.calls == 0
+    # Same model through another backend: cold cache
+    QueryEmbeddingCache("onnx:fake/model.int8.onnx", spill_path=path).encode(enc, ["a", "b"])
+    assert enc.calls == 1
+
+
+def test_concurrent_saves(tmp_path):
+    path = tmp_path / "qcache.npz"
+    caches = [QueryEmbeddingCache("torch:fake", spill_path=path) for _ in range(4)]
+    for i, cache in enumerate(caches):
+        cache.encode(FakeEncoder(), [f"query {i} {j}" for j in range(50)])
+
+    threads = [threading.Thread(target=lambda c=c: [c.save() for _ in range(10)]) for c in caches]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [p.name for p in tmp_path.iterdir()] == ["qcache.npz"]
+    reloaded = QueryEmbeddingCache("torch:fake", spill_path=path)
+    assert reloaded.stats()["size"] == 50
+
+
+def test_encoder_id():
+    assert encoder_id(FakeEncoder(), "m") == "torch:m"
+    assert encoder_id(MicroBatchEncoder(FakeEncoder()), "m") == "torch:m"
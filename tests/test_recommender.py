@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from shlrec.indexer import update_index
+from shlrec.intent_model import MODEL_FILENAME, IntentModel, LinearHead
+from shlrec.recommender import Recommender
+
+from conftest import DIM, write_catalog
+
+
+def test_concurrent_first_use_loads_once(index_dir, settings):
+    settings()
+    rec = Recommender(index_dir=index_dir, embedding_model="fake")
+    loads = []
+    load = rec._load_index
+
+    def slow_load(s):
+        loads.append(1)
+        time.sleep(0.05)
+        return load(s)
+
+    rec._load_index = slow_load
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(rec._lazy_load())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1
+    assert len(got) == 8 and all(idx is got[0] for idx in got)
+
+
+def test_reload_while_serving(tmp_path, index_dir, settings, catalog_items):
+    settings(index_check_interval_s=0.0, result_cache_size=0)
+    rec = Recommender(index_dir=index_dir, embedding_model="fake")
+    first = rec._lazy_load()
+    errors = []
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            try:
+                assert len(rec.recommend("sales manager with excel skills", k=5)) == 5
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+    threads = [threading.Thread(target=serve) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    update_index(write_catalog(tmp_path / "catalog.jsonl", catalog_items[1:]), index_dir, embedding_model="fake")
+    time.sleep(0.1)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert rec._lazy_load() is not first
+    assert rec._lazy_load().version != first.version
+
+
+def test_recommend_stream_keeps_positions(index_dir, settings):
+    settings()
+    rec = Recommender(index_dir=index_dir, embedding_model="fake")
+    queries = ["java developer", "", "sales manager", "java developer", "numerical reasoning"]
+
+    async def main():
+        return [row async for row in rec.arecommend_stream(iter(queries), k=5, batch_size=2, concurrency=2)]
+
+    rows = sorted(asyncio.run(main()))
+    assert [i for i, _, _ in rows] == list(range(len(queries)))
+    assert all(error is None for _, _, error in rows)
+    assert rows[1][1] == []
+    assert rows[0][1] == rows[3][1] == rec.recommend("java developer", k=5)
+    assert all(len(results) == 5 for i, results, _ in rows if queries[i])
+
+
+def test_recommend_stream_answers_queries_read_before_an_input_error(index_dir, settings):
+    settings()
+    rec = Recommender(index_dir=index_dir, embedding_model="fake")
+
+    async def queries():
+        for q in ["java developer", "sales manager", "numerical reasoning"]:
+            yield q
+        raise ValueError("bad line")
+
+    async def main():
+        rows = []
+        with pytest.raises(ValueError, match="bad line"):
+            async for row in rec.arecommend_stream(queries(), k=5, batch_size=2):
+                rows.append(row)
+        return rows
+
+    rows = sorted(asyncio.run(main()))
+    assert [i for i, _, _ in rows] == [0, 1, 2]
+    assert all(error is None and len(results) == 5 for _, results, error in rows)
+
+
+def test_arecommend_encodes_the_query_once(index_dir, settings, fake_encoder):
+    settings(intent_mode="local")
+    head = LinearHead(classes=np.array(["junior", "senior"]), W=np.zeros((DIM, 2), np.float32), b=np.zeros(2, np.float32))
+    IntentModel(heads={"seniority": head}, embedding_model="fake", dim=DIM).save(index_dir / MODEL_FILENAME)
+    rec = Recommender(index_dir=index_dir, embedding_model="fake")
+    rec.recommend("warm up")
+
+    for i in range(5):
+        calls = fake_encoder.calls
+        assert len(asyncio.run(rec.arecommend(f"graduate accountant {i}", k=5))) == 5
+        assert fake_encoder.calls == calls + 1
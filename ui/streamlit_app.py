@@ -1,10 +1,10 @@
-import json
-import pickle
 from pathlib import Path
 import requests
 import streamlit as st
 from bs4 import BeautifulSoup
 
+from shlrec.index_bundle import BUNDLE_FILENAME, IndexBundle
+
 st.set_page_config(page_title="SHL Assessment Recommender", layout="wide")
 st.title("🎯 SHL Assessment Recommendation System")
 
@@ -19,15 +19,9 @@ def load_bm25_index():
     try:
         index_dir = Path("data/index")
         
-        # Load BM25
-        with open(index_dir / "bm25.pkl", "rb") as f:
-            bm25 = pickle.load(f)
-        
-        # Load metadata
-        with open(index_dir / "meta.json", "r", encoding="utf-8") as f:
-            meta = json.load(f)
-        
-        return bm25, meta
+        # Memory-mapped index bundle: BM25 postings + metadata
+        bundle = IndexBundle.open(index_dir / BUNDLE_FILENAME)
+        return bundle.bm25(), bundle.meta()
     except Exception as e:
         st.error(f"Failed to load index: {e}")
         return None, None